@@ -0,0 +1,116 @@
+"""Micro-benchmarks for choices the load scenarios can't isolate. Each
+returns {name: value}; names ending in _us are microseconds per operation."""
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+import bson
+
+
+def per_op_us(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def datetime_encoding(iterations: int = 50000) -> dict:
+    """A transaction round-tripped through BSON with its timestamp stored as a
+    native date, against the ISO string older versions stored and parsed back"""
+    now = datetime.now(timezone.utc)
+    doc = {"order_id": "water-bench", "customer_id": "c", "meter_id": "m", "amount": 50000.0,
+           "payment_method": "gopay", "status": "settlement", "transaction_time": now}
+    native = bson.encode(doc)
+    iso = bson.encode({**doc, "transaction_time": now.isoformat()})
+
+    def read_iso():
+        value = bson.decode(iso)
+        value['transaction_time'] = datetime.fromisoformat(value['transaction_time'])
+
+    return {
+        "bson_datetime_encode_us": per_op_us(lambda: bson.encode({**doc, "transaction_time": doc['transaction_time']}), iterations),
+        "iso_string_encode_us": per_op_us(lambda: bson.encode({**doc, "transaction_time": doc['transaction_time'].isoformat()}), iterations),
+        "bson_datetime_decode_us": per_op_us(lambda: bson.decode(native), iterations),
+        "iso_string_decode_us": per_op_us(read_iso, iterations),
+        "bson_datetime_bytes": float(len(native)),
+        "iso_string_bytes": float(len(iso)),
+    }
+
+
+def list_serialization(docs_per_page: int = 1000, iterations: int = 50) -> dict:
+    """One page of transactions through serialize_list (trusted and validated
+    modes) against the earlier path: a model per document, returned through
+    response_model, i.e. dumped, validated again and encoded by JSONResponse"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+
+    import server
+
+    docs = [
+        {"id": server.uuid7(), "order_id": f"water-{i}", "customer_id": "c", "meter_id": "m",
+         "amount": 50000.0, "payment_method": "gopay", "status": "settlement",
+         "transaction_time": datetime.now(timezone.utc)}
+        for i in range(docs_per_page)
+    ]
+    adapter = TypeAdapter(List[server.Transaction])
+
+    def models_jsonresponse():
+        models = [server.Transaction(**doc) for doc in docs]
+        content = adapter.validate_python([model.model_dump() for model in models])
+        return JSONResponse(jsonable_encoder(content))
+
+    def serialize(mode: str):
+        def run():
+            previous = server.SERIALIZATION_MODE
+            server.SERIALIZATION_MODE = mode
+            try:
+                return server.serialize_list(server.Transaction, docs)
+            finally:
+                server.SERIALIZATION_MODE = previous
+        return run
+
+    return {
+        "serialize_list_trusted_us": per_op_us(serialize("trusted"), iterations),
+        "serialize_list_validated_us": per_op_us(serialize("validated"), iterations),
+        "models_jsonresponse_us": per_op_us(models_jsonresponse, iterations),
+        "docs_per_page": float(docs_per_page),
+    }
+
+
+async def insert_throughput(docs: int = 100000, batch_size: int = 1000) -> dict:
+    """Inserting transactions keyed by a binary UUIDv7 _id, against the old
+    layout: an ObjectId _id plus a uuid4 string id under a unique index.
+    Random uuid4 keys land all over that index while UUIDv7 keys append to
+    the right edge of _id. Runs on scratch collections dropped afterwards."""
+    import server
+
+    now = datetime.now(timezone.utc)
+
+    def transaction(i: int) -> dict:
+        return {"order_id": f"water-bench-{i}", "customer_id": "c", "meter_id": "m", "amount": 50000.0,
+                "payment_method": "gopay", "status": "settlement", "transaction_time": now}
+
+    layouts = {
+        "uuid7_id": (lambda i: {"_id": server.uuid7(), **transaction(i)}, []),
+        "uuid4_id_index": (lambda i: {"id": str(uuid.uuid4()), **transaction(i)}, ["id"]),
+    }
+    results = {}
+    for name, (make, unique_fields) in layouts.items():
+        collection = server.db[f"bench_insert_{name}"]
+        await collection.drop()
+        try:
+            for field in unique_fields:
+                await collection.create_index(field, unique=True)
+            started = time.perf_counter()
+            for offset in range(0, docs, batch_size):
+                await collection.insert_many([make(i) for i in range(offset, min(offset + batch_size, docs))])
+            elapsed = time.perf_counter() - started
+            stats = await server.db.command("collStats", collection.name)
+        finally:
+            await collection.drop()
+        results[f"{name}_insert_us"] = elapsed / docs * 1e6
+        results[f"{name}_docs_per_second"] = docs / elapsed
+        results[f"{name}_index_bytes"] = float(stats['totalIndexSize'])
+    return results
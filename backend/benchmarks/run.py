@@ -0,0 +1,265 @@
+"""Load-test and benchmark harness for the IndoWater API.
+
+    cd backend
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=indowater_bench python -m benchmarks.seed --reset
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=indowater_bench python -m benchmarks.run
+    ... python -m benchmarks.run --save-baseline      # after a known-good run
+
+By default the app is booted in process (startup hooks included) and driven
+through httpx.ASGITransport, with Midtrans replaced by snap_stub.app the
+same way, so runs are reproducible without any network. The load generator
+then shares the event loop with the server: compare numbers against a
+baseline from the same machine and mode. --url drives an external server
+instead (point its MIDTRANS_SNAP_URL at snap_stub.py, set
+TRUST_PROXY_HEADERS=true and share MONGO_URL, DB_NAME and SECRET_KEY with
+this process, which reads customers and issues their tokens directly).
+
+--compare-auth-cache also runs customer_dashboard with the token cache in
+get_current_user switched off and then on, as the customer_dashboard[cache_off]
+and customer_dashboard[cache_on] series (in process only).
+
+Each scenario reports throughput, p50/p95/p99 latency and process CPU per
+request. With a baseline, a p95 more than --tolerance above it or a
+throughput more than --tolerance below it is a regression and the run
+exits with status 1. The micro-benchmarks in benchmarks.micro run after the
+scenarios; any of their _us timings more than --tolerance above the
+baseline is a regression too.
+"""
+import os
+
+os.environ.setdefault("DB_NAME", "indowater_bench")
+# Login scenarios present many client addresses through X-Forwarded-For
+os.environ.setdefault("TRUST_PROXY_HEADERS", "True")
+os.environ.setdefault("ALERT_MODE", "off")
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+import server
+import snap_stub
+from benchmarks.micro import datetime_encoding, insert_throughput, list_serialization
+from benchmarks.scenarios import HTTP_SCENARIOS, metrics_overhead
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+
+class Recorder:
+    """Latency and status of every request, per scenario series"""
+
+    def __init__(self, scenario: str):
+        self.scenario = scenario
+        self.latencies = {}
+        self.errors = {}
+        self.items = {}
+
+    def count(self, items: int, tag: str = None):
+        """Record work done beyond one request, e.g. readings in an ingest batch"""
+        series = f"{self.scenario}.{tag}" if tag else self.scenario
+        self.items[series] = self.items.get(series, 0) + items
+
+    async def request(self, client, method: str, url: str, tag: str = None, **kwargs):
+        series = f"{self.scenario}.{tag}" if tag else self.scenario
+        started = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            key = f"{series}:transport"
+            self.errors[key] = self.errors.get(key, 0) + 1
+            raise
+        self.latencies.setdefault(series, []).append((time.perf_counter() - started) * 1000)
+        if resp.status_code >= 400:
+            key = f"{series}:{resp.status_code}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+        return resp
+
+
+def percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))] if values else 0.0
+
+
+async def run_scenario(name: str, client, ctx: dict, concurrency: int, duration: float) -> dict:
+    scenario = HTTP_SCENARIOS[name]
+    rec = Recorder(name)
+    deadline = time.monotonic() + duration
+
+    async def worker(number: int):
+        while time.monotonic() < deadline:
+            try:
+                await scenario(client, ctx, rec, number)
+            except httpx.HTTPError:
+                pass
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+    total = sum(len(latencies) for latencies in rec.latencies.values())
+    results = {}
+    for series, latencies in rec.latencies.items():
+        latencies.sort()
+        results[series] = {
+            "requests": len(latencies),
+            "throughput_rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            # Only meaningful in process; covers bcrypt and driver threads too
+            "cpu_ms_per_request": cpu * 1000 / total if total else 0.0,
+            "errors": {key.split(":", 1)[1]: count for key, count in rec.errors.items()
+                       if key.split(":", 1)[0] == series},
+        }
+        if series in rec.items:
+            results[series]["items_per_second"] = rec.items[series] / elapsed
+    return results
+
+
+async def build_context(client, customers: int, pages: int) -> dict:
+    """Tokens and meter ids for a sample of seeded customers, issued without bcrypt"""
+    users = await server.db.users.find(
+        {"role": server.UserRole.CUSTOMER}, {"_id": 1, "email": 1}
+    ).limit(customers).to_list(customers)
+    if not users:
+        raise SystemExit("No customers found; run python -m benchmarks.seed first")
+
+    meter_ids = {}
+    async for meter in server.db.meters.find(
+        {"customer_id": {"$in": [str(user['_id']) for user in users]}}, {"_id": 1, "customer_id": 1}
+    ):
+        meter_ids.setdefault(meter['customer_id'], []).append(str(meter['_id']))
+
+    return {
+        "customers": [
+            {"email": user['email'], "token": server.create_access_token({"sub": user['email']}),
+             "meter_ids": meter_ids.get(str(user['_id']), [])}
+            for user in users if meter_ids.get(str(user['_id']))
+        ],
+        "admin_token": server.create_access_token({"sub": "superadmin@indowater.com"}),
+        "pages": pages,
+    }
+
+
+async def compare_auth_cache(client, ctx, concurrency: int, duration: float) -> dict:
+    """customer_dashboard with server.auth_cache disabled, then enabled"""
+    results = {}
+    enabled = server.auth_cache.enabled
+    try:
+        for label, on in (("cache_off", False), ("cache_on", True)):
+            server.auth_cache.enabled = on
+            server.auth_cache.entries.clear()
+            server.auth_cache.tokens_by_user.clear()
+            print(f"Running customer_dashboard with {label} ({concurrency} clients, {duration:.0f}s)")
+            for series, result in (await run_scenario("customer_dashboard", client, ctx, concurrency, duration)).items():
+                name, _, tag = series.partition(".")
+                results[f"{name}[{label}]" + (f".{tag}" if tag else "")] = result
+    finally:
+        server.auth_cache.enabled = enabled
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for series, current in results.items():
+        base = baseline.get(series)
+        if not base:
+            continue
+        if "p95_ms" in base and current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{series}: p95 {current['p95_ms']:.1f}ms vs baseline {base['p95_ms']:.1f}ms")
+        if "throughput_rps" in base and current['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{series}: {current['throughput_rps']:.1f} rps vs baseline {base['throughput_rps']:.1f} rps")
+        if "items_per_second" in base and current.get('items_per_second', 0) < base['items_per_second'] * (1 - tolerance):
+            regressions.append(f"{series}: {current.get('items_per_second', 0):.0f} items/s "
+                               f"vs baseline {base['items_per_second']:.0f} items/s")
+        for key in base:
+            if key.endswith("_us") and key in current and current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{series}: {key} {current[key]:.2f} vs baseline {base[key]:.2f}")
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"{'series':32} {'requests':>9} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'cpu ms':>8}  errors")
+    for series, r in results.items():
+        if "requests" not in r:
+            print(f"{series:32} " + ", ".join(f"{key}={value:.2f}" for key, value in r.items()))
+            continue
+        items = f"  {r['items_per_second']:.0f} items/s" if "items_per_second" in r else ""
+        print(f"{series:32} {r['requests']:>9} {r['throughput_rps']:>9.1f} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['cpu_ms_per_request']:>8.2f}  {r['errors'] or ''}{items}")
+
+
+async def main_async(args) -> int:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        await server.app.router.startup()
+        server.snap.http = httpx.AsyncClient(transport=httpx.ASGITransport(app=snap_stub.app), base_url="http://snap-stub")
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=60)
+
+    results = {}
+    try:
+        ctx = await build_context(client, args.customers, args.pages)
+        for name in args.scenarios:
+            print(f"Running {name} ({args.concurrency} clients, {args.duration:.0f}s)")
+            results.update(await run_scenario(name, client, ctx, args.concurrency, args.duration))
+        if args.compare_auth_cache:
+            results.update(await compare_auth_cache(client, ctx, args.concurrency, args.duration))
+        results["metrics_overhead"] = await metrics_overhead()
+        results["datetime_encoding"] = datetime_encoding()
+        results["list_serialization"] = list_serialization()
+        results["insert_throughput"] = await insert_throughput()
+    finally:
+        await client.aclose()
+        if not args.url:
+            await server.app.router.shutdown()
+
+    print_table(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return 0
+    if not BASELINE_PATH.exists():
+        print("No baseline to compare against; run with --save-baseline to record one")
+        return 0
+
+    regressions = compare(results, json.loads(BASELINE_PATH.read_text()), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IndoWater API load tests")
+    parser.add_argument("scenarios", nargs="*", help=f"Any of {', '.join(HTTP_SCENARIOS)} (default: all)")
+    parser.add_argument("--url", help="Drive a running server instead of booting the app in process")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per scenario")
+    parser.add_argument("--customers", type=int, default=1000, help="Seeded customers to act as")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per bulk_listing operation")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare-auth-cache", action="store_true",
+                        help="Also run customer_dashboard with the auth cache off and on")
+    args = parser.parse_args()
+    if args.compare_auth_cache and args.url:
+        parser.error("--compare-auth-cache toggles the cache in process and can't be combined with --url")
+    unknown = [name for name in args.scenarios if name not in HTTP_SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    args.scenarios = args.scenarios or list(HTTP_SCENARIOS)
+    try:
+        exit_code = asyncio.run(main_async(args))
+    finally:
+        server.client.close()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
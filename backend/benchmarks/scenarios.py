@@ -0,0 +1,197 @@
+"""Load scenarios. Each one is called repeatedly by every concurrent client
+until the run's duration is up; one call is one user-level operation and
+may issue several requests through the Recorder."""
+import asyncio
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import server
+from benchmarks.seed import BENCH_PASSWORD
+from metrics import Histogram, MetricsMiddleware
+
+
+def fake_ip(*parts) -> str:
+    return "10." + ".".join(str(part % 256) for part in parts)
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def login_storm(client, ctx, rec, worker: int):
+    """Legitimate logins from many addresses; bound by bcrypt"""
+    customer = random.choice(ctx['customers'])
+    await rec.request(client, "POST", "/api/auth/login",
+                      json={"email": customer['email'], "password": BENCH_PASSWORD},
+                      headers={"X-Forwarded-For": fake_ip(worker, random.getrandbits(16), random.getrandbits(8))})
+
+
+async def login_attack(client, ctx, rec, worker: int):
+    """Credential stuffing from a few addresses mixed with legitimate logins;
+    one client in five is legitimate. Compare the legit series with login_storm."""
+    customer = random.choice(ctx['customers'])
+    if worker % 5 == 0:
+        await rec.request(client, "POST", "/api/auth/login", tag="legit",
+                          json={"email": customer['email'], "password": BENCH_PASSWORD},
+                          headers={"X-Forwarded-For": fake_ip(worker, random.getrandbits(16), random.getrandbits(8))})
+    else:
+        await rec.request(client, "POST", "/api/auth/login", tag="attack",
+                          json={"email": customer['email'], "password": "wrong-password"},
+                          headers={"X-Forwarded-For": fake_ip(200, worker % 4, 0)})
+
+
+async def session_refresh(client, ctx, rec, worker: int):
+    """Refresh-token rotation, the path that replaces periodic logins; its
+    cpu_ms_per_request is the after-figure to login_storm's before-figure"""
+    tokens = ctx.setdefault('refresh_tokens', {})
+    if worker not in tokens:
+        customer = ctx['customers'][worker % len(ctx['customers'])]
+        resp = await client.post("/api/auth/login", json={"email": customer['email'], "password": BENCH_PASSWORD},
+                                 headers={"X-Forwarded-For": fake_ip(100, worker, 1)})
+        tokens[worker] = resp.json()['refresh_token']
+    resp = await rec.request(client, "POST", "/api/auth/refresh", json={"refresh_token": tokens[worker]})
+    if resp.status_code == 200:
+        tokens[worker] = resp.json()['refresh_token']
+    else:
+        tokens.pop(worker)
+
+
+async def customer_dashboard(client, ctx, rec, worker: int):
+    """What Dashboard.js loads: meters, transactions and properties in parallel"""
+    headers = bearer(random.choice(ctx['customers'])['token'])
+    await asyncio.gather(
+        rec.request(client, "GET", "/api/meters", tag="meters", headers=headers),
+        rec.request(client, "GET", "/api/transactions", tag="transactions", headers=headers),
+        rec.request(client, "GET", "/api/properties", tag="properties", headers=headers),
+    )
+
+
+async def meters_during_login_storm(client, ctx, rec, worker: int):
+    """Half the clients log in while the other half read /api/meters. bcrypt
+    runs in its own pool, so the meters series should stay close to
+    customer_dashboard.meters instead of queueing behind password checks."""
+    customer = random.choice(ctx['customers'])
+    if worker % 2 == 0:
+        await rec.request(client, "POST", "/api/auth/login", tag="login",
+                          json={"email": customer['email'], "password": BENCH_PASSWORD},
+                          headers={"X-Forwarded-For": fake_ip(worker, random.getrandbits(16), random.getrandbits(8))})
+    else:
+        await rec.request(client, "GET", "/api/meters", tag="meters", headers=bearer(customer['token']))
+
+
+async def admin_dashboard(client, ctx, rec, worker: int):
+    """What AdminDashboard.js loads"""
+    headers = bearer(ctx['admin_token'])
+    await asyncio.gather(
+        rec.request(client, "GET", "/api/admin/dashboard", headers=headers),
+        rec.request(client, "GET", "/api/admin/customers", headers=headers),
+        rec.request(client, "GET", "/api/meters", headers=headers),
+        rec.request(client, "GET", "/api/transactions", headers=headers),
+        rec.request(client, "GET", "/api/settings"),
+        rec.request(client, "GET", "/api/reports/status", headers=headers),
+    )
+
+
+async def purchase_webhook(client, ctx, rec, worker: int):
+    """A credit purchase against the Midtrans stub followed by its settlement webhook"""
+    customer = random.choice(ctx['customers'])
+    resp = await rec.request(client, "POST", "/api/credit/purchase", headers=bearer(customer['token']),
+                             json={"meter_id": random.choice(customer['meter_ids']), "amount": 50000,
+                                   "payment_method": "gopay"})
+    if resp.status_code != 200:
+        return
+    await rec.request(client, "POST", "/api/payment/notification",
+                      json={"order_id": resp.json()['order_id'], "transaction_status": "settlement",
+                            "gross_amount": "50000", "status_code": "200"})
+
+
+async def bulk_listing(client, ctx, rec, worker: int):
+    """Admin paging through transactions with the keyset cursor, then an NDJSON stream of meters"""
+    headers = bearer(ctx['admin_token'])
+    cursor = None
+    for _ in range(ctx['pages']):
+        params = {"limit": 1000, **({"cursor": cursor} if cursor else {})}
+        resp = await rec.request(client, "GET", "/api/transactions", headers=headers, params=params)
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    await rec.request(client, "GET", "/api/meters", params={"limit": 10000},
+                      headers={**headers, "Accept": server.NDJSON_MEDIA_TYPE})
+
+
+INGEST_BATCH_READINGS = 1000
+
+
+async def ingest_replay(client, ctx, rec, worker: int):
+    """A meter fleet replaying readings: batches of INGEST_BATCH_READINGS
+    posted to /api/readings/ingest, NDJSON from even clients and CSV from odd
+    ones. Every reading has a distinct timestamp, so none is deduplicated;
+    items_per_second (readings stored per second) is the figure to hold
+    against the 10k/s target."""
+    if 'ingest_clock' not in ctx:
+        ctx['ingest_clock'] = itertools.count()
+        ctx['ingest_start'] = datetime.now(timezone.utc) - timedelta(days=30)
+        ctx['ingest_meters'] = [meter_id for customer in ctx['customers'] for meter_id in customer['meter_ids']]
+    meter_ids = ctx['ingest_meters']
+    readings = [
+        (random.choice(meter_ids), (ctx['ingest_start'] + timedelta(milliseconds=next(ctx['ingest_clock']))).isoformat(),
+         round(random.uniform(0, 0.5), 3))
+        for _ in range(INGEST_BATCH_READINGS)
+    ]
+    if worker % 2 == 0:
+        body = "".join(json.dumps({"meter_id": m, "reading_time": t, "consumption": c}) + "\n" for m, t, c in readings)
+        content_type = server.NDJSON_MEDIA_TYPE
+    else:
+        body = "meter_id,reading_time,consumption\n" + "".join(f"{m},{t},{c}\n" for m, t, c in readings)
+        content_type = "text/csv"
+    resp = await rec.request(client, "POST", "/api/readings/ingest", content=body.encode(),
+                             headers={**bearer(ctx['admin_token']), "Content-Type": content_type})
+    if resp.status_code == 200:
+        rec.count(resp.json()['inserted'])
+
+
+HTTP_SCENARIOS = {
+    "login_storm": login_storm,
+    "login_attack": login_attack,
+    "session_refresh": session_refresh,
+    "customer_dashboard": customer_dashboard,
+    "meters_during_login_storm": meters_during_login_storm,
+    "admin_dashboard": admin_dashboard,
+    "purchase_webhook": purchase_webhook,
+    "bulk_listing": bulk_listing,
+    "ingest_replay": ingest_replay,
+}
+
+
+async def metrics_overhead(iterations: int = 100000) -> dict:
+    """Microseconds the metrics add: one histogram observation, and the
+    middleware around a do-nothing ASGI app compared with calling it bare"""
+    histogram = Histogram("bench_seconds", "benchmark", ("route",))
+    started = time.perf_counter()
+    for i in range(iterations):
+        histogram.observe(0.003, "/api/meters")
+    observe_us = (time.perf_counter() - started) / iterations * 1e6
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/bench", "headers": []}
+    wrapped = MetricsMiddleware(app)
+    timings = {}
+    for name, target in (("bare", app), ("wrapped", wrapped)):
+        started = time.perf_counter()
+        for i in range(iterations // 10):
+            await target(dict(scope), receive, send)
+        timings[name] = (time.perf_counter() - started) / (iterations // 10) * 1e6
+
+    return {"observe_us": observe_us, "middleware_us": timings['wrapped'] - timings['bare']}
@@ -0,0 +1,140 @@
+"""Seed a benchmark database with realistic data volumes.
+
+    cd backend
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=indowater_bench \\
+        python -m benchmarks.seed --customers 20000 --meters 100000 --transactions 1000000
+
+Every customer shares BENCH_PASSWORD, hashed once, so seeding costs a single
+bcrypt operation. --reset drops the whole DB_NAME database first.
+"""
+import os
+
+os.environ.setdefault("DB_NAME", "indowater_bench")
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import server
+
+BENCH_PASSWORD = "bench-password"
+CITIES = ["Jakarta", "Bandung", "Surabaya", "Medan", "Semarang", "Makassar", "Denpasar", "Yogyakarta"]
+PROPERTY_TYPES = ["residential", "commercial", "industrial", "boarding_house", "rental", "other"]
+PAYMENT_METHODS = ["gopay", "bank_transfer", "credit_card", "qris"]
+TRANSACTION_STATUSES = ["settlement", "pending", "expire", "refund"]
+TRANSACTION_WEIGHTS = [80, 10, 7, 3]
+
+
+def customer_email(number: int) -> str:
+    return f"customer{number}@bench.indowater.test"
+
+
+async def insert_batches(collection: str, docs, batch_size: int, total: int):
+    batch, inserted, started = [], 0, time.monotonic()
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await server.db[collection].insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+            rate = inserted / max(time.monotonic() - started, 1e-9)
+            print(f"{collection}: {inserted}/{total} ({rate:.0f} docs/s)")
+    if batch:
+        await server.db[collection].insert_many(batch, ordered=False)
+
+
+async def seed(customers: int, meters: int, transactions: int, batch_size: int, reset: bool):
+    if reset:
+        await server.client.drop_database(server.db.name)
+        print(f"Dropped database {server.db.name}")
+    await server.ensure_readings_collection()
+    await server.ensure_indexes()
+    await server.seed_admin()
+
+    hashed_password = server.pwd_context.hash(BENCH_PASSWORD)
+    now = datetime.now(timezone.utc)
+
+    # Customers, each owning one approved property
+    owners = []
+    user_docs, property_docs = [], []
+    for number in range(customers):
+        user = server.User(email=customer_email(number), name=f"Customer {number}", role=server.UserRole.CUSTOMER)
+        user_doc = server.to_document(user)
+        user_doc['hashed_password'] = hashed_password
+        user_docs.append(user_doc)
+
+        prop = server.Property(
+            name=f"Property {number}",
+            property_type=random.choice(PROPERTY_TYPES),
+            address=f"Jl. Benchmark {number}",
+            city=random.choice(CITIES),
+            owner_id=user.id,
+            owner_name=user.name,
+            status=server.PropertyStatus.APPROVED
+        )
+        property_docs.append(server.to_document(prop))
+        owners.append((user, prop))
+    await insert_batches("users", user_docs, batch_size, customers)
+    await insert_batches("properties", property_docs, batch_size, customers)
+
+    meter_rows = []
+
+    def meter_docs():
+        for number in range(meters):
+            user, prop = owners[number % customers]
+            meter = server.WaterMeter(
+                meter_number=f"BENCH-{number:08d}",
+                location=prop.address,
+                customer_id=user.id,
+                customer_name=user.name,
+                property_id=prop.id,
+                property_name=prop.name,
+                balance=random.uniform(0, 200000)
+            )
+            meter_rows.append((meter.id, user.id, prop.city, prop.property_type))
+            yield server.to_document(meter)
+    await insert_batches("meters", meter_docs(), batch_size, meters)
+
+    def transaction_docs():
+        for _ in range(transactions):
+            meter_id, customer_id, city, property_type = random.choice(meter_rows)
+            trans = server.Transaction(
+                order_id=f"water-{server.uuid7().hex}",
+                customer_id=customer_id,
+                meter_id=meter_id,
+                amount=float(random.choice([10000, 20000, 50000, 100000, 200000])),
+                payment_method=random.choice(PAYMENT_METHODS),
+                status=random.choices(TRANSACTION_STATUSES, TRANSACTION_WEIGHTS)[0],
+                transaction_time=now - timedelta(seconds=random.uniform(0, 365 * 24 * 3600))
+            )
+            doc = server.to_document(trans)
+            doc['city'] = city
+            doc['property_type'] = property_type
+            yield doc
+    await insert_batches("transactions", transaction_docs(), batch_size, transactions)
+
+    await server.rebuild_dashboard_stats()
+    await server.rebuild_reports()
+    # Also schedules the next rebuild, so it doesn't start during a benchmark run
+    await server.report_rebuilder.claim()
+    print("Dashboard and report rollups rebuilt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the benchmark database")
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--meters", type=int, default=100000)
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--reset", action="store_true", help="Drop the benchmark database first")
+    args = parser.parse_args()
+    try:
+        asyncio.run(seed(args.customers, args.meters, args.transactions, args.batch_size, args.reset))
+    finally:
+        server.client.close()
+
+
+if __name__ == "__main__":
+    main()
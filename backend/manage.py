@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError
+
+from server import (
+    client, db, ensure_indexes, index_drift, check_query_plans,
+    check_dashboard_stats, rebuild_dashboard_stats, rebuild_reports,
+)
+
+# Timestamp fields older versions stored as ISO strings
+DATETIME_FIELDS = {
+    "users": ["created_at"],
+    "meters": ["created_at"],
+    "properties": ["created_at", "verified_at"],
+    "transactions": ["transaction_time"],
+}
+
+# Collections whose documents move from ObjectId _id + string id to a binary UUID _id
+ID_COLLECTIONS = ["users", "meters", "properties", "transactions"]
+
+
+async def cmd_ensure_indexes(args):
+    created = await ensure_indexes()
+    print(json.dumps(created, indent=2))
+    return 0
+
+
+async def cmd_check_indexes(args):
+    drift = await index_drift()
+    slow_plans = await check_query_plans()
+    print(json.dumps({"drift": drift, "slow_plans": slow_plans}, indent=2, default=str))
+    # Fail when any route query would scan a whole collection or sort in memory
+    return 1 if slow_plans or (drift and args.strict) else 0
+
+
+async def cmd_check_stats(args):
+    diff = await check_dashboard_stats()
+    print(json.dumps(diff, indent=2))
+    if diff and args.repair:
+        await rebuild_dashboard_stats()
+        print("Dashboard stats rebuilt")
+        return 0
+    return 1 if diff else 0
+
+
+async def cmd_rebuild_reports(args):
+    started = time.monotonic()
+    await rebuild_reports()
+    print(f"Report rollups rebuilt in {time.monotonic() - started:.1f}s")
+    return 0
+
+
+async def migrate_collection_datetimes(collection: str, fields: list, batch_size: int):
+    """Convert string timestamps to BSON datetimes in _id order.
+
+    Progress is checkpointed in db.migrations after each batch so an
+    interrupted run resumes where it stopped. Writes are guarded on the
+    original string value, so concurrent updates are never overwritten.
+    """
+    checkpoint_id = f"datetimes:{collection}"
+    checkpoint = await db.migrations.find_one({"id": checkpoint_id}) or {}
+    string_filter = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    remaining = await db[collection].count_documents(string_filter)
+    print(f"{collection}: {remaining} documents to convert")
+
+    last_id = checkpoint.get("last_id")
+    converted = 0
+    started = time.monotonic()
+    while True:
+        query = {"$and": [string_filter, {"_id": {"$gt": last_id}}]} if last_id is not None else string_filter
+        batch = await db[collection].find(query, {field: 1 for field in fields}) \
+            .sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            guard = {"_id": doc["_id"]}
+            update = {}
+            for field in fields:
+                value = doc.get(field)
+                if isinstance(value, str):
+                    guard[field] = value
+                    update[field] = datetime.fromisoformat(value)
+            operations.append(UpdateOne(guard, {"$set": update}))
+        result = await db[collection].bulk_write(operations, ordered=False)
+
+        last_id = batch[-1]["_id"]
+        converted += result.modified_count
+        await db.migrations.update_one(
+            {"id": checkpoint_id},
+            {"$set": {"last_id": last_id, "converted": checkpoint.get("converted", 0) + converted}},
+            upsert=True
+        )
+        rate = converted / max(time.monotonic() - started, 1e-9)
+        print(f"{collection}: {converted}/{remaining} converted ({rate:.0f} docs/s)")
+
+    await db.migrations.update_one(
+        {"id": checkpoint_id},
+        {"$set": {"completed_at": datetime.now().astimezone()}},
+        upsert=True
+    )
+
+
+async def cmd_migrate_datetimes(args):
+    for collection, fields in DATETIME_FIELDS.items():
+        if args.restart:
+            await db.migrations.delete_one({"id": f"datetimes:{collection}"})
+        await migrate_collection_datetimes(collection, fields, args.batch_size)
+    return 0
+
+
+async def restore_id_backup(collection: str):
+    """Re-insert backed-up documents under their UUID _id, then clear the backup.
+
+    Runs after every batch and at start-up of the command, so a batch an
+    interrupted run left half-done is completed rather than lost.
+    """
+    entries = await db.migration_backup.find({"collection": collection}).to_list(None)
+    if not entries:
+        return 0
+
+    # Originals still present would clash on unique indexes such as users.email
+    await db[collection].delete_many({"_id": {"$in": [entry["doc"]["_id"] for entry in entries]}})
+
+    docs = []
+    for entry in entries:
+        doc = entry["doc"]
+        doc["_id"] = uuid.UUID(doc.pop("id"))
+        docs.append(doc)
+    try:
+        await db[collection].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Already inserted by an earlier, interrupted restore
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+    await db.migration_backup.delete_many({"_id": {"$in": [entry["_id"] for entry in entries]}})
+    return len(docs)
+
+
+async def migrate_collection_ids(collection: str, batch_size: int):
+    """Move documents to a binary UUID _id taken from their string id field.
+
+    _id is immutable, so each batch is copied to db.migration_backup, deleted
+    and re-inserted under the new _id.
+    """
+    recovered = await restore_id_backup(collection)
+    if recovered:
+        print(f"{collection}: recovered {recovered} documents from an interrupted run")
+
+    legacy = {"id": {"$exists": True}}
+    remaining = await db[collection].count_documents(legacy)
+    print(f"{collection}: {remaining} documents to migrate")
+
+    migrated = 0
+    started = time.monotonic()
+    while True:
+        batch = await db[collection].find(legacy).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        await db.migration_backup.insert_many([{"collection": collection, "doc": doc} for doc in batch])
+        migrated += await restore_id_backup(collection)
+        rate = migrated / max(time.monotonic() - started, 1e-9)
+        print(f"{collection}: {migrated}/{remaining} migrated ({rate:.0f} docs/s)")
+
+
+async def cmd_migrate_ids(args):
+    # Drops the unique id_1 indexes, which would reject documents without an id field
+    await ensure_indexes()
+    for collection in ID_COLLECTIONS:
+        await migrate_collection_ids(collection, args.batch_size)
+    return 0
+
+
+COMMANDS = {
+    "ensure-indexes": cmd_ensure_indexes,
+    "check-indexes": cmd_check_indexes,
+    "check-stats": cmd_check_stats,
+    "rebuild-reports": cmd_rebuild_reports,
+    "migrate-datetimes": cmd_migrate_datetimes,
+    "migrate-ids": cmd_migrate_ids,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IndoWater maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("ensure-indexes", help="Create all declared indexes")
+    check = subparsers.add_parser("check-indexes", help="Report index drift and COLLSCAN or in-memory SORT query plans")
+    check.add_argument("--strict", action="store_true", help="Also fail on index drift")
+
+    stats = subparsers.add_parser("check-stats", help="Diff the dashboard rollup against a fresh rebuild")
+    stats.add_argument("--repair", action="store_true", help="Rebuild the rollup when it has drifted")
+
+    subparsers.add_parser("rebuild-reports", help="Recompute the revenue and status report rollups")
+
+    migrate = subparsers.add_parser("migrate-datetimes", help="Convert ISO string timestamps to BSON datetimes")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.add_argument("--restart", action="store_true", help="Ignore saved checkpoints")
+
+    migrate_ids = subparsers.add_parser("migrate-ids", help="Move string ids to binary UUID _id")
+    migrate_ids.add_argument("--batch-size", type=int, default=1000)
+
+    args = parser.parse_args()
+    try:
+        exit_code = asyncio.run(COMMANDS[args.command](args))
+    finally:
+        client.close()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
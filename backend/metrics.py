@@ -0,0 +1,284 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+server.py attaches MongoCommandMetrics and MongoPoolMetrics to the Motor
+client, wraps the app in MetricsMiddleware and serves registry.render() at
+/metrics. pymongo calls its listeners from Motor's worker threads, so every
+metric takes a lock while recording.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [(self.name, _labels(self.label_names, key), value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self.lock:
+            self.values[label_values] = value
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+
+class CallbackGauge:
+    """Gauge whose samples are read from `callback` at scrape time; the callback
+    returns {label values tuple: value}"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple, callback):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self.callback = callback
+
+    def samples(self):
+        return [(self.name, _labels(self.label_names, key), value) for key, value in self.callback().items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then sum
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(series)) for key, series in self.series.items()]
+        samples = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", _labels(self.label_names + ("le",), key + (le,)), cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.label_names, key), series[-1]))
+            samples.append((f"{self.name}_count", _labels(self.label_names, key), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",))
+mongo_command_duration = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by command and collection", ("command", "collection"))
+mongo_command_failures = registry.counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands", ("command", "collection"))
+mongo_pool_connections = registry.gauge(
+    "mongodb_pool_connections", "Open pooled connections per server", ("address",))
+mongo_pool_checked_out = registry.gauge(
+    "mongodb_pool_checked_out", "Pooled connections checked out per server", ("address",))
+mongo_pool_checkout_failures = registry.counter(
+    "mongodb_pool_checkout_failures_total", "Connection checkouts that failed", ("address", "reason"))
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a scheduled callback")
+midtrans_request_duration = registry.histogram(
+    "midtrans_request_duration_seconds", "Midtrans Snap API call latency", ("outcome",))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command per (command, collection) using the driver's own durations"""
+
+    def __init__(self):
+        self.collections = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        # getMore names the cursor id first and the collection separately
+        collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self.lock:
+            self.collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event) -> str:
+        with self.lock:
+            return self.collections.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, event.command_name, collection)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, event.command_name, collection)
+        mongo_command_failures.inc(event.command_name, collection)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    def _address(self, event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        mongo_pool_connections.set(0, self._address(event))
+        mongo_pool_checked_out.set(0, self._address(event))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(self._address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(self._address(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures.inc(self._address(event), str(event.reason))
+
+    def connection_checked_out(self, event):
+        mongo_pool_checked_out.inc(self._address(event))
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec(self._address(event))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template (not raw path, which
+    would explode label cardinality with ids) and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec(method)
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started, method, getattr(route, "path", "unmatched"), status_code[0])
+
+
+class EventLoopLagMonitor:
+    """Sleeps for `interval` and records how much later than asked it woke up"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.task = None
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            event_loop_lag.observe(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+mongo_command_metrics = MongoCommandMetrics()
+mongo_pool_metrics = MongoPoolMetrics()
+event_loop_monitor = EventLoopLagMonitor()
@@ -0,0 +1,215 @@
+"""Sampled request profiling with slow-request capture.
+
+A background thread samples the event loop thread's stack every
+`interval_ms`. A sample is charged to a profiled request only when that
+request's middleware frame is on the stack, i.e. while the request itself
+is running rather than awaiting I/O, so concurrent requests don't blur
+together. MongoDB commands are attributed to the request through a
+ContextVar, which Motor carries into its worker threads.
+
+Requests slower than `slow_ms` (and every request profiled through the
+debug header) are written as JSON to a bounded ring buffer of files.
+"""
+import asyncio
+import contextvars
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from pymongo import monitoring
+
+current_profile: contextvars.ContextVar = contextvars.ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, sampled: bool, anchor=None):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.sampled = sampled
+        self.anchor = anchor
+        self.started_at = datetime.now(timezone.utc)
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks = {}
+        self.commands = []
+        self.pending_commands = {}
+
+    def to_dict(self, interval_ms: float) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 3),
+            "sampled": self.sampled,
+            "interval_ms": interval_ms,
+            "samples": self.samples,
+            # Folded "outer;...;inner" stacks, the input format of flame graph tools
+            "stacks": [{"stack": stack, "samples": count}
+                       for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])],
+            "mongo": self.commands,
+        }
+
+
+class StackSampler:
+    """One thread sampling the loop thread while any profiled request is active"""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.active = {}
+        self.lock = threading.Lock()
+        self.loop_thread_id = None
+        self.thread = None
+
+    def add(self, profile: RequestProfile):
+        with self.lock:
+            self.loop_thread_id = threading.get_ident()
+            self.active[id(profile.anchor)] = profile
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+                self.thread.start()
+
+    def remove(self, profile: RequestProfile):
+        with self.lock:
+            self.active.pop(id(profile.anchor), None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                frame = sys._current_frames().get(self.loop_thread_id)
+                stack = []
+                while frame is not None:
+                    profile = self.active.get(id(frame))
+                    if profile is not None and frame is profile.anchor:
+                        key = ";".join(reversed(stack))
+                        profile.stacks[key] = profile.stacks.get(key, 0) + 1
+                        profile.samples += 1
+                        break
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+
+
+class ProfileCommandListener(monitoring.CommandListener):
+    """Records the MongoDB commands issued by the request being profiled"""
+
+    def started(self, event):
+        profile = current_profile.get()
+        if profile is not None:
+            collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+            profile.pending_commands[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def _finish(self, event, ok: bool):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.commands.append({
+                "command": event.command_name,
+                "collection": profile.pending_commands.pop(event.request_id, ""),
+                "duration_ms": event.duration_micros / 1000,
+                "ok": ok,
+            })
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+
+class ProfileStore:
+    """Ring buffer of profile files: writing one beyond max_files drops the oldest"""
+
+    def __init__(self, directory: Path, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+
+    def _files(self):
+        return sorted(self.directory.glob("*.json")) if self.directory.exists() else []
+
+    def _write(self, profile: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns()}-{profile['id']}.json"
+        (self.directory / name).write_text(json.dumps(profile))
+        files = self._files()
+        for old in files[:max(0, len(files) - self.max_files)]:
+            old.unlink(missing_ok=True)
+
+    async def save(self, profile: dict):
+        await asyncio.to_thread(self._write, profile)
+
+    def _summary(self, path: Path) -> dict:
+        profile = json.loads(path.read_text())
+        return {key: profile[key] for key in
+                ("id", "method", "path", "route", "status", "started_at", "duration_ms", "sampled", "samples")}
+
+    async def list(self) -> list:
+        def read():
+            return [self._summary(path) for path in reversed(self._files())]
+        return await asyncio.to_thread(read)
+
+    def find(self, profile_id: str) -> Optional[Path]:
+        matches = [path for path in self._files() if path.stem.endswith(f"-{profile_id}")]
+        return matches[0] if matches else None
+
+
+class ProfilerMiddleware:
+    """Profiles `sample_rate` of requests, and every request carrying
+    `debug_header` with the configured token. Commands and timing are
+    recorded for every request so slow unsampled requests are still captured."""
+
+    def __init__(self, app, sampler: StackSampler, store: ProfileStore, sample_rate: float,
+                 slow_ms: float, debug_header: str, debug_token: Optional[str]):
+        self.app = app
+        self.sampler = sampler
+        self.store = store
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.debug_header = debug_header.lower().encode()
+        self.debug_token = debug_token.encode() if debug_token else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        debug = bool(self.debug_token) and dict(scope["headers"]).get(self.debug_header) == self.debug_token
+        sampled = debug or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        profile = RequestProfile(scope["method"], scope["path"], sampled, anchor=sys._getframe())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                if debug:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = current_profile.set(profile)
+        if sampled:
+            self.sampler.add(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration_ms = (time.perf_counter() - started) * 1000
+            if sampled:
+                self.sampler.remove(profile)
+            current_profile.reset(token)
+            route = scope.get("route")
+            profile.route = getattr(route, "path", None)
+            if debug or profile.duration_ms >= self.slow_ms:
+                await self.store.save(profile.to_dict(self.sampler.interval * 1000))
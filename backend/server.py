@@ -1,34 +1,169 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Query, Request, Response
+from fastapi.responses import StreamingResponse, ORJSONResponse, FileResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from starlette.datastructures import UploadFile
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError, OperationFailure, BulkWriteError, DuplicateKeyError
+from gridfs.errors import NoFile
+from bson import json_util
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter, ValidationError, field_validator, BeforeValidator
+from typing import List, Optional, Annotated
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 import os
 import logging
-import midtransclient
+import httpx
 from pathlib import Path
 from dotenv import load_dotenv
 import uuid
 import base64
+import hashlib
+import secrets
+import csv
+import io
+import tempfile
+import zlib
+import orjson
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from metrics import (
+    registry, CallbackGauge, MetricsMiddleware, event_loop_monitor,
+    mongo_command_metrics, mongo_pool_metrics, midtrans_request_duration,
+)
+from profiler import ProfilerMiddleware, ProfileCommandListener, ProfileStore, StackSampler
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Request profiling: PROFILE_SAMPLE_RATE of requests (or any carrying
+# PROFILE_DEBUG_HEADER: <PROFILE_DEBUG_TOKEN>) are stack-sampled; requests
+# slower than PROFILE_SLOW_MS are kept in a ring buffer of PROFILE_MAX_FILES
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', 'False').lower() == 'true'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0.01'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '1000'))
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', str(ROOT_DIR / 'profiles')))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '200'))
+PROFILE_DEBUG_HEADER = os.environ.get('PROFILE_DEBUG_HEADER', 'X-Debug-Profile')
+PROFILE_DEBUG_TOKEN = os.environ.get('PROFILE_DEBUG_TOKEN')
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url, tz_aware=True, uuidRepresentation="standard",
+    event_listeners=[mongo_command_metrics, mongo_pool_metrics]
+                    + ([ProfileCommandListener()] if PROFILE_ENABLED else [])
+)
 db = client[os.environ['DB_NAME']]
+logo_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="logos")
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', '30'))
+REFRESH_REUSE_GRACE_SECONDS = float(os.environ.get('REFRESH_REUSE_GRACE_SECONDS', '30'))
+
+# Password hashing pool (bcrypt releases the GIL, so threads run it in parallel)
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', '32'))
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', '1'))
+# Logins are shed once this many password verifications are running or queued,
+# leaving the rest of the pool's queue to registrations and password changes
+PASSWORD_VERIFY_MAX_PENDING = int(os.environ.get('PASSWORD_VERIFY_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 4)))
+
+# Token-bucket rate limits for login and register: burst size and refill per
+# minute, both above 0. RATE_LIMIT_BACKEND is "memory" (per process) or "mongo"
+# (shared by all workers); TRUST_PROXY_HEADERS takes the client IP from
+# X-Forwarded-For.
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', '20'))
+LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', '30'))
+LOGIN_EMAIL_BURST = int(os.environ.get('LOGIN_EMAIL_BURST', '5'))
+LOGIN_EMAIL_PER_MINUTE = float(os.environ.get('LOGIN_EMAIL_PER_MINUTE', '5'))
+REGISTER_IP_BURST = int(os.environ.get('REGISTER_IP_BURST', '5'))
+REGISTER_IP_PER_MINUTE = float(os.environ.get('REGISTER_IP_PER_MINUTE', '5'))
+TRUST_PROXY_HEADERS = os.environ.get('TRUST_PROXY_HEADERS', 'False').lower() == 'true'
+
+# Resolved-token cache for get_current_user
+AUTH_CACHE_ENABLED = os.environ.get('AUTH_CACHE_ENABLED', 'True').lower() == 'true'
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', '10000'))
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get('AUTH_CACHE_TTL_SECONDS', '60'))
+
+# Settings are cached in process and re-read after this long to pick up
+# changes made by other workers
+SETTINGS_CACHE_TTL_SECONDS = float(os.environ.get('SETTINGS_CACHE_TTL_SECONDS', '30'))
+
+# Response serialization for list/detail routes: "trusted" writes projected
+# database documents straight through orjson, "validated" runs them through a
+# cached pydantic TypeAdapter first
+SERIALIZATION_MODE = os.environ.get('SERIALIZATION_MODE', 'trusted')
+
+# Meter reading ingestion
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', '5000'))
+INGEST_MAX_ERRORS = 100
+# How long (reading_keys TTL) a redelivered reading is still recognised as a duplicate
+READING_DEDUP_TTL_SECONDS = int(os.environ.get('READING_DEDUP_TTL_SECONDS', str(30 * 24 * 3600)))
+# A reading key still pending after this long belongs to a batch that died mid-way
+READING_CLAIM_LEASE_SECONDS = float(os.environ.get('READING_CLAIM_LEASE_SECONDS', '300'))
+
+# Meter and property imports
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '1000'))
+IMPORT_SPOOL_MEMORY_BYTES = int(os.environ.get('IMPORT_SPOOL_MEMORY_BYTES', str(1024 * 1024)))
+# Uploads larger than this are refused with 413 instead of being spooled to disk
+IMPORT_MAX_BYTES = int(os.environ.get('IMPORT_MAX_BYTES', str(100 * 1024 * 1024)))
+IMPORT_RETENTION_SECONDS = int(os.environ.get('IMPORT_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+# Data exports: documents fetched per getMore, and rows written per response chunk
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '2000'))
+EXPORT_CHUNK_ROWS = 500
+
+# Reports: results are cached this long, and the rollups fully rebuilt at this interval
+REPORT_CACHE_TTL_SECONDS = float(os.environ.get('REPORT_CACHE_TTL_SECONDS', '30'))
+REPORT_REBUILD_INTERVAL_SECONDS = float(os.environ.get('REPORT_REBUILD_INTERVAL_SECONDS', str(24 * 3600)))
+# Rollup updates are held back during a rebuild, for at most the lease; the
+# rebuild first waits the settle time for updates already in flight to land
+REPORT_REBUILD_LEASE_SECONDS = float(os.environ.get('REPORT_REBUILD_LEASE_SECONDS', '3600'))
+REPORT_REBUILD_SETTLE_SECONDS = float(os.environ.get('REPORT_REBUILD_SETTLE_SECONDS', '5'))
+
+# Low balance alerts: ALERT_MODE is "scan" (periodic indexed scan), "change_stream"
+# (needs a replica set) or "off"; ALERT_SINK is "log" or "file:<path>"
+ALERT_MODE = os.environ.get('ALERT_MODE', 'scan')
+ALERT_SCAN_INTERVAL_SECONDS = float(os.environ.get('ALERT_SCAN_INTERVAL_SECONDS', '60'))
+ALERT_SINK = os.environ.get('ALERT_SINK', 'log')
+ALERT_BATCH_SIZE = int(os.environ.get('ALERT_BATCH_SIZE', '100'))
+ALERT_FLUSH_SECONDS = float(os.environ.get('ALERT_FLUSH_SECONDS', '1'))
+ALERT_QUEUE_SIZE = int(os.environ.get('ALERT_QUEUE_SIZE', '10000'))
+
+# Payment notification inbox
+INBOX_WORKERS = int(os.environ.get('INBOX_WORKERS', '2'))
+INBOX_BATCH_SIZE = int(os.environ.get('INBOX_BATCH_SIZE', '200'))
+INBOX_POLL_SECONDS = float(os.environ.get('INBOX_POLL_SECONDS', '0.5'))
+INBOX_LEASE_SECONDS = float(os.environ.get('INBOX_LEASE_SECONDS', '60'))
+INBOX_MAX_ATTEMPTS = int(os.environ.get('INBOX_MAX_ATTEMPTS', '5'))
+INBOX_RETENTION_SECONDS = int(os.environ.get('INBOX_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+# Logo uploads
+LOGO_MAX_BYTES = int(os.environ.get('LOGO_MAX_BYTES', str(2 * 1024 * 1024)))
+LOGO_CHUNK_BYTES = 256 * 1024
+# Room for the multipart boundaries and part headers around the file itself
+LOGO_FORM_OVERHEAD_BYTES = 16 * 1024
+# Hex digits of the logo hash used as the ?v= cache-buster
+LOGO_VERSION_LENGTH = 16
+
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>" when set
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
 
 # Midtrans config
 MIDTRANS_SERVER_KEY = os.environ.get('MIDTRANS_SERVER_KEY', 'sandbox-test-key')
@@ -38,12 +173,16 @@ MIDTRANS_IS_PRODUCTION = os.environ.get('MIDTRANS_IS_PRODUCTION', 'False').lower
 # Xendit config (placeholder)
 XENDIT_API_KEY = os.environ.get('XENDIT_API_KEY', 'sandbox-test-key')
 
-# Initialize Midtrans
-snap = midtransclient.Snap(
-    is_production=MIDTRANS_IS_PRODUCTION,
-    server_key=MIDTRANS_SERVER_KEY,
-    client_key=MIDTRANS_CLIENT_KEY
+# Midtrans Snap gateway client (point MIDTRANS_SNAP_URL at snap_stub.py for offline load tests)
+MIDTRANS_SNAP_URL = os.environ.get(
+    'MIDTRANS_SNAP_URL',
+    'https://app.midtrans.com' if MIDTRANS_IS_PRODUCTION else 'https://app.sandbox.midtrans.com'
 )
+MIDTRANS_TIMEOUT_SECONDS = float(os.environ.get('MIDTRANS_TIMEOUT_SECONDS', '10'))
+MIDTRANS_MAX_CONCURRENCY = int(os.environ.get('MIDTRANS_MAX_CONCURRENCY', '20'))
+MIDTRANS_MAX_RETRIES = int(os.environ.get('MIDTRANS_MAX_RETRIES', '2'))
+MIDTRANS_BREAKER_THRESHOLD = int(os.environ.get('MIDTRANS_BREAKER_THRESHOLD', '5'))
+MIDTRANS_BREAKER_RESET_SECONDS = float(os.environ.get('MIDTRANS_BREAKER_RESET_SECONDS', '30'))
 
 app = FastAPI(title="IndoWater Solution API")
 api_router = APIRouter(prefix="/api")
@@ -51,6 +190,52 @@ api_router = APIRouter(prefix="/api")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ============= IDS =============
+
+# Users, meters, properties and transactions use a UUIDv7 stored as binary
+# _id; the API exposes it as the string `id`.
+_uuid7_last_ms = 0
+_uuid7_counter = 0
+
+def uuid7() -> uuid.UUID:
+    """RFC 9562 UUIDv7: 48-bit unix milliseconds, a 12-bit counter keeping IDs
+    from the same millisecond ordered, then 62 random bits"""
+    global _uuid7_last_ms, _uuid7_counter
+    ms = time.time_ns() // 1_000_000
+    if ms > _uuid7_last_ms:
+        _uuid7_last_ms = ms
+        _uuid7_counter = random.getrandbits(11)
+    else:
+        _uuid7_counter += 1
+        if _uuid7_counter > 0xFFF:
+            # Counter exhausted: borrow the next millisecond
+            _uuid7_last_ms += 1
+            _uuid7_counter = 0
+        ms = _uuid7_last_ms
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (_uuid7_counter << 64) | (0b10 << 62) | rand_b)
+
+def new_id() -> str:
+    return str(uuid7())
+
+def as_uuid(value: str):
+    """Parse an API id for an _id query; malformed ids stay strings and match nothing"""
+    try:
+        return uuid.UUID(value)
+    except (ValueError, TypeError, AttributeError):
+        return value
+
+def id_query(value: str) -> dict:
+    return {"_id": as_uuid(value)}
+
+def to_document(model: BaseModel) -> dict:
+    doc = model.model_dump()
+    doc['_id'] = uuid.UUID(doc.pop('id'))
+    return doc
+
+# Documents read back carry the binary _id as a uuid.UUID
+IdStr = Annotated[str, BeforeValidator(str)]
+
 # ============= MODELS =============
 
 class UserRole(str):
@@ -92,6 +277,9 @@ class Permission(str):
     # Reports
     VIEW_REPORTS = "view_reports"
     EXPORT_DATA = "export_data"
+    
+    # Devices
+    INGEST_READINGS = "ingest_readings"
 
 # Role Permissions Mapping
 ROLE_PERMISSIONS = {
@@ -104,7 +292,8 @@ ROLE_PERMISSIONS = {
         Permission.VIEW_ALL_PROPERTIES, Permission.VERIFY_PROPERTY,
         Permission.VIEW_ALL_TRANSACTIONS, Permission.REFUND_TRANSACTION,
         Permission.MANAGE_SETTINGS, Permission.UPLOAD_LOGO, Permission.MANAGE_RATES,
-        Permission.VIEW_REPORTS, Permission.EXPORT_DATA
+        Permission.VIEW_REPORTS, Permission.EXPORT_DATA,
+        Permission.INGEST_READINGS
     ],
     UserRole.ADMIN: [
         Permission.VIEW_USERS, Permission.EDIT_USER,
@@ -112,7 +301,7 @@ ROLE_PERMISSIONS = {
         Permission.VIEW_ALL_PROPERTIES, Permission.VERIFY_PROPERTY,
         Permission.VIEW_ALL_TRANSACTIONS,
         Permission.UPLOAD_LOGO, Permission.MANAGE_RATES,
-        Permission.VIEW_REPORTS
+        Permission.VIEW_REPORTS, Permission.INGEST_READINGS
     ],
     UserRole.MANAGER: [
         Permission.VIEW_USERS,
@@ -129,7 +318,7 @@ ROLE_PERMISSIONS = {
 
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: IdStr = Field(default_factory=new_id)
     email: EmailStr
     name: str
     role: str
@@ -155,6 +344,10 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     user: User
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class PropertyType(str):
     RESIDENTIAL = "residential"
@@ -171,7 +364,7 @@ class PropertyStatus(str):
 
 class Property(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: IdStr = Field(default_factory=new_id)
     name: str
     property_type: str
     address: str
@@ -200,9 +393,16 @@ class PropertyVerify(BaseModel):
     status: str
     note: Optional[str] = None
 
+BULK_MAX_ITEMS = 1000
+
+class BulkPropertyVerify(BaseModel):
+    property_ids: List[str] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+    status: str
+    note: Optional[str] = None
+
 class WaterMeter(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: IdStr = Field(default_factory=new_id)
     meter_number: str
     location: str
     customer_id: str
@@ -222,7 +422,7 @@ class MeterCreate(BaseModel):
 
 class Transaction(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: IdStr = Field(default_factory=new_id)
     order_id: str
     customer_id: str
     meter_id: str
@@ -231,6 +431,16 @@ class Transaction(BaseModel):
     status: str = "pending"
     transaction_time: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class MeterReadingIn(BaseModel):
+    meter_id: str
+    reading_time: datetime
+    consumption: float = Field(ge=0)
+    
+    @field_validator("reading_time")
+    @classmethod
+    def assume_utc(cls, value: datetime) -> datetime:
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
 class CreditPurchase(BaseModel):
     meter_id: str
     amount: float
@@ -239,17 +449,65 @@ class CreditPurchase(BaseModel):
 class Settings(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = "settings"
-    logo_base64: Optional[str] = None
+    logo_url: Optional[str] = None
+    logo_hash: Optional[str] = None
     water_rate: float = 1000.0
     low_balance_threshold: float = 5000.0
+    version: int = 0
+
+class ImportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: IdStr = Field(default_factory=new_id)
+    kind: str
+    status: str = "running"
+    created_by: str
+    received: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    started_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
 
 # ============= AUTH FUNCTIONS =============
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+class BoundedPool:
+    """Thread pool that rejects work with a 503 once workers and queue are full"""
+    
+    def __init__(self, name: str, workers: int, queue_size: int, retry_after: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.capacity = workers + queue_size
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+    
+    async def run(self, fn, *args, limit: Optional[int] = None):
+        """Run fn in the pool; `limit` sheds this call earlier than the pool capacity"""
+        if self.pending >= min(limit or self.capacity, self.capacity):
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+    
+    def snapshot(self) -> dict:
+        return {"pending": self.pending, "capacity": self.capacity, "rejected": self.rejected}
+
+password_pool = BoundedPool("bcrypt", PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE, PASSWORD_HASH_RETRY_AFTER)
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(pwd_context.hash, password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.run(pwd_context.verify, plain_password, hashed_password, limit=PASSWORD_VERIFY_MAX_PENDING)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -261,24 +519,162 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Refresh tokens are random and single-use. Only their sha256 is stored, as the
+# _id of db.refresh_tokens, so a lookup is one primary key read and a leaked
+# collection reveals no usable token; bcrypt would only add cost here, since
+# the token already carries 256 bits of entropy. Each rotation stays in the
+# login's family; presenting an already-rotated token revokes the whole family,
+# except for a single replay less than REFRESH_REUSE_GRACE_SECONDS after the
+# rotation: that is two tabs refreshing at once, and the second one gets a
+# token of its own. The grace is spent atomically (grace_used), so a stolen
+# token replayed alongside the owner still revokes the family.
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def issue_refresh_token(user_id: str, family_id: Optional[str] = None) -> str:
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    await db.refresh_tokens.insert_one({
+        "_id": hash_refresh_token(token),
+        "user_id": user_id,
+        "family_id": family_id or new_id(),
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    })
+    return token
+
+async def rotate_refresh_token(token: str) -> dict:
+    """Mark the token used and return its record; raises 401 when it is
+    unknown, expired or being reused beyond the one replay in the grace window"""
+    now = datetime.now(timezone.utc)
+    record = await db.refresh_tokens.find_one_and_update(
+        {"_id": hash_refresh_token(token), "used_at": {"$exists": False}},
+        {"$set": {"used_at": now}}
+    )
+    if record is None:
+        graced = await db.refresh_tokens.find_one_and_update(
+            {
+                "_id": hash_refresh_token(token),
+                "used_at": {"$gt": now - timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS)},
+                "expires_at": {"$gt": now},
+                "grace_used": {"$exists": False}
+            },
+            {"$set": {"grace_used": True}}
+        )
+        if graced:
+            return graced
+        reused = await db.refresh_tokens.find_one(
+            {"_id": hash_refresh_token(token)}, {"user_id": 1, "family_id": 1}
+        )
+        if reused:
+            await db.refresh_tokens.delete_many({"family_id": reused['family_id']})
+            logger.warning(f"Refresh token reuse detected for user {reused['user_id']}; session revoked")
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if record['expires_at'] <= now:
+        raise HTTPException(status_code=401, detail="Refresh token expired")
+    return record
+
+async def revoke_user_sessions(user_id: str) -> int:
+    result = await db.refresh_tokens.delete_many({"user_id": user_id})
+    return result.deleted_count
+
+async def issue_tokens(user: User, family_id: Optional[str] = None) -> Token:
+    return Token(
+        access_token=create_access_token(data={"sub": user.email}),
+        token_type="bearer",
+        user=user,
+        refresh_token=await issue_refresh_token(user.id, family_id)
+    )
+
+class AuthCache:
+    """LRU cache of access token -> resolved User.
+    
+    Entries live until the earlier of the token's exp and the TTL. The TTL
+    bounds staleness for changes made through other worker processes; changes
+    made in this process call invalidate_user() and take effect immediately.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.entries: OrderedDict = OrderedDict()
+        self.tokens_by_user: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, token: str) -> Optional[User]:
+        if not self.enabled:
+            return None
+        entry = self.entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(token)
+        self.hits += 1
+        return user
+    
+    def put(self, token: str, user: User, token_exp: float):
+        if not self.enabled:
+            return
+        self.entries[token] = (user, min(token_exp, time.time() + self.ttl_seconds))
+        self.entries.move_to_end(token)
+        self.tokens_by_user.setdefault(user.id, set()).add(token)
+        while len(self.entries) > self.max_entries:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    def invalidate_user(self, user_id: str):
+        for token in self.tokens_by_user.pop(user_id, set()):
+            self.entries.pop(token, None)
+    
+    def _remove(self, token: str):
+        user, _ = self.entries.pop(token)
+        tokens = self.tokens_by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.tokens_by_user[user.id]
+    
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+auth_cache = AuthCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_ENABLED)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    token = credentials.credentials
+    user = auth_cache.get(token)
+    if user is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise HTTPException(status_code=401, detail="Invalid authentication")
+        except JWTError:
             raise HTTPException(status_code=401, detail="Invalid authentication")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication")
-    
-    user_data = await db.users.find_one({"email": email}, {"_id": 0})
-    if user_data is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    
-    if isinstance(user_data['created_at'], str):
-        user_data['created_at'] = datetime.fromisoformat(user_data['created_at'])
-    
-    user = User(**user_data)
+        
+        user_data = await db.users.find_one({"email": email}, model_projection(User))
+        if user_data is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        
+        user = User(**user_data)
+        auth_cache.put(token, user, payload.get('exp', 0))
     
     if not user.is_active:
         raise HTTPException(status_code=403, detail="User account is inactive")
@@ -296,10 +692,285 @@ def require_permission(permission: str):
         return current_user
     return permission_checker
 
+# ============= RATE LIMITING =============
+
+class MemoryRateLimitStore:
+    """Token buckets held in this process, evicting the least recently used key"""
+    
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.buckets: OrderedDict = OrderedDict()
+    
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        """Take a token; returns 0 when allowed, else seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / refill_per_second
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+class MongoRateLimitStore:
+    """Token buckets in db.rate_limits, shared by every worker. Each take is one
+    atomic pipeline update; idle buckets expire through a TTL index once they
+    would have refilled."""
+    
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        now = datetime.now(timezone.utc)
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, refill_per_second]}]}]}
+        pipeline = [
+            {"$set": {"tokens": refilled, "updated_at": now,
+                      "expires_at": now + timedelta(seconds=capacity / refill_per_second)}},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+        ]
+        for attempt in range(2):
+            try:
+                bucket = await db.rate_limits.find_one_and_update(
+                    {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+                )
+                break
+            except DuplicateKeyError:
+                # Two workers created the same bucket at once; the retry updates it
+                if attempt:
+                    raise
+        return 0.0 if bucket['allowed'] else (1 - bucket['tokens']) / refill_per_second
+
+def make_rate_limit_store(backend: str):
+    if backend == "mongo":
+        return MongoRateLimitStore()
+    return MemoryRateLimitStore(RATE_LIMIT_MAX_KEYS)
+
+class RateLimiter:
+    """A named token-bucket limit applied per key (client IP, email)"""
+    
+    def __init__(self, name: str, store, burst: int, per_minute: float):
+        # Checked here, at startup: the buckets divide by the refill rate to
+        # compute Retry-After, and a bucket with no token can never allow anything
+        if burst < 1 or per_minute <= 0:
+            raise ValueError(f"Rate limit {name} needs a burst of at least 1 and a refill above 0 per minute")
+        self.name = name
+        self.store = store
+        self.burst = burst
+        self.refill_per_second = per_minute / 60
+        self.allowed = 0
+        self.limited = 0
+    
+    async def check(self, key: str):
+        wait = await self.store.take(f"{self.name}:{key}", self.burst, self.refill_per_second)
+        if not wait:
+            self.allowed += 1
+            return
+        self.limited += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, please retry later",
+            headers={"Retry-After": str(max(1, int(wait + 0.999)))}
+        )
+    
+    def snapshot(self) -> dict:
+        return {"allowed": self.allowed, "limited": self.limited,
+                "burst": self.burst, "per_minute": self.refill_per_second * 60}
+
+rate_limit_store = make_rate_limit_store(RATE_LIMIT_BACKEND)
+login_ip_limiter = RateLimiter("login:ip", rate_limit_store, LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE)
+login_email_limiter = RateLimiter("login:email", rate_limit_store, LOGIN_EMAIL_BURST, LOGIN_EMAIL_PER_MINUTE)
+register_ip_limiter = RateLimiter("register:ip", rate_limit_store, REGISTER_IP_BURST, REGISTER_IP_PER_MINUTE)
+
+def client_ip(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+# ============= DASHBOARD STATS =============
+
+# Rollup counters kept in db.stats and updated with $inc by every write that
+# affects the admin dashboard, so reading it is a single find_one.
+STATS_ID = "dashboard"
+SETTLED_STATUSES = ["capture", "settlement"]
+# A partially refunded transaction still earns its amount less refunded_amount
+REVENUE_STATUSES = SETTLED_STATUSES + ["partial_refund"]
+REVENUE_AMOUNT = {"$cond": [
+    {"$eq": ["$status", "partial_refund"]},
+    {"$subtract": ["$amount", {"$ifNull": ["$refunded_amount", 0]}]},
+    "$amount"
+]}
+ALL_ROLES = [UserRole.SUPERADMIN, UserRole.ADMIN, UserRole.MANAGER, UserRole.CUSTOMER]
+ALL_PROPERTY_STATUSES = [PropertyStatus.PENDING, PropertyStatus.APPROVED, PropertyStatus.REJECTED]
+
+def transaction_revenue(trans: dict, transaction_status: Optional[str]) -> float:
+    """Revenue `trans` contributes while in `transaction_status`; REVENUE_AMOUNT
+    is the same rule for aggregations"""
+    if transaction_status in SETTLED_STATUSES:
+        return trans['amount']
+    if transaction_status == "partial_refund":
+        return trans['amount'] - trans.get('refunded_amount', 0.0)
+    return 0.0
+
+async def bump_stats(inc: dict):
+    """Atomically apply counter deltas to the dashboard rollup"""
+    inc = {k: v for k, v in inc.items() if v}
+    if inc:
+        await db.stats.update_one({"id": STATS_ID}, {"$inc": inc}, upsert=True)
+
+async def compute_dashboard_stats() -> dict:
+    """Rebuild the dashboard rollup from scratch in a single aggregation"""
+    def branch(collection: str, key, amount) -> list:
+        return [{"$project": {"_id": 0, "c": {"$literal": collection}, "k": key, "a": amount}}]
+
+    pipeline = branch("users", "$role", {"$literal": 0}) + [
+        {"$unionWith": {"coll": "properties", "pipeline": branch("properties", "$status", {"$literal": 0})}},
+        {"$unionWith": {"coll": "meters", "pipeline": branch("meters", {"$literal": None}, {"$literal": 0})}},
+        {"$unionWith": {"coll": "transactions", "pipeline": branch("transactions", "$status", REVENUE_AMOUNT)}},
+        {"$group": {"_id": {"c": "$c", "k": "$k"}, "count": {"$sum": 1}, "amount": {"$sum": "$a"}}},
+    ]
+
+    stats = {
+        "total_users": 0,
+        "total_meters": 0,
+        "total_properties": 0,
+        "total_transactions": 0,
+        "total_revenue": 0,
+        "role_distribution": {role: 0 for role in ALL_ROLES},
+        "property_stats": {prop_status: 0 for prop_status in ALL_PROPERTY_STATUSES},
+    }
+    async for row in db.users.aggregate(pipeline):
+        collection, key = row['_id']['c'], row['_id'].get('k')
+        stats[f"total_{collection}"] += row['count']
+        if collection == "users" and key in stats['role_distribution']:
+            stats['role_distribution'][key] = row['count']
+        elif collection == "properties" and key in stats['property_stats']:
+            stats['property_stats'][key] = row['count']
+        elif collection == "transactions" and key in REVENUE_STATUSES:
+            stats['total_revenue'] += row['amount']
+    return stats
+
+async def rebuild_dashboard_stats() -> dict:
+    stats = await compute_dashboard_stats()
+    await db.stats.update_one({"id": STATS_ID}, {"$set": stats}, upsert=True)
+    return stats
+
+async def check_dashboard_stats() -> dict:
+    """Diff the live rollup against a fresh rebuild. Returns {field: {live, actual}}."""
+    live = await db.stats.find_one({"id": STATS_ID}, {"_id": 0, "id": 0}) or {}
+    actual = await compute_dashboard_stats()
+
+    diff = {}
+    for field, value in actual.items():
+        if isinstance(value, dict):
+            for key, count in value.items():
+                live_count = live.get(field, {}).get(key, 0)
+                if live_count != count:
+                    diff[f"{field}.{key}"] = {"live": live_count, "actual": count}
+        elif round(live.get(field, 0), 2) != round(value, 2):
+            diff[field] = {"live": live.get(field, 0), "actual": value}
+    return diff
+
+# ============= PAGINATION =============
+
+# List endpoints page on an indexed (sort_key, _id) key. JSON responses carry the
+# opaque cursor for the next page in the X-Next-Cursor header; clients sending
+# Accept: application/x-ndjson get documents streamed straight from the cursor.
+PAGE_SIZE_MAX = 1000
+STREAM_BATCH_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+CURSOR_KEY_TYPES = (str, int, float, datetime, type(None))
+
+def encode_cursor(doc: dict, sort_key: str) -> str:
+    raw = json_util.dumps([doc.get(sort_key), str(doc['id'])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def keyset_query(query: dict, sort_key: str, cursor: Optional[str] = None, descending: bool = False):
+    """Return (filter, sort) for the page that starts after `cursor`; a
+    descending listing must be paged with descending=True throughout"""
+    direction, after_op = (DESCENDING, "$lt") if descending else (ASCENDING, "$gt")
+    sort = [(sort_key, direction), ("_id", direction)]
+    if not cursor:
+        return query, sort
+    
+    try:
+        last_key, last_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Anything else (a dict in particular) would be read as a query operator
+    if not isinstance(last_key, CURSOR_KEY_TYPES) or not isinstance(last_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    after = {"$or": [
+        {sort_key: {after_op: last_key}},
+        {sort_key: last_key, "_id": {after_op: as_uuid(last_id)}}
+    ]}
+    return ({"$and": [query, after]} if query else after), sort
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def ndjson_response(cursor, limit: Optional[int] = None) -> StreamingResponse:
+    if limit:
+        cursor = cursor.limit(limit)
+    cursor = cursor.batch_size(STREAM_BATCH_SIZE)
+    
+    async def stream():
+        async for doc in cursor:
+            yield orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE)
+    
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+async def fetch_page(cursor, sort_key: str, limit: Optional[int]):
+    """Return (docs, next_cursor) for one page"""
+    limit = limit or PAGE_SIZE_MAX
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1], sort_key)
+
+# ============= SERIALIZATION =============
+
+@lru_cache(maxsize=None)
+def model_projection(model) -> dict:
+    """Projection returning exactly the model's fields (with _id renamed to id),
+    so stored documents can be serialized without re-validation and never leak
+    extra fields"""
+    projection = {"_id": 0, **{field: 1 for field in model.model_fields}}
+    if "id" in model.model_fields:
+        projection["id"] = "$_id"
+    return projection
+
+@lru_cache(maxsize=None)
+def list_adapter(model) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+def serialize_list(model, docs: List[dict], next_cursor: Optional[str] = None) -> Response:
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    if SERIALIZATION_MODE == "validated":
+        adapter = list_adapter(model)
+        body = adapter.dump_json(adapter.validate_python(docs))
+        return Response(body, media_type="application/json", headers=headers)
+    return ORJSONResponse(docs, headers=headers)
+
+def serialize_one(model, doc: dict) -> Response:
+    if SERIALIZATION_MODE == "validated":
+        return Response(model.model_validate(doc).model_dump_json(), media_type="application/json")
+    return ORJSONResponse(doc)
+
 # ============= AUTH ROUTES =============
 
 @api_router.post("/auth/register", response_model=Token)
-async def register(user: UserCreate):
+async def register(user: UserCreate, request: Request):
+    await register_ip_limiter.check(client_ip(request))
+    
     existing = await db.users.find_one({"email": user.email})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -311,32 +982,61 @@ async def register(user: UserCreate):
         role=UserRole.CUSTOMER
     )
     
-    user_doc = user_obj.model_dump()
-    user_doc['created_at'] = user_doc['created_at'].isoformat()
-    user_doc['hashed_password'] = hash_password(user.password)
+    user_doc = to_document(user_obj)
+    user_doc['hashed_password'] = await hash_password(user.password)
     
     await db.users.insert_one(user_doc)
+    await bump_stats({"total_users": 1, f"role_distribution.{UserRole.CUSTOMER}": 1})
     
-    access_token = create_access_token(data={"sub": user.email})
-    
-    return Token(access_token=access_token, token_type="bearer", user=user_obj)
+    return await issue_tokens(user_obj)
 
 @api_router.post("/auth/login", response_model=Token)
-async def login(user_login: UserLogin):
-    user_data = await db.users.find_one({"email": user_login.email}, {"_id": 0})
+async def login(user_login: UserLogin, request: Request):
+    # Checked before the user lookup so rejected attempts cost no bcrypt work
+    await login_ip_limiter.check(client_ip(request))
+    await login_email_limiter.check(user_login.email.lower())
+    
+    user_data = await db.users.find_one(
+        {"email": user_login.email},
+        {**model_projection(User), "hashed_password": 1}
+    )
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not verify_password(user_login.password, user_data['hashed_password']):
+    if not await verify_password(user_login.password, user_data['hashed_password']):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if isinstance(user_data['created_at'], str):
-        user_data['created_at'] = datetime.fromisoformat(user_data['created_at'])
-    
     user_obj = User(**{k: v for k, v in user_data.items() if k != 'hashed_password'})
-    access_token = create_access_token(data={"sub": user_login.email})
     
-    return Token(access_token=access_token, token_type="bearer", user=user_obj)
+    return await issue_tokens(user_obj)
+
+@api_router.post("/auth/refresh", response_model=Token)
+async def refresh(refresh_request: RefreshRequest):
+    """Exchange a refresh token for a new access token and a new refresh token"""
+    record = await rotate_refresh_token(refresh_request.refresh_token)
+    
+    user_data = await db.users.find_one(id_query(record['user_id']), model_projection(User))
+    if not user_data:
+        raise HTTPException(status_code=401, detail="User not found")
+    user_obj = User(**user_data)
+    if not user_obj.is_active:
+        raise HTTPException(status_code=403, detail="User account is inactive")
+    
+    return await issue_tokens(user_obj, record['family_id'])
+
+@api_router.post("/auth/logout")
+async def logout(refresh_request: RefreshRequest):
+    """End the session the refresh token belongs to"""
+    record = await db.refresh_tokens.find_one({"_id": hash_refresh_token(refresh_request.refresh_token)}, {"family_id": 1})
+    if record:
+        await db.refresh_tokens.delete_many({"family_id": record['family_id']})
+    return {"message": "Logged out"}
+
+@api_router.post("/auth/sessions/revoke")
+async def revoke_my_sessions(current_user: User = Depends(get_current_user)):
+    """Sign out of every device; access tokens already issued expire on their own"""
+    revoked = await revoke_user_sessions(current_user.id)
+    return {"message": "All sessions revoked", "revoked": revoked}
 
 @api_router.get("/auth/me", response_model=User)
 async def get_me(current_user: User = Depends(get_current_user)):
@@ -357,39 +1057,44 @@ async def create_meter(meter: MeterCreate, current_user: User = Depends(get_curr
         customer_name=current_user.name
     )
     
-    meter_doc = meter_obj.model_dump()
-    meter_doc['created_at'] = meter_doc['created_at'].isoformat()
+    meter_doc = to_document(meter_obj)
     
     await db.meters.insert_one(meter_doc)
+    await bump_stats({"total_meters": 1})
     
     return meter_obj
 
 @api_router.get("/meters", response_model=List[WaterMeter])
-async def get_meters(current_user: User = Depends(get_current_user)):
+async def get_meters(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    current_user: User = Depends(get_current_user)
+):
     if current_user.has_permission(Permission.VIEW_ALL_METERS):
-        meters = await db.meters.find({}, {"_id": 0}).to_list(1000)
+        query = {}
     else:
-        meters = await db.meters.find({"customer_id": current_user.id}, {"_id": 0}).to_list(1000)
+        query = {"customer_id": current_user.id}
     
-    for meter in meters:
-        if isinstance(meter['created_at'], str):
-            meter['created_at'] = datetime.fromisoformat(meter['created_at'])
+    query, sort = keyset_query(query, "created_at", cursor)
+    meters_cursor = db.meters.find(query, model_projection(WaterMeter)).sort(sort)
+    if wants_ndjson(request):
+        return ndjson_response(meters_cursor, limit)
     
-    return meters
+    meters, next_cursor = await fetch_page(meters_cursor, "created_at", limit)
+    
+    return serialize_list(WaterMeter, meters, next_cursor)
 
 @api_router.get("/meters/{meter_id}", response_model=WaterMeter)
 async def get_meter(meter_id: str, current_user: User = Depends(get_current_user)):
-    meter_data = await db.meters.find_one({"id": meter_id}, {"_id": 0})
+    meter_data = await db.meters.find_one(id_query(meter_id), model_projection(WaterMeter))
     if not meter_data:
         raise HTTPException(status_code=404, detail="Meter not found")
     
     if not current_user.has_permission(Permission.VIEW_ALL_METERS) and meter_data['customer_id'] != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    if isinstance(meter_data['created_at'], str):
-        meter_data['created_at'] = datetime.fromisoformat(meter_data['created_at'])
-    
-    return WaterMeter(**meter_data)
+    return serialize_one(WaterMeter, meter_data)
 
 @api_router.put("/meters/{meter_id}/property")
 async def link_meter_to_property(
@@ -399,7 +1104,7 @@ async def link_meter_to_property(
 ):
     """Link meter to a property"""
     # Check meter exists and user has access
-    meter_data = await db.meters.find_one({"id": meter_id})
+    meter_data = await db.meters.find_one(id_query(meter_id))
     if not meter_data:
         raise HTTPException(status_code=404, detail="Meter not found")
     
@@ -407,7 +1112,7 @@ async def link_meter_to_property(
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Check property exists and is approved
-    property_data = await db.properties.find_one({"id": link.property_id})
+    property_data = await db.properties.find_one(id_query(link.property_id))
     if not property_data:
         raise HTTPException(status_code=404, detail="Property not found")
     
@@ -416,7 +1121,7 @@ async def link_meter_to_property(
     
     # Update meter
     await db.meters.update_one(
-        {"id": meter_id},
+        id_query(meter_id),
         {"$set": {
             "property_id": link.property_id,
             "property_name": property_data['name']
@@ -425,6 +1130,277 @@ async def link_meter_to_property(
     
     return {"message": "Meter linked to property successfully"}
 
+# ============= METER READINGS =============
+
+async def iter_body_lines(chunks):
+    """Yield complete lines from a stream of body chunks"""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+async def iter_body_rows(chunks, content_type: str):
+    """Yield (line_number, row dict) from an NDJSON or CSV body; malformed
+    NDJSON lines and lines that aren't UTF-8 yield None"""
+    is_csv = "csv" in content_type
+    header = None
+    line_number = 0
+    async for raw in iter_body_lines(chunks):
+        line_number += 1
+        line = raw.strip()
+        if not line:
+            continue
+        if not is_csv:
+            try:
+                yield line_number, orjson.loads(line)
+            except orjson.JSONDecodeError:
+                yield line_number, None
+            continue
+        try:
+            values = next(csv.reader([line.decode()]))
+        except UnicodeDecodeError:
+            if header is None:
+                # No usable column names: every following row fails validation
+                header = []
+            yield line_number, None
+            continue
+        if header is None:
+            header = [v.strip() for v in values]
+            continue
+        yield line_number, dict(zip(header, values))
+
+def _hour_bucket(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def _day_bucket(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+# Rollup collections, coarsest last, with the longest range each one serves
+# before the consumption endpoint switches to the next one
+CONSUMPTION_ROLLUPS = [
+    ("raw", "readings", None, timedelta(days=1)),
+    ("hour", "readings_hourly", _hour_bucket, timedelta(days=31)),
+    ("day", "readings_daily", _day_bucket, None),
+]
+
+def rollup_operations(docs: List[dict], bucket_fn) -> List[UpdateOne]:
+    totals = {}
+    for doc in docs:
+        key = (doc['meter_id'], bucket_fn(doc['reading_time']))
+        consumption, cost, count = totals.get(key, (0.0, 0.0, 0))
+        totals[key] = (consumption + doc['consumption'], cost + doc['cost'], count + 1)
+    return [
+        UpdateOne(
+            {"meter_id": meter_id, "bucket": bucket},
+            {"$inc": {"consumption": consumption, "cost": cost, "readings": count}},
+            upsert=True
+        )
+        for (meter_id, bucket), (consumption, cost, count) in totals.items()
+    ]
+
+async def apply_reading_batch(batch: dict, water_rate: float, result: dict):
+    """Store a deduplicated batch of readings, debit the affected meters and
+    update the hourly and daily rollups.
+    
+    `batch` maps (meter_id, reading_time) -> (line_number, reading). The
+    time-series readings collection can't carry a unique index, so
+    redeliveries are detected by inserting their keys into reading_keys
+    first; only readings whose key was new are stored and billed.
+    
+    Keys are claimed as pending and confirmed once the readings are stored
+    and the meters debited. If either step raises, the batch's claims are
+    released so a client retry is applied rather than deduplicated; a claim
+    left pending by a crashed worker is taken over once it is older than
+    READING_CLAIM_LEASE_SECONDS. The rollups are written after confirming,
+    so a rollup failure never leads to a second debit.
+    """
+    meter_ids = list({meter_id for meter_id, _ in batch})
+    known_meters = {
+        str(m['_id']) async for m in db.meters.find({"_id": {"$in": [as_uuid(i) for i in meter_ids]}}, {"_id": 1})
+    }
+    
+    docs = []
+    now = datetime.now(timezone.utc)
+    for (meter_id, _), (line_number, reading) in batch.items():
+        if meter_id not in known_meters:
+            result['rejected'] += 1
+            if len(result['errors']) < INGEST_MAX_ERRORS:
+                result['errors'].append({"line": line_number, "error": "Unknown meter"})
+            continue
+        docs.append({
+            "meter_id": meter_id,
+            "reading_time": reading.reading_time,
+            "consumption": reading.consumption,
+            "cost": reading.consumption * water_rate,
+            "ingested_at": now
+        })
+    if not docs:
+        return
+    
+    keys = [{"m": doc['meter_id'], "t": doc['reading_time']} for doc in docs]
+    duplicate_indexes = set()
+    try:
+        await db.reading_keys.insert_many(
+            [{"_id": key, "ingested_at": now, "pending": True} for key in keys],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        for error in e.details['writeErrors']:
+            if error['code'] != 11000:
+                raise
+            duplicate_indexes.add(error['index'])
+    
+    if duplicate_indexes:
+        # Keys read back hold the reading time as stored: UTC, millisecond precision
+        def stored_key(meter_id: str, reading_time: datetime) -> tuple:
+            reading_time = reading_time.astimezone(timezone.utc)
+            return meter_id, reading_time.replace(microsecond=reading_time.microsecond // 1000 * 1000)
+        positions = {stored_key(keys[index]['m'], keys[index]['t']): index for index in duplicate_indexes}
+        stale = now - timedelta(seconds=READING_CLAIM_LEASE_SECONDS)
+        abandoned = db.reading_keys.find(
+            {"_id": {"$in": [keys[index] for index in duplicate_indexes]}, "pending": True, "ingested_at": {"$lt": stale}},
+            {"_id": 1}
+        )
+        async for key_doc in abandoned:
+            taken = await db.reading_keys.update_one(
+                {"_id": key_doc['_id'], "pending": True, "ingested_at": {"$lt": stale}},
+                {"$set": {"ingested_at": now}}
+            )
+            if taken.modified_count:
+                duplicate_indexes.discard(positions.get(stored_key(key_doc['_id']['m'], key_doc['_id']['t'])))
+    
+    claimed = [key for index, key in enumerate(keys) if index not in duplicate_indexes]
+    docs = [doc for index, doc in enumerate(docs) if index not in duplicate_indexes]
+    result['duplicates'] += len(duplicate_indexes)
+    if not docs:
+        return
+    
+    debits = {}
+    for doc in docs:
+        debits[doc['meter_id']] = debits.get(doc['meter_id'], 0.0) + doc['cost']
+    try:
+        await db.readings.insert_many(docs, ordered=False)
+        await db.meters.bulk_write(
+            [UpdateOne(id_query(meter_id), {"$inc": {"balance": -cost}}) for meter_id, cost in debits.items()],
+            ordered=False
+        )
+    except BaseException:
+        await db.reading_keys.delete_many({"_id": {"$in": claimed}, "pending": True})
+        raise
+    # Billed: from here on a retry must be deduplicated even if the rollups fail
+    await db.reading_keys.update_many({"_id": {"$in": claimed}}, {"$unset": {"pending": ""}})
+    
+    for _, collection, bucket_fn, _ in CONSUMPTION_ROLLUPS[1:]:
+        await db[collection].bulk_write(rollup_operations(docs, bucket_fn), ordered=False)
+    
+    result['inserted'] += len(docs)
+    result['debited_meters'] += len(debits)
+
+async def ensure_readings_collection():
+    """Create readings as a time-series collection keyed by meter"""
+    existing = await db.list_collection_names(filter={"name": "readings"})
+    if existing:
+        return
+    try:
+        await db.create_collection(
+            "readings",
+            timeseries={"timeField": "reading_time", "metaField": "meter_id", "granularity": "minutes"}
+        )
+    except OperationFailure as e:
+        # Time-series collections need MongoDB 5.0+; fall back to a regular collection
+        logger.warning(f"Could not create time-series readings collection: {str(e)}")
+
+@api_router.post("/readings/ingest")
+async def ingest_readings(
+    request: Request,
+    current_user: User = Depends(require_permission(Permission.INGEST_READINGS))
+):
+    """Bulk ingest meter readings streamed as NDJSON or CSV (meter_id,reading_time,consumption)"""
+    water_rate = await get_water_rate()
+    result = {"received": 0, "inserted": 0, "duplicates": 0, "rejected": 0, "debited_meters": 0, "errors": []}
+    batch = {}
+    
+    async for line_number, row in iter_body_rows(request.stream(), request.headers.get("content-type", "")):
+        result['received'] += 1
+        try:
+            if row is None:
+                raise ValueError("Malformed line")
+            reading = MeterReadingIn.model_validate(row)
+        except (ValidationError, ValueError) as e:
+            result['rejected'] += 1
+            if len(result['errors']) < INGEST_MAX_ERRORS:
+                result['errors'].append({"line": line_number, "error": str(e)})
+            continue
+        
+        key = (reading.meter_id, reading.reading_time)
+        if key in batch:
+            result['duplicates'] += 1
+            continue
+        batch[key] = (line_number, reading)
+        
+        if len(batch) >= INGEST_BATCH_SIZE:
+            await apply_reading_batch(batch, water_rate, result)
+            batch = {}
+    
+    if batch:
+        await apply_reading_batch(batch, water_rate, result)
+    
+    logger.info(f"Readings ingested by {current_user.email}: {result['inserted']} inserted, "
+                f"{result['duplicates']} duplicates, {result['rejected']} rejected")
+    
+    return result
+
+@api_router.get("/meters/{meter_id}/consumption")
+async def get_meter_consumption(
+    meter_id: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    granularity: str = "auto",
+    current_user: User = Depends(get_current_user)
+):
+    """Consumption history, read from the coarsest rollup that fits the range"""
+    meter_data = await db.meters.find_one(id_query(meter_id), {"_id": 0, "customer_id": 1})
+    if not meter_data:
+        raise HTTPException(status_code=404, detail="Meter not found")
+    
+    if not current_user.has_permission(Permission.VIEW_ALL_METERS) and meter_data['customer_id'] != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=30)
+    start, end = [t if t.tzinfo else t.replace(tzinfo=timezone.utc) for t in (start, end)]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    
+    rollups = {name: (collection, max_span) for name, collection, _, max_span in CONSUMPTION_ROLLUPS}
+    if granularity == "auto":
+        span = end - start
+        granularity = next(name for name, _, _, max_span in CONSUMPTION_ROLLUPS if max_span is None or span <= max_span)
+    elif granularity not in rollups:
+        raise HTTPException(status_code=400, detail=f"granularity must be auto or one of {list(rollups)}")
+    
+    collection, _ = rollups[granularity]
+    time_field = "reading_time" if granularity == "raw" else "bucket"
+    cursor = db[collection].find(
+        {"meter_id": meter_id, time_field: {"$gte": start, "$lt": end}},
+        {"_id": 0, "time": f"${time_field}", "consumption": 1, "cost": 1}
+    ).sort(time_field, ASCENDING)
+    points = [point async for point in cursor]
+    
+    return ORJSONResponse({
+        "meter_id": meter_id,
+        "granularity": granularity,
+        "from": start,
+        "to": end,
+        "total_consumption": sum(p['consumption'] for p in points),
+        "points": points
+    })
+
 # ============= PROPERTY ROUTES =============
 
 @api_router.post("/properties", response_model=Property)
@@ -452,47 +1428,48 @@ async def create_property(property_data: PropertyCreate, current_user: User = De
         status=PropertyStatus.PENDING
     )
     
-    property_doc = property_obj.model_dump()
-    property_doc['created_at'] = property_doc['created_at'].isoformat()
+    property_doc = to_document(property_obj)
     
     await db.properties.insert_one(property_doc)
+    await bump_stats({"total_properties": 1, f"property_stats.{PropertyStatus.PENDING}": 1})
     
     logger.info(f"Property created: {property_obj.id} by {current_user.email}")
     
     return property_obj
 
 @api_router.get("/properties", response_model=List[Property])
-async def get_properties(current_user: User = Depends(get_current_user)):
+async def get_properties(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    current_user: User = Depends(get_current_user)
+):
     """Get properties list"""
     if current_user.has_permission(Permission.VIEW_ALL_PROPERTIES):
-        properties = await db.properties.find({}, {"_id": 0}).to_list(1000)
+        query = {}
     else:
-        properties = await db.properties.find({"owner_id": current_user.id}, {"_id": 0}).to_list(1000)
+        query = {"owner_id": current_user.id}
+    
+    query, sort = keyset_query(query, "created_at", cursor)
+    properties_cursor = db.properties.find(query, model_projection(Property)).sort(sort)
+    if wants_ndjson(request):
+        return ndjson_response(properties_cursor, limit)
     
-    for prop in properties:
-        if isinstance(prop['created_at'], str):
-            prop['created_at'] = datetime.fromisoformat(prop['created_at'])
-        if prop.get('verified_at') and isinstance(prop['verified_at'], str):
-            prop['verified_at'] = datetime.fromisoformat(prop['verified_at'])
+    properties, next_cursor = await fetch_page(properties_cursor, "created_at", limit)
     
-    return properties
+    return serialize_list(Property, properties, next_cursor)
 
 @api_router.get("/properties/{property_id}", response_model=Property)
 async def get_property(property_id: str, current_user: User = Depends(get_current_user)):
     """Get property details"""
-    property_data = await db.properties.find_one({"id": property_id}, {"_id": 0})
+    property_data = await db.properties.find_one(id_query(property_id), model_projection(Property))
     if not property_data:
         raise HTTPException(status_code=404, detail="Property not found")
     
     if not current_user.has_permission(Permission.VIEW_ALL_PROPERTIES) and property_data['owner_id'] != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    if isinstance(property_data['created_at'], str):
-        property_data['created_at'] = datetime.fromisoformat(property_data['created_at'])
-    if property_data.get('verified_at') and isinstance(property_data['verified_at'], str):
-        property_data['verified_at'] = datetime.fromisoformat(property_data['verified_at'])
-    
-    return Property(**property_data)
+    return serialize_one(Property, property_data)
 
 @api_router.put("/properties/{property_id}")
 async def update_property(
@@ -501,7 +1478,7 @@ async def update_property(
     current_user: User = Depends(get_current_user)
 ):
     """Update property"""
-    property_data = await db.properties.find_one({"id": property_id})
+    property_data = await db.properties.find_one(id_query(property_id))
     if not property_data:
         raise HTTPException(status_code=404, detail="Property not found")
     
@@ -517,9 +1494,14 @@ async def update_property(
         update_data['verified_at'] = None
     
     await db.properties.update_one(
-        {"id": property_id},
+        id_query(property_id),
         {"$set": update_data}
     )
+    if property_data['status'] == PropertyStatus.APPROVED:
+        await bump_stats({
+            f"property_stats.{PropertyStatus.APPROVED}": -1,
+            f"property_stats.{PropertyStatus.PENDING}": 1
+        })
     
     logger.info(f"Property updated: {property_id} by {current_user.email}")
     
@@ -532,7 +1514,7 @@ async def verify_property(
     current_user: User = Depends(require_permission(Permission.VERIFY_PROPERTY))
 ):
     """Verify property (approve/reject)"""
-    property_data = await db.properties.find_one({"id": property_id})
+    property_data = await db.properties.find_one(id_query(property_id))
     if not property_data:
         raise HTTPException(status_code=404, detail="Property not found")
     
@@ -540,26 +1522,78 @@ async def verify_property(
         raise HTTPException(status_code=400, detail="Status must be approved or rejected")
     
     await db.properties.update_one(
-        {"id": property_id},
+        id_query(property_id),
         {"$set": {
             "status": verify_data.status,
             "verification_note": verify_data.note,
             "verified_by": current_user.email,
-            "verified_at": datetime.now(timezone.utc).isoformat()
+            "verified_at": datetime.now(timezone.utc)
         }}
     )
+    if property_data['status'] != verify_data.status:
+        await bump_stats({
+            f"property_stats.{property_data['status']}": -1,
+            f"property_stats.{verify_data.status}": 1
+        })
     
     logger.info(f"Property {property_id} {verify_data.status} by {current_user.email}")
     
     return {"message": f"Property {verify_data.status} successfully"}
 
+async def find_existing(collection, ids: List[str], fields: dict) -> dict:
+    """Fetch the given ids in one query, keyed by their string id"""
+    docs = db[collection].find({"_id": {"$in": [as_uuid(i) for i in ids]}}, {"_id": 1, **fields})
+    return {str(doc['_id']): doc async for doc in docs}
+
+def bulk_result(item_id: str, ok: bool, detail: str) -> dict:
+    return {"id": item_id, "status": "updated" if ok else "error", "detail": detail}
+
+@api_router.put("/admin/properties/verify")
+async def bulk_verify_properties(
+    bulk: BulkPropertyVerify,
+    current_user: User = Depends(require_permission(Permission.VERIFY_PROPERTY))
+):
+    """Approve or reject many properties in one bulk_write"""
+    if bulk.status not in [PropertyStatus.APPROVED, PropertyStatus.REJECTED]:
+        raise HTTPException(status_code=400, detail="Status must be approved or rejected")
+    
+    property_ids = list(dict.fromkeys(bulk.property_ids))
+    existing = await find_existing("properties", property_ids, {"status": 1})
+    
+    results, operations, stats = [], [], {}
+    now = datetime.now(timezone.utc)
+    for property_id in property_ids:
+        property_data = existing.get(property_id)
+        if not property_data:
+            results.append(bulk_result(property_id, False, "Property not found"))
+            continue
+        operations.append(UpdateOne(id_query(property_id), {"$set": {
+            "status": bulk.status,
+            "verification_note": bulk.note,
+            "verified_by": current_user.email,
+            "verified_at": now
+        }}))
+        if property_data['status'] != bulk.status:
+            old_key = f"property_stats.{property_data['status']}"
+            stats[old_key] = stats.get(old_key, 0) - 1
+            stats[f"property_stats.{bulk.status}"] = stats.get(f"property_stats.{bulk.status}", 0) + 1
+        results.append(bulk_result(property_id, True, f"Property {bulk.status}"))
+    
+    if operations:
+        await db.properties.bulk_write(operations, ordered=False)
+        await bump_stats(stats)
+    
+    logger.info(f"{len(operations)} properties {bulk.status} by {current_user.email}")
+    
+    return {"updated": len(operations), "failed": len(results) - len(operations), "results": results}
+
 @api_router.delete("/properties/{property_id}")
 async def delete_property(
     property_id: str,
     current_user: User = Depends(require_permission(Permission.DELETE_PROPERTY))
 ):
     """Delete property"""
-    property_data = await db.properties.find_one({"id": property_id})
+    property_data = await db.properties.find_one(id_query(property_id))
     if not property_data:
         raise HTTPException(status_code=404, detail="Property not found")
     
@@ -568,17 +1602,808 @@ async def delete_property(
     if linked_meters > 0:
         raise HTTPException(status_code=400, detail="Cannot delete property with linked meters")
     
-    await db.properties.delete_one({"id": property_id})
+    await db.properties.delete_one(id_query(property_id))
+    await bump_stats({"total_properties": -1, f"property_stats.{property_data['status']}": -1})
     
     logger.info(f"Property deleted: {property_id} by {current_user.email}")
     
     return {"message": "Property deleted successfully"}
 
+# ============= IMPORTS =============
+
+# Bulk onboarding of meters and properties from a streamed CSV or NDJSON body.
+# Rows are validated against the create models and inserted in unordered
+# chunks; duplicates are reported by the unique indexes on meters.meter_number
+# and properties.import_ref rather than looked up row by row. The upload is
+# spooled and acknowledged with 202 and the job id; a background task then
+# imports it, tracking progress in import_jobs and every rejected row in
+# import_errors.
+
+VALID_PROPERTY_TYPES = [PropertyType.RESIDENTIAL, PropertyType.COMMERCIAL, PropertyType.INDUSTRIAL,
+                        PropertyType.BOARDING_HOUSE, PropertyType.RENTAL, PropertyType.OTHER]
+
+def build_meter(row: dict, owner: dict) -> dict:
+    meter = MeterCreate.model_validate(row)
+    return to_document(WaterMeter(
+        meter_number=meter.meter_number,
+        location=meter.location,
+        customer_id=owner['id'],
+        customer_name=owner['name']
+    ))
+
+def build_property(row: dict, owner: dict) -> dict:
+    property_data = PropertyCreate.model_validate(row)
+    if property_data.property_type not in VALID_PROPERTY_TYPES:
+        raise ValueError("Invalid property type")
+    doc = to_document(Property(
+        **property_data.model_dump(),
+        owner_id=owner['id'],
+        owner_name=owner['name'],
+        status=PropertyStatus.PENDING
+    ))
+    if row.get('import_ref'):
+        doc['import_ref'] = str(row['import_ref'])
+    return doc
+
+# kind -> (collection, row builder, owner column, permission to assign other owners, stats per insert)
+IMPORT_TARGETS = {
+    "meters": ("meters", build_meter, "customer_email", Permission.VIEW_ALL_METERS,
+               lambda n: {"total_meters": n}),
+    "properties": ("properties", build_property, "owner_email", Permission.VIEW_ALL_PROPERTIES,
+                   lambda n: {"total_properties": n, f"property_stats.{PropertyStatus.PENDING}": n}),
+}
+
+async def import_chunk(kind: str, chunk: List[tuple], current_user: User, counts: dict, errors: List[dict]):
+    """Build and insert one chunk of (line_number, row) pairs"""
+    collection, build, owner_column, assign_permission, stats = IMPORT_TARGETS[kind]
+    
+    emails = {row[owner_column] for _, row in chunk if isinstance(row.get(owner_column), str) and row[owner_column]}
+    owners = {}
+    if emails and current_user.has_permission(assign_permission):
+        async for user in db.users.find({"email": {"$in": list(emails)}}, {"_id": 1, "email": 1, "name": 1}):
+            owners[user['email']] = {"id": str(user['_id']), "name": user['name']}
+    
+    docs, lines = [], []
+    for line_number, row in chunk:
+        email = row.get(owner_column)
+        try:
+            if email is not None and not isinstance(email, str):
+                raise ValueError(f"{owner_column} must be a string")
+            owner = owners.get(email) if email else {"id": current_user.id, "name": current_user.name}
+            if owner is None:
+                raise ValueError(f"Unknown {owner_column}" if current_user.has_permission(assign_permission)
+                                 else f"Not allowed to set {owner_column}")
+            docs.append(build(row, owner))
+            lines.append(line_number)
+        except (ValidationError, ValueError) as e:
+            counts['rejected'] += 1
+            errors.append({"line": line_number, "error": str(e)})
+    if not docs:
+        return
+    
+    inserted = len(docs)
+    try:
+        await db[collection].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        inserted = e.details['nInserted']
+        for error in e.details['writeErrors']:
+            if error['code'] != 11000:
+                raise
+            counts['duplicates'] += 1
+            errors.append({"line": lines[error['index']], "error": f"Duplicate: {error.get('keyValue')}"})
+    
+    counts['inserted'] += inserted
+    if inserted:
+        await bump_stats(stats(inserted))
+
+async def spool_body(request: Request):
+    """Copy the request body to a temporary file, in memory up to
+    IMPORT_SPOOL_MEMORY_BYTES, so it can be read after the response is sent.
+    Bodies over IMPORT_MAX_BYTES are refused with 413 as soon as they get there"""
+    too_large = HTTPException(status_code=413, detail=f"Upload exceeds {IMPORT_MAX_BYTES} bytes")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > IMPORT_MAX_BYTES:
+        raise too_large
+    
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MEMORY_BYTES)
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > IMPORT_MAX_BYTES:
+                raise too_large
+            # Once past the in-memory size the spool is a real file, so the
+            # write goes to a thread rather than blocking the event loop
+            if received > IMPORT_SPOOL_MEMORY_BYTES:
+                await asyncio.to_thread(spool.write, chunk)
+            else:
+                spool.write(chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+async def iter_spool(spool, chunk_size: int = 64 * 1024):
+    while True:
+        chunk = await asyncio.to_thread(spool.read, chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+async def run_import(kind: str, job: ImportJob, spool, content_type: str, current_user: User):
+    counts = {"received": 0, "inserted": 0, "duplicates": 0, "rejected": 0}
+    errors, chunk = [], []
+    
+    async def flush():
+        if chunk:
+            await import_chunk(kind, chunk, current_user, counts, errors)
+            chunk.clear()
+        if errors:
+            now = datetime.now(timezone.utc)
+            await db.import_errors.insert_many([{"job_id": job.id, "created_at": now, **error} for error in errors])
+            errors.clear()
+        await db.import_jobs.update_one(id_query(job.id), {"$set": counts})
+    
+    job_status = "failed"
+    try:
+        async for line_number, row in iter_body_rows(iter_spool(spool), content_type):
+            counts['received'] += 1
+            if not isinstance(row, dict):
+                counts['rejected'] += 1
+                errors.append({"line": line_number, "error": "Malformed line"})
+                continue
+            # Empty CSV cells mean "not set", not an empty value
+            chunk.append((line_number, {k: v for k, v in row.items() if v != ""}))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await flush()
+        await flush()
+        job_status = "completed"
+    except Exception as e:
+        logger.error(f"Import {job.id} of {kind} failed: {str(e)}")
+    finally:
+        spool.close()
+        await db.import_jobs.update_one(
+            id_query(job.id),
+            {"$set": {**counts, "status": job_status, "finished_at": datetime.now(timezone.utc)}}
+        )
+    
+    logger.info(f"Import {job.id} of {kind} by {current_user.email}: {counts['inserted']} inserted, "
+                f"{counts['duplicates']} duplicates, {counts['rejected']} rejected")
+
+# Running imports, referenced so they aren't garbage collected and can be
+# cancelled on shutdown
+import_tasks = set()
+
+async def start_import(kind: str, request: Request, current_user: User) -> Response:
+    """Spool the upload, start importing it in the background and answer 202
+    with the job; progress is polled through GET /imports/{job_id}"""
+    spool = await spool_body(request)
+    job = ImportJob(kind=kind, created_by=current_user.id)
+    try:
+        await db.import_jobs.insert_one(to_document(job))
+    except BaseException:
+        spool.close()
+        raise
+    task = asyncio.create_task(run_import(kind, job, spool, request.headers.get("content-type", ""), current_user))
+    import_tasks.add(task)
+    task.add_done_callback(import_tasks.discard)
+    
+    response = serialize_one(ImportJob, job.model_dump())
+    response.status_code = 202
+    response.headers["Location"] = f"/api/imports/{job.id}"
+    return response
+
+@api_router.post("/meters/import", response_model=ImportJob, status_code=202)
+async def import_meters(
+    request: Request,
+    current_user: User = Depends(require_permission(Permission.CREATE_METER))
+):
+    """Bulk create meters from CSV or NDJSON (meter_number,location[,customer_email])"""
+    return await start_import("meters", request, current_user)
+
+@api_router.post("/properties/import", response_model=ImportJob, status_code=202)
+async def import_properties(
+    request: Request,
+    current_user: User = Depends(require_permission(Permission.CREATE_PROPERTY))
+):
+    """Bulk create properties from CSV or NDJSON (PropertyCreate fields[,owner_email,import_ref])"""
+    return await start_import("properties", request, current_user)
+
+@api_router.get("/imports", response_model=List[ImportJob])
+async def get_imports(current_user: User = Depends(get_current_user)):
+    """The caller's most recent import jobs, newest first"""
+    jobs = await db.import_jobs.find({"created_by": current_user.id}, model_projection(ImportJob)) \
+        .sort("_id", DESCENDING).limit(20).to_list(20)
+    return serialize_list(ImportJob, jobs)
+
+async def find_import_job(job_id: str, current_user: User) -> dict:
+    job = await db.import_jobs.find_one(id_query(job_id), model_projection(ImportJob))
+    if not job or str(job['created_by']) != current_user.id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@api_router.get("/imports/{job_id}", response_model=ImportJob)
+async def get_import(job_id: str, current_user: User = Depends(get_current_user)):
+    """Progress of an import, updated after every chunk"""
+    return serialize_one(ImportJob, await find_import_job(job_id, current_user))
+
+@api_router.get("/imports/{job_id}/errors")
+async def get_import_errors(job_id: str, current_user: User = Depends(get_current_user)):
+    """Download the rejected rows of an import as CSV (line,error)"""
+    job = await find_import_job(job_id, current_user)
+    cursor = db.import_errors.find({"job_id": str(job['id'])}, {"_id": 0, "line": 1, "error": 1}) \
+        .sort("line", ASCENDING).batch_size(STREAM_BATCH_SIZE)
+    
+    async def stream():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["line", "error"])
+        async for error in cursor:
+            writer.writerow([error['line'], error['error']])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="import-{job_id}-errors.csv"'}
+    )
+
+# ============= EXPORTS =============
+
+# entity -> (collection, model, date field). Only model fields are exported,
+# so password hashes and internal flags never leave the database.
+EXPORT_TARGETS = {
+    "transactions": ("transactions", Transaction, "transaction_time"),
+    "meters": ("meters", WaterMeter, "created_at"),
+    "properties": ("properties", Property, "created_at"),
+    "users": ("users", User, "created_at"),
+}
+USER_EXPORT_STATUSES = {"active": True, "inactive": False}
+
+def export_filter(entity: str, date_field: str, start: Optional[datetime], end: Optional[datetime],
+                  status_filter: Optional[str]) -> dict:
+    query = {}
+    if start or end:
+        start, end = [t if not t or t.tzinfo else t.replace(tzinfo=timezone.utc) for t in (start, end)]
+        query[date_field] = {**({"$gte": start} if start else {}), **({"$lt": end} if end else {})}
+    if status_filter:
+        if entity == "users":
+            if status_filter not in USER_EXPORT_STATUSES:
+                raise HTTPException(status_code=400, detail="User status must be active or inactive")
+            query["is_active"] = USER_EXPORT_STATUSES[status_filter]
+        else:
+            query["status"] = status_filter
+    return query
+
+def csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+async def export_csv_rows(cursor, fields: List[str]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([csv_value(doc.get(field)) for field in fields])
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+async def export_ndjson_rows(cursor):
+    chunk = []
+    async for doc in cursor:
+        chunk.append(orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE))
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield b"".join(chunk)
+            chunk = []
+    yield b"".join(chunk)
+
+async def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@api_router.get("/export/{entity}")
+async def export_data(
+    entity: str,
+    format: str = "csv",
+    gzip: bool = False,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    current_user: User = Depends(require_permission(Permission.EXPORT_DATA))
+):
+    """Stream a full export as CSV or NDJSON (optionally gzip-compressed) in
+    constant memory, straight from the server-side cursor"""
+    if entity not in EXPORT_TARGETS:
+        raise HTTPException(status_code=404, detail=f"Unknown export; choose one of {list(EXPORT_TARGETS)}")
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    
+    collection, model, date_field = EXPORT_TARGETS[entity]
+    query = export_filter(entity, date_field, start, end, status_filter)
+    cursor = db[collection].find(query, model_projection(model)) \
+        .sort([(date_field, ASCENDING), ("_id", ASCENDING)]) \
+        .batch_size(EXPORT_BATCH_SIZE)
+    
+    if format == "csv":
+        body, media_type = export_csv_rows(cursor, list(model.model_fields)), "text/csv"
+    else:
+        body, media_type = export_ndjson_rows(cursor), NDJSON_MEDIA_TYPE
+    filename = f"{entity}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}.{format}"
+    if gzip:
+        body, media_type, filename = gzip_stream(body), "application/gzip", f"{filename}.gz"
+    
+    logger.info(f"Export of {entity} ({format}{', gzip' if gzip else ''}) started by {current_user.email}")
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# ============= REPORTS =============
+
+# Two rollups back the reporting API, both keyed by UTC day:
+#   report_status_daily   {day, status, count, amount}
+#   report_revenue_daily  {day, city, property_type, payment_method, revenue, count}
+# They are bumped as transactions are created and change status, and rebuilt
+# from the transactions collection on a schedule. City and property type are
+# copied onto each transaction at purchase time so neither path needs a join.
+UNASSIGNED = "unassigned"
+
+REPORT_GROUPINGS = {
+    "day": "$day",
+    "week": {"$dateTrunc": {"date": "$day", "unit": "week", "startOfWeek": "monday"}},
+    "month": {"$dateTrunc": {"date": "$day", "unit": "month"}},
+    "city": "$city",
+    "property_type": "$property_type",
+    "payment_method": "$payment_method",
+}
+
+def revenue_key(trans: dict) -> dict:
+    return {
+        "day": _day_bucket(trans['transaction_time']),
+        "city": trans.get('city') or UNASSIGNED,
+        "property_type": trans.get('property_type') or UNASSIGNED,
+        "payment_method": trans['payment_method'],
+    }
+
+async def record_report_changes(changes: List[tuple]):
+    """Apply (transaction, old_status, new_status) changes to the report rollups.
+    old_status is None for a newly created transaction."""
+    status_inc, revenue_inc = {}, {}
+    for trans, old_status, new_status in changes:
+        day = _day_bucket(trans['transaction_time'])
+        for status_key, sign in ((old_status, -1), (new_status, 1)):
+            if status_key is None:
+                continue
+            count, amount = status_inc.get((day, status_key), (0, 0.0))
+            status_inc[(day, status_key)] = (count + sign, amount + sign * trans['amount'])
+        
+        count_delta = (new_status in REVENUE_STATUSES) - (old_status in REVENUE_STATUSES)
+        revenue_delta = transaction_revenue(trans, new_status) - transaction_revenue(trans, old_status)
+        if not count_delta and not revenue_delta:
+            continue
+        key = tuple(revenue_key(trans).items())
+        count, revenue = revenue_inc.get(key, (0, 0.0))
+        revenue_inc[key] = (count + count_delta, revenue + revenue_delta)
+    
+    if status_inc:
+        await db.report_status_daily.bulk_write([
+            UpdateOne({"day": day, "status": status_key}, {"$inc": {"count": count, "amount": amount}}, upsert=True)
+            for (day, status_key), (count, amount) in status_inc.items()
+        ], ordered=False)
+    if revenue_inc:
+        await db.report_revenue_daily.bulk_write([
+            UpdateOne(dict(key), {"$inc": {"count": count, "revenue": revenue}}, upsert=True)
+            for key, (count, revenue) in revenue_inc.items()
+        ], ordered=False)
+
+# The status a transaction counts under in the rollups: the status before its
+# first pending effect, if it has one (None for a new transaction), else its status
+REPORTED_STATUS = {"$cond": [
+    {"$gt": [{"$size": {"$ifNull": ["$pending_effects", []]}}, 0]},
+    {"$arrayElemAt": ["$pending_effects.from", 0]},
+    "$status"
+]}
+
+async def reports_rebuilding() -> bool:
+    now = datetime.now(timezone.utc)
+    return await db.report_schedule.find_one({"_id": "running", "until": {"$gt": now}}, {"_id": 1}) is not None
+
+async def rebuild_reports():
+    """Recompute both rollups from transactions.
+    
+    $out swaps each collection in atomically, keeping its indexes, so an
+    increment landing while the aggregation runs would be lost. Instead the
+    rebuild marks itself running in report_schedule, and apply_payment_effects
+    leaves effects pending while it is: each transaction is aggregated at
+    REPORTED_STATUS, which can't change under the aggregation. Once both
+    collections are swapped in, the effects held back meanwhile are replayed
+    onto them.
+    """
+    now = datetime.now(timezone.utc)
+    until = now + timedelta(seconds=REPORT_REBUILD_LEASE_SECONDS)
+    try:
+        await db.report_schedule.insert_one({"_id": "running", "until": until})
+    except DuplicateKeyError:
+        taken = await db.report_schedule.find_one_and_update(
+            {"_id": "running", "until": {"$lte": now}}, {"$set": {"until": until}}
+        )
+        if taken is None:
+            raise RuntimeError("A report rebuild is already running")
+    
+    try:
+        await asyncio.sleep(REPORT_REBUILD_SETTLE_SECONDS)
+        reported = [
+            {"$set": {"status": REPORTED_STATUS}},
+            {"$match": {"status": {"$ne": None}}},
+        ]
+        day = {"$dateTrunc": {"date": "$transaction_time", "unit": "day", "timezone": "UTC"}}
+        await db.transactions.aggregate([
+            *reported,
+            {"$group": {"_id": {"day": day, "status": "$status"}, "count": {"$sum": 1}, "amount": {"$sum": "$amount"}}},
+            {"$project": {"_id": 0, "day": "$_id.day", "status": "$_id.status", "count": 1, "amount": 1}},
+            {"$out": "report_status_daily"},
+        ], allowDiskUse=True).to_list(None)
+        await db.transactions.aggregate([
+            *reported,
+            {"$match": {"status": {"$in": REVENUE_STATUSES}}},
+            {"$group": {
+                "_id": {
+                    "day": day,
+                    "city": {"$ifNull": ["$city", UNASSIGNED]},
+                    "property_type": {"$ifNull": ["$property_type", UNASSIGNED]},
+                    "payment_method": "$payment_method",
+                },
+                "count": {"$sum": 1},
+                "revenue": {"$sum": REVENUE_AMOUNT},
+            }},
+            {"$project": {
+                "_id": 0, "day": "$_id.day", "city": "$_id.city", "property_type": "$_id.property_type",
+                "payment_method": "$_id.payment_method", "count": 1, "revenue": 1,
+            }},
+            {"$out": "report_revenue_daily"},
+        ], allowDiskUse=True).to_list(None)
+    finally:
+        await db.report_schedule.delete_one({"_id": "running", "until": until})
+    report_cache.clear()
+    
+    held_back = await db.transactions.find(
+        {"pending_effects.at": {"$exists": True}}, PAYMENT_EFFECT_FIELDS
+    ).to_list(None)
+    await apply_payment_effects(held_back)
+
+class ReportCache:
+    """TTL cache with single-flight: concurrent requests for the same key share
+    one computation instead of each running the aggregation"""
+    
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+    
+    async def get(self, key, compute):
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        
+        task = self.inflight.get(key)
+        if task:
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self.inflight[key] = task
+            task.add_done_callback(lambda t: self._store(key, t))
+        # A cancelled request must not cancel the computation others are waiting on
+        return await asyncio.shield(task)
+    
+    def _store(self, key, task: asyncio.Task):
+        self.inflight.pop(key, None)
+        if task.cancelled() or task.exception():
+            return
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, task.result())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def clear(self):
+        self.entries.clear()
+    
+    def snapshot(self) -> dict:
+        return {"entries": len(self.entries), "inflight": len(self.inflight),
+                "hits": self.hits, "misses": self.misses, "shared": self.shared}
+
+report_cache = ReportCache(REPORT_CACHE_TTL_SECONDS)
+
+class ReportRebuilder:
+    """Runs rebuild_reports every REPORT_REBUILD_INTERVAL_SECONDS. The schedule
+    lives in report_schedule, so only one worker process rebuilds per interval;
+    a fresh database is rebuilt (backfilled) right away."""
+    
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.task: Optional[asyncio.Task] = None
+        self.last_rebuild: Optional[datetime] = None
+    
+    async def claim(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await db.report_schedule.insert_one({"_id": "rebuild", "next_run_at": now})
+        except DuplicateKeyError:
+            pass
+        claimed = await db.report_schedule.find_one_and_update(
+            {"_id": "rebuild", "next_run_at": {"$lte": now}},
+            {"$set": {"next_run_at": now + timedelta(seconds=self.interval_seconds)}}
+        )
+        return claimed is not None
+    
+    async def run(self):
+        while True:
+            try:
+                if await self.claim():
+                    started = time.monotonic()
+                    await rebuild_reports()
+                    self.last_rebuild = datetime.now(timezone.utc)
+                    logger.info(f"Report rollups rebuilt in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                logger.error(f"Report rebuild failed: {str(e)}")
+            await asyncio.sleep(min(self.interval_seconds, 300))
+    
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+report_rebuilder = ReportRebuilder(REPORT_REBUILD_INTERVAL_SECONDS)
+
+def report_range(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    # Default to whole days up to and including today, so repeated requests share a cache key
+    end = end or _day_bucket(datetime.now(timezone.utc)) + timedelta(days=1)
+    start = start or end - timedelta(days=30)
+    start, end = [t if t.tzinfo else t.replace(tzinfo=timezone.utc) for t in (start, end)]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    return {"$gte": _day_bucket(start), "$lt": end}
+
+@api_router.get("/reports/revenue")
+async def get_revenue_report(
+    group_by: str = "day",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))
+):
+    """Settled revenue grouped by day, week, month, city, property_type or payment_method"""
+    if group_by not in REPORT_GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {list(REPORT_GROUPINGS)}")
+    day_range = report_range(start, end)
+    
+    async def compute():
+        rows = await db.report_revenue_daily.aggregate([
+            {"$match": {"day": day_range}},
+            {"$group": {"_id": REPORT_GROUPINGS[group_by], "revenue": {"$sum": "$revenue"}, "count": {"$sum": "$count"}}},
+            {"$sort": {"_id": 1}},
+            {"$project": {"_id": 0, "key": "$_id", "revenue": 1, "count": 1}},
+        ]).to_list(None)
+        return {
+            "group_by": group_by,
+            "from": day_range["$gte"],
+            "to": day_range["$lt"],
+            "total_revenue": sum(row['revenue'] for row in rows),
+            "rows": rows,
+        }
+    
+    return ORJSONResponse(await report_cache.get(("revenue", group_by, day_range["$gte"], day_range["$lt"]), compute))
+
+@api_router.get("/reports/status")
+async def get_status_report(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))
+):
+    """Transaction counts and amounts per status, plus success/pending/failed totals"""
+    day_range = report_range(start, end)
+    
+    async def compute():
+        rows = await db.report_status_daily.aggregate([
+            {"$match": {"day": day_range}},
+            {"$group": {"_id": "$status", "count": {"$sum": "$count"}, "amount": {"$sum": "$amount"}}},
+        ]).to_list(None)
+        statuses = {row['_id']: {"count": row['count'], "amount": row['amount']} for row in rows if row['count']}
+        summary = {"success": 0, "pending": 0, "failed": 0}
+        for status_key, row in statuses.items():
+            if status_key in SETTLED_STATUSES:
+                summary["success"] += row['count']
+            elif status_key in OPEN_PAYMENT_STATUSES:
+                summary["pending"] += row['count']
+            else:
+                summary["failed"] += row['count']
+        return {"from": day_range["$gte"], "to": day_range["$lt"], "summary": summary, "statuses": statuses}
+    
+    return ORJSONResponse(await report_cache.get(("status", day_range["$gte"], day_range["$lt"]), compute))
+
+@api_router.get("/reports/stats")
+async def get_report_stats(current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))):
+    """Report cache counters and the time of the last full rebuild"""
+    return {"cache": report_cache.snapshot(), "last_rebuild": report_rebuilder.last_rebuild}
+
+# ============= PAYMENT GATEWAY =============
+
+class GatewayError(Exception):
+    pass
+
+class CircuitOpenError(GatewayError):
+    pass
+
+class SnapClient:
+    """Async Midtrans Snap client with a pooled keep-alive connection, per-call
+    timeouts, bounded concurrency, jittered retries and a circuit breaker.
+    
+    Creating a transaction isn't idempotent, so a call is only retried when the
+    gateway can't have acted on it: the connection was never made, or the
+    gateway turned it away with a 429 or 503. Once the circuit's reset time
+    has passed, a single probe call decides whether it closes again.
+    """
+    
+    RETRY_STATUS_CODES = {429, 503}
+    # The request never reached the gateway
+    RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    
+    def __init__(self, base_url: str, server_key: str, timeout: float, max_concurrency: int,
+                 max_retries: int, breaker_threshold: int, breaker_reset_seconds: float):
+        self.base_url = base_url
+        self.server_key = server_key
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.http: Optional[httpx.AsyncClient] = None
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.stats = {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "rejected_open_circuit": 0,
+            "latency_ms_total": 0.0,
+            "latency_ms_max": 0.0,
+        }
+    
+    def _client(self) -> httpx.AsyncClient:
+        if self.http is None:
+            self.http = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.server_key, ""),
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                ),
+                headers={"Accept": "application/json"}
+            )
+        return self.http
+    
+    def _check_circuit(self) -> bool:
+        """Raise while the circuit is open. Once it is half-open, returns True
+        for the one caller let through as the probe; everyone else is still
+        rejected until the probe's result is recorded."""
+        if self.opened_at is None:
+            return False
+        if self.probing or time.monotonic() - self.opened_at < self.breaker_reset_seconds:
+            self.stats['rejected_open_circuit'] += 1
+            raise CircuitOpenError("Payment gateway circuit is open")
+        self.probing = True
+        return True
+    
+    def _record_result(self, ok: bool, probe: bool = False):
+        if ok:
+            self.consecutive_failures = 0
+            if probe:
+                self.opened_at = None
+            return
+        self.stats['errors'] += 1
+        self.consecutive_failures += 1
+        if probe or self.consecutive_failures >= self.breaker_threshold:
+            self.opened_at = time.monotonic()
+            logger.warning(f"Payment gateway circuit opened after {self.consecutive_failures} failures")
+    
+    async def _post(self, path: str, payload: dict) -> dict:
+        for attempt in range(self.max_retries + 1):
+            probe = self._check_circuit()
+            started = time.perf_counter()
+            resp = None
+            try:
+                try:
+                    async with self.semaphore:
+                        resp = await self._client().post(path, json=payload)
+                    retryable = resp.status_code in self.RETRY_STATUS_CODES
+                    gateway_failure = resp.status_code == 429 or resp.status_code >= 500
+                    error = None if resp.status_code < 400 else GatewayError(
+                        f"Gateway returned {resp.status_code}: {resp.text[:200]}"
+                    )
+                except httpx.HTTPError as e:
+                    resp, gateway_failure = None, True
+                    retryable = isinstance(e, self.RETRY_EXCEPTIONS)
+                    error = GatewayError(f"Gateway request failed: {str(e)}")
+                finally:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    midtrans_request_duration.observe(
+                        elapsed_ms / 1000, "ok" if resp is not None and resp.status_code < 400 else "error"
+                    )
+                    self.stats['calls'] += 1
+                    self.stats['latency_ms_total'] += elapsed_ms
+                    self.stats['latency_ms_max'] = max(self.stats['latency_ms_max'], elapsed_ms)
+                
+                # Client errors are the caller's fault and don't count against the gateway
+                self._record_result(error is None or not gateway_failure, probe)
+            finally:
+                if probe:
+                    self.probing = False
+            if error is None:
+                return resp.json()
+            if not retryable or attempt == self.max_retries:
+                raise error
+            
+            self.stats['retries'] += 1
+            await asyncio.sleep(random.uniform(0, 0.2 * (2 ** attempt)))
+    
+    async def create_transaction(self, param: dict) -> dict:
+        return await self._post("/snap/v1/transactions", param)
+    
+    def snapshot(self) -> dict:
+        calls = self.stats['calls']
+        return {
+            **self.stats,
+            "latency_ms_avg": self.stats['latency_ms_total'] / calls if calls else 0.0,
+            "circuit_open": self.opened_at is not None,
+        }
+    
+    async def close(self):
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+snap = SnapClient(
+    base_url=MIDTRANS_SNAP_URL,
+    server_key=MIDTRANS_SERVER_KEY,
+    timeout=MIDTRANS_TIMEOUT_SECONDS,
+    max_concurrency=MIDTRANS_MAX_CONCURRENCY,
+    max_retries=MIDTRANS_MAX_RETRIES,
+    breaker_threshold=MIDTRANS_BREAKER_THRESHOLD,
+    breaker_reset_seconds=MIDTRANS_BREAKER_RESET_SECONDS
+)
+
 # ============= CREDIT & PAYMENT ROUTES =============
 
 @api_router.post("/credit/purchase")
 async def purchase_credit(purchase: CreditPurchase, current_user: User = Depends(get_current_user)):
-    meter_data = await db.meters.find_one({"id": purchase.meter_id}, {"_id": 0})
+    meter_data = await db.meters.find_one(id_query(purchase.meter_id), model_projection(WaterMeter))
     if not meter_data:
         raise HTTPException(status_code=404, detail="Meter not found")
     
@@ -588,7 +2413,15 @@ async def purchase_credit(purchase: CreditPurchase, current_user: User = Depends
     if purchase.amount < 10000:
         raise HTTPException(status_code=400, detail="Minimum purchase amount is 10,000 IDR")
     
-    order_id = f"water-{purchase.meter_id}-{int(datetime.now().timestamp())}"
+    # Copied onto the transaction for the revenue reports
+    property_data = None
+    if meter_data.get('property_id'):
+        property_data = await db.properties.find_one(
+            id_query(meter_data['property_id']), {"_id": 0, "city": 1, "property_type": 1}
+        )
+    
+    # Time-ordered and unique even for repeated purchases within the same second
+    order_id = f"water-{uuid7().hex}"
     
     # Create Midtrans transaction
     param = {
@@ -612,7 +2445,7 @@ async def purchase_credit(purchase: CreditPurchase, current_user: User = Depends
     }
     
     try:
-        transaction = snap.create_transaction(param)
+        transaction = await snap.create_transaction(param)
         
         # Save transaction
         trans_obj = Transaction(
@@ -623,10 +2456,21 @@ async def purchase_credit(purchase: CreditPurchase, current_user: User = Depends
             payment_method=purchase.payment_method
         )
         
-        trans_doc = trans_obj.model_dump()
-        trans_doc['transaction_time'] = trans_doc['transaction_time'].isoformat()
+        trans_doc = to_document(trans_obj)
+        if property_data:
+            trans_doc['city'] = property_data['city']
+            trans_doc['property_type'] = property_data['property_type']
         
+        # Counted in the report rollups through its creation effect
+        trans_doc['pending_effects'] = [
+            {"id": uuid.uuid4().hex, "from": None, "to": trans_obj.status, "at": trans_obj.transaction_time}
+        ]
         await db.transactions.insert_one(trans_doc)
+        await bump_stats({"total_transactions": 1})
+        try:
+            await apply_payment_effects([trans_doc])
+        except Exception as e:
+            logger.error(f"Applying payment effects failed, left for recovery: {str(e)}")
         
         return {
             "order_id": order_id,
@@ -634,10 +2478,335 @@ async def purchase_credit(purchase: CreditPurchase, current_user: User = Depends
             "payment_url": transaction.get('redirect_url'),
             "transaction_id": transaction.get('transaction_id')
         }
+    except CircuitOpenError:
+        raise HTTPException(
+            status_code=503,
+            detail="Payment gateway temporarily unavailable",
+            headers={"Retry-After": str(int(MIDTRANS_BREAKER_RESET_SECONDS))}
+        )
     except Exception as e:
         logger.error(f"Payment creation failed: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Payment creation failed: {str(e)}")
 
+# Statuses a transaction may move from into each notified status. A transition
+# happens at most once, so redelivered or out-of-order notifications are no-ops.
+# No status lists itself as a source.
+OPEN_PAYMENT_STATUSES = ["pending", "authorize"]
+PAYMENT_TRANSITIONS = {
+    "pending": ["authorize"],
+    "authorize": ["pending"],
+    "capture": OPEN_PAYMENT_STATUSES,
+    "settlement": OPEN_PAYMENT_STATUSES + ["capture"],
+    "deny": OPEN_PAYMENT_STATUSES,
+    "cancel": OPEN_PAYMENT_STATUSES,
+    "expire": OPEN_PAYMENT_STATUSES,
+    "failure": OPEN_PAYMENT_STATUSES,
+    "refund": SETTLED_STATUSES + ["partial_refund"],
+    "partial_refund": SETTLED_STATUSES,
+}
+
+def notified_refund_amount(notification: dict) -> float:
+    """The refund_amount Midtrans sends with a partial_refund; 0 when absent,
+    which leaves the transaction's revenue unchanged"""
+    try:
+        return max(float(notification.get('refund_amount') or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+# Credit ids a meter remembers, so re-applying a credit is a no-op; far more
+# than one meter is credited within a lease
+RECENT_CREDITS_KEPT = 100
+
+def payment_transition(order_id: str, transaction_status: str, refund_amount: float, now: datetime) -> tuple:
+    """(filter, pipeline update) moving a transaction into `transaction_status`.
+    
+    The filter only matches a transaction in one of the allowed source
+    statuses. The update appends the transition to pending_effects and, for
+    a partial refund, records refund_amount capped at the amount as
+    refunded_amount.
+    """
+    effect = {"id": uuid.uuid4().hex, "from": "$status", "to": transaction_status, "at": now}
+    update = {
+        "status": transaction_status,
+        "status_updated_at": now,
+        "pending_effects": {"$concatArrays": [{"$ifNull": ["$pending_effects", []]}, [effect]]},
+    }
+    if transaction_status == "partial_refund":
+        update["refunded_amount"] = {"$min": ["$amount", refund_amount]}
+    return {"order_id": order_id, "status": {"$in": PAYMENT_TRANSITIONS[transaction_status]}}, [{"$set": update}]
+
+async def apply_payment_status(order_id: str, transaction_status: str, refund_amount: float = 0.0) -> bool:
+    """Move a transaction into `transaction_status` if that transition is allowed.
+    
+    Returns False when nothing changed (unknown order, duplicate or stale
+    notification). The same update appends the transition to the
+    transaction's pending_effects, so the meter credit, revenue and report
+    changes it implies survive a crash and are applied by
+    apply_payment_effects.
+    """
+    query, update = payment_transition(order_id, transaction_status, refund_amount, datetime.now(timezone.utc))
+    result = await db.transactions.update_one(query, update)
+    return result.modified_count == 1
+
+async def apply_meter_credits(credits: List[tuple]):
+    """Apply (credit id, meter id, amount) credits, each at most once.
+    
+    A meter records the ids it was credited with in recent_credits in the same
+    update as the $inc, so a credit re-applied by the recovery sweep or a
+    redelivered batch is filtered out. Credits are coalesced per meter into one
+    bulk_write; when a meter already has some of its ids (an earlier attempt
+    got part way), every credit is retried on its own.
+    """
+    by_meter = {}
+    for credit_id, meter_id, amount in credits:
+        by_meter.setdefault(meter_id, []).append((credit_id, amount))
+    
+    def credit(meter_id, ids, amount):
+        return UpdateOne(
+            {**id_query(meter_id), "recent_credits": {"$nin": ids}},
+            {"$inc": {"balance": amount}, "$push": {"recent_credits": {"$each": ids, "$slice": -RECENT_CREDITS_KEPT}}}
+        )
+    
+    result = await db.meters.bulk_write([
+        credit(meter_id, [credit_id for credit_id, _ in items], sum(amount for _, amount in items))
+        for meter_id, items in by_meter.items()
+    ], ordered=False)
+    if result.matched_count < len(by_meter):
+        await db.meters.bulk_write([
+            credit(meter_id, [credit_id], amount) for credit_id, meter_id, amount in credits
+        ], ordered=False)
+    logger.info(f"Meter balances credited: {len(credits)} transactions across {len(by_meter)} meters")
+
+PAYMENT_EFFECT_FIELDS = {"_id": 0, "order_id": 1, "meter_id": 1, "amount": 1, "refunded_amount": 1, "transaction_time": 1,
+                         "payment_method": 1, "city": 1, "property_type": 1, "pending_effects": 1}
+
+async def claim_payment_effects(trans: dict) -> List[dict]:
+    """Remove the transaction's listed effects, returning those this call removed.
+    Whoever removes an effect applies its revenue and report changes."""
+    ids = [effect['id'] for effect in trans['pending_effects']]
+    remaining = {"$filter": {"input": "$pending_effects", "cond": {"$not": [{"$in": ["$$this.id", ids]}]}}}
+    before = await db.transactions.find_one_and_update(
+        {"order_id": trans['order_id'], "pending_effects.id": {"$in": ids}},
+        [{"$set": {"pending_effects": {"$let": {
+            "vars": {"remaining": remaining},
+            "in": {"$cond": [{"$eq": [{"$size": "$$remaining"}, 0]}, "$$REMOVE", "$$remaining"]}
+        }}}}],
+        projection={"_id": 0, "pending_effects": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return []
+    return [effect for effect in before['pending_effects'] if effect['id'] in ids]
+
+async def apply_payment_effects(transactions: List[dict]) -> int:
+    """Apply the pending_effects of `transactions` (read with PAYMENT_EFFECT_FIELDS).
+    
+    Meter credits go first and are idempotent per effect. Each effect is then
+    claimed off its transaction, and only the claimed ones feed the revenue
+    and report rollups; if that fails they are put back for the recovery
+    sweep. While the reports are being rebuilt nothing is claimed: the rebuild
+    replays the effects once it is done. Returns the number of effects applied.
+    """
+    transactions = [trans for trans in transactions if trans.get('pending_effects')]
+    credits = [
+        (effect['id'], trans['meter_id'], trans['amount'])
+        for trans in transactions for effect in trans['pending_effects']
+        if effect['to'] in SETTLED_STATUSES and effect['from'] not in SETTLED_STATUSES
+    ]
+    if credits:
+        await apply_meter_credits(credits)
+    if not transactions or await reports_rebuilding():
+        return 0
+    
+    claimed = await asyncio.gather(*(claim_payment_effects(trans) for trans in transactions))
+    changes, revenue = [], 0.0
+    for trans, effects in zip(transactions, claimed):
+        for effect in effects:
+            changes.append((trans, effect['from'], effect['to']))
+            revenue += transaction_revenue(trans, effect['to']) - transaction_revenue(trans, effect['from'])
+    try:
+        if revenue:
+            await bump_stats({"total_revenue": revenue})
+        await record_report_changes(changes)
+    except Exception:
+        await asyncio.gather(*(
+            db.transactions.update_one(
+                {"order_id": trans['order_id']}, {"$push": {"pending_effects": {"$each": effects, "$position": 0}}}
+            )
+            for trans, effects in zip(transactions, claimed) if effects
+        ))
+        raise
+    return len(changes)
+
+class PaymentInbox:
+    """Durable inbox for payment notifications.
+    
+    The webhook only appends the raw payload and acknowledges. Workers claim
+    batches under a lease, apply the status transitions and then their
+    pending_effects (meter credits in one bulk_write per batch, revenue and
+    report rollups). Delivery is at-least-once: an expired lease makes a
+    message claimable again, which is safe because transitions are
+    idempotent. Messages failing INBOX_MAX_ATTEMPTS times are parked as dead.
+    """
+    
+    def __init__(self, workers: int, batch_size: int, poll_seconds: float, lease_seconds: float, max_attempts: int):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.wakeup = asyncio.Event()
+        self.tasks: List[asyncio.Task] = []
+        self.drained = deque()
+        self.stats = {"received": 0, "processed": 0, "retried": 0, "dead": 0, "batches": 0, "recovered_effects": 0}
+    
+    async def append(self, notification: dict):
+        now = datetime.now(timezone.utc)
+        await db.payment_inbox.insert_one({
+            "order_id": notification['order_id'],
+            "transaction_status": notification['transaction_status'],
+            "payload": notification,
+            "state": "pending",
+            "attempts": 0,
+            "received_at": now,
+            "available_at": now
+        })
+        self.stats['received'] += 1
+        self.wakeup.set()
+    
+    async def claim(self) -> List[dict]:
+        now = datetime.now(timezone.utc)
+        claimable = {"$or": [
+            {"state": "pending", "available_at": {"$lte": now}},
+            {"state": "processing", "claimed_at": {"$lt": now - timedelta(seconds=self.lease_seconds)}}
+        ]}
+        candidates = await db.payment_inbox.find(claimable, {"_id": 1}) \
+            .sort("received_at", ASCENDING).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+        
+        claim_id = str(uuid.uuid4())
+        await db.payment_inbox.update_many(
+            {"$and": [{"_id": {"$in": [c['_id'] for c in candidates]}}, claimable]},
+            {"$set": {"state": "processing", "claim_id": claim_id, "claimed_at": now}, "$inc": {"attempts": 1}}
+        )
+        return await db.payment_inbox.find({"claim_id": claim_id}) \
+            .sort("received_at", ASCENDING).to_list(self.batch_size)
+    
+    async def process(self, messages: List[dict]):
+        failed, done, changed = [], [], []
+        for message in messages:
+            try:
+                if await apply_payment_status(
+                    message['order_id'], message['transaction_status'], notified_refund_amount(message['payload'])
+                ):
+                    changed.append(message['order_id'])
+            except Exception as e:
+                failed.append((message, str(e)))
+                continue
+            done.append(message['_id'])
+        
+        # The transitions and their pending_effects are committed, so the
+        # messages are done even if applying the effects fails below: the
+        # recovery sweep picks those up
+        now = datetime.now(timezone.utc)
+        if done:
+            await db.payment_inbox.update_many(
+                {"_id": {"$in": done}},
+                {"$set": {"state": "done", "processed_at": now}, "$unset": {"claim_id": ""}}
+            )
+        for message, error in failed:
+            await self.release(message, error)
+        
+        self.stats['processed'] += len(done)
+        self.stats['batches'] += 1
+        self.drained.append((time.monotonic(), len(done)))
+        
+        if changed:
+            transactions = await db.transactions.find(
+                {"order_id": {"$in": changed}, "pending_effects": {"$exists": True}}, PAYMENT_EFFECT_FIELDS
+            ).to_list(None)
+            try:
+                await apply_payment_effects(transactions)
+            except Exception as e:
+                logger.error(f"Applying payment effects failed, left for recovery: {str(e)}")
+    
+    async def release(self, message: dict, error: str):
+        """Return a failed message for a retry with backoff, or park it once it is poison"""
+        if message['attempts'] >= self.max_attempts:
+            update = {"state": "dead", "last_error": error}
+            self.stats['dead'] += 1
+            logger.error(f"Payment notification {message['order_id']} moved to dead letter: {error}")
+        else:
+            backoff = min(2 ** message['attempts'], 300)
+            update = {
+                "state": "pending",
+                "last_error": error,
+                "available_at": datetime.now(timezone.utc) + timedelta(seconds=backoff)
+            }
+            self.stats['retried'] += 1
+        await db.payment_inbox.update_one(
+            {"_id": message['_id'], "claim_id": message['claim_id']},
+            {"$set": update, "$unset": {"claim_id": ""}}
+        )
+    
+    async def recover_pending_effects(self):
+        """Apply effects left pending by a worker that died or failed before applying them"""
+        stale = datetime.now(timezone.utc) - timedelta(seconds=self.lease_seconds)
+        transactions = await db.transactions.find(
+            {"pending_effects.at": {"$lt": stale}}, PAYMENT_EFFECT_FIELDS
+        ).to_list(self.batch_size)
+        if transactions:
+            self.stats['recovered_effects'] += await apply_payment_effects(transactions)
+    
+    async def worker(self, number: int):
+        last_recovery = 0.0
+        while True:
+            try:
+                if number == 0 and time.monotonic() - last_recovery > self.lease_seconds:
+                    last_recovery = time.monotonic()
+                    await self.recover_pending_effects()
+                
+                messages = await self.claim()
+                if messages:
+                    try:
+                        await self.process(messages)
+                    except Exception as e:
+                        for message in messages:
+                            await self.release(message, str(e))
+                        raise
+                    continue
+            except Exception as e:
+                logger.error(f"Payment inbox worker {number} failed: {str(e)}")
+            
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+    
+    def start(self):
+        self.tasks = [asyncio.create_task(self.worker(n)) for n in range(self.workers)]
+    
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+    
+    def drain_rate(self, window_seconds: float = 60.0) -> float:
+        cutoff = time.monotonic() - window_seconds
+        while self.drained and self.drained[0][0] < cutoff:
+            self.drained.popleft()
+        return sum(count for _, count in self.drained) / window_seconds
+    
+    async def snapshot(self) -> dict:
+        depth = {state: await db.payment_inbox.count_documents({"state": state})
+                 for state in ["pending", "processing", "dead"]}
+        return {"depth": depth, "drain_rate_per_second": self.drain_rate(), **self.stats}
+
+payment_inbox = PaymentInbox(INBOX_WORKERS, INBOX_BATCH_SIZE, INBOX_POLL_SECONDS, INBOX_LEASE_SECONDS, INBOX_MAX_ATTEMPTS)
+
 @api_router.post("/payment/notification")
 async def payment_notification(notification: dict):
     order_id = notification.get('order_id')
@@ -645,86 +2814,118 @@ async def payment_notification(notification: dict):
     
     logger.info(f"Payment notification received: {order_id}, status: {transaction_status}")
     
-    # Update transaction status
-    await db.transactions.update_one(
-        {"order_id": order_id},
-        {"$set": {"status": transaction_status}}
-    )
+    if not order_id or transaction_status not in PAYMENT_TRANSITIONS:
+        raise HTTPException(status_code=400, detail="Invalid payment notification")
     
-    # If payment successful, update meter balance
-    if transaction_status in ['capture', 'settlement']:
-        trans_data = await db.transactions.find_one({"order_id": order_id}, {"_id": 0})
-        if trans_data:
-            await db.meters.update_one(
-                {"id": trans_data['meter_id']},
-                {"$inc": {"balance": trans_data['amount']}}
-            )
-            logger.info(f"Meter balance updated: {trans_data['meter_id']}, amount: {trans_data['amount']}")
+    # Persist and acknowledge; the inbox workers apply it
+    await payment_inbox.append(notification)
     
     return {"status": "success"}
 
-@api_router.get("/transactions")
-async def get_transactions(current_user: User = Depends(get_current_user)):
+@api_router.get("/payment/inbox/stats")
+async def get_inbox_stats(current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))):
+    """Inbox depth and drain rate for payment notifications"""
+    return await payment_inbox.snapshot()
+
+@api_router.get("/payment/gateway/stats")
+async def get_gateway_stats(current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))):
+    """Latency and error counters for payment gateway calls"""
+    return snap.snapshot()
+
+@api_router.get("/transactions", response_model=List[Transaction])
+async def get_transactions(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    order: str = "asc",
+    current_user: User = Depends(get_current_user)
+):
+    """Transactions by transaction_time; order=desc pages newest first"""
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
     if current_user.has_permission(Permission.VIEW_ALL_TRANSACTIONS):
-        transactions = await db.transactions.find({}, {"_id": 0}).to_list(1000)
+        query = {}
     else:
-        transactions = await db.transactions.find({"customer_id": current_user.id}, {"_id": 0}).to_list(1000)
+        query = {"customer_id": current_user.id}
     
-    for trans in transactions:
-        if isinstance(trans['transaction_time'], str):
-            trans['transaction_time'] = datetime.fromisoformat(trans['transaction_time'])
+    query, sort = keyset_query(query, "transaction_time", cursor, descending=order == "desc")
+    transactions_cursor = db.transactions.find(query, model_projection(Transaction)).sort(sort)
+    if wants_ndjson(request):
+        return ndjson_response(transactions_cursor, limit)
     
-    return transactions
+    transactions, next_cursor = await fetch_page(transactions_cursor, "transaction_time", limit)
+    
+    return serialize_list(Transaction, transactions, next_cursor)
 
 # ============= ADMIN ROUTES =============
 
 @api_router.get("/admin/dashboard")
 async def admin_dashboard(current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))):
-    total_customers = await db.users.count_documents({"role": UserRole.CUSTOMER})
-    total_users = await db.users.count_documents({})
-    total_meters = await db.meters.count_documents({})
-    total_properties = await db.properties.count_documents({})
-    total_transactions = await db.transactions.count_documents({})
-    
-    # Property stats by status
-    pending_properties = await db.properties.count_documents({"status": PropertyStatus.PENDING})
-    approved_properties = await db.properties.count_documents({"status": PropertyStatus.APPROVED})
-    rejected_properties = await db.properties.count_documents({"status": PropertyStatus.REJECTED})
-    
-    # Total revenue
-    transactions = await db.transactions.find({"status": {"$in": ["capture", "settlement"]}}, {"_id": 0}).to_list(10000)
-    total_revenue = sum(t['amount'] for t in transactions)
-    
-    # Role distribution
-    role_stats = {}
-    for role in [UserRole.SUPERADMIN, UserRole.ADMIN, UserRole.MANAGER, UserRole.CUSTOMER]:
-        count = await db.users.count_documents({"role": role})
-        role_stats[role] = count
+    stats = await db.stats.find_one({"id": STATS_ID}, {"_id": 0, "id": 0})
+    if not stats:
+        stats = await rebuild_dashboard_stats()
+    
+    role_stats = {role: stats.get('role_distribution', {}).get(role, 0) for role in ALL_ROLES}
+    property_stats = {prop_status: stats.get('property_stats', {}).get(prop_status, 0) for prop_status in ALL_PROPERTY_STATUSES}
     
     return {
-        "total_customers": total_customers,
-        "total_users": total_users,
-        "total_meters": total_meters,
-        "total_properties": total_properties,
-        "total_transactions": total_transactions,
-        "total_revenue": total_revenue,
+        "total_customers": role_stats[UserRole.CUSTOMER],
+        "total_users": stats.get('total_users', 0),
+        "total_meters": stats.get('total_meters', 0),
+        "total_properties": stats.get('total_properties', 0),
+        "total_transactions": stats.get('total_transactions', 0),
+        "total_revenue": stats.get('total_revenue', 0),
         "role_distribution": role_stats,
-        "property_stats": {
-            "pending": pending_properties,
-            "approved": approved_properties,
-            "rejected": rejected_properties
-        }
+        "property_stats": property_stats
     }
 
-@api_router.get("/admin/customers")
-async def get_all_customers(current_user: User = Depends(require_permission(Permission.VIEW_USERS))):
-    customers = await db.users.find({}, {"_id": 0, "hashed_password": 0}).to_list(1000)
+@api_router.get("/admin/stats/check")
+async def check_stats(
+    repair: bool = False,
+    current_user: User = Depends(require_permission(Permission.MANAGE_SETTINGS))
+):
+    """Rebuild the dashboard rollup from scratch and diff it against the live counters"""
+    diff = await check_dashboard_stats()
+    if diff and repair:
+        await rebuild_dashboard_stats()
+        logger.info(f"Dashboard stats repaired by {current_user.email}: {diff}")
     
-    for customer in customers:
-        if isinstance(customer['created_at'], str):
-            customer['created_at'] = datetime.fromisoformat(customer['created_at'])
+    return {"consistent": not diff, "diff": diff, "repaired": bool(diff and repair)}
+
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats(current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))):
+    """Hit/miss counters for the in-process caches"""
+    return {
+        "auth": auth_cache.snapshot(),
+        "settings": {"version": settings_cache.version, "ttl_seconds": settings_cache.ttl_seconds},
+        "reports": report_cache.snapshot()
+    }
+
+@api_router.get("/admin/ratelimit/stats")
+async def get_rate_limit_stats(current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))):
+    """Allowed/limited counters per limiter and password pool load shedding"""
+    return {
+        "backend": RATE_LIMIT_BACKEND,
+        "limiters": {limiter.name: limiter.snapshot()
+                     for limiter in (login_ip_limiter, login_email_limiter, register_ip_limiter)},
+        "password_pool": {**password_pool.snapshot(), "verify_limit": PASSWORD_VERIFY_MAX_PENDING}
+    }
+
+@api_router.get("/admin/customers", response_model=List[User])
+async def get_all_customers(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    current_user: User = Depends(require_permission(Permission.VIEW_USERS))
+):
+    query, sort = keyset_query({}, "created_at", cursor)
+    customers_cursor = db.users.find(query, model_projection(User)).sort(sort)
+    if wants_ndjson(request):
+        return ndjson_response(customers_cursor, limit)
     
-    return customers
+    customers, next_cursor = await fetch_page(customers_cursor, "created_at", limit)
+    
+    return serialize_list(User, customers, next_cursor)
 
 # ============= ROLE MANAGEMENT ROUTES =============
 
@@ -736,6 +2937,14 @@ class UserStatusUpdate(BaseModel):
     user_id: str
     is_active: bool
 
+class BulkUserRoleUpdate(BaseModel):
+    user_ids: List[str] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+    new_role: str
+
+class BulkUserStatusUpdate(BaseModel):
+    user_ids: List[str] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+    is_active: bool
+
 @api_router.get("/roles/available")
 async def get_available_roles(current_user: User = Depends(get_current_user)):
     """Get list of available roles and their permissions"""
@@ -786,7 +2995,7 @@ async def update_user_role(
         raise HTTPException(status_code=400, detail="Cannot change your own role")
     
     # Check if user exists
-    user = await db.users.find_one({"id": user_id})
+    user = await db.users.find_one(id_query(user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -796,9 +3005,15 @@ async def update_user_role(
     
     # Update role
     await db.users.update_one(
-        {"id": user_id},
+        id_query(user_id),
         {"$set": {"role": role_update.new_role}}
     )
+    auth_cache.invalidate_user(user_id)
+    if user['role'] != role_update.new_role:
+        await bump_stats({
+            f"role_distribution.{user['role']}": -1,
+            f"role_distribution.{role_update.new_role}": 1
+        })
     
     logger.info(f"User {user_id} role updated to {role_update.new_role} by {current_user.email}")
     
@@ -817,15 +3032,18 @@ async def update_user_status(
         raise HTTPException(status_code=400, detail="Cannot change your own status")
     
     # Check if user exists
-    user = await db.users.find_one({"id": user_id})
+    user = await db.users.find_one(id_query(user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Update status
     await db.users.update_one(
-        {"id": user_id},
+        id_query(user_id),
         {"$set": {"is_active": status_update.is_active}}
     )
+    auth_cache.invalidate_user(user_id)
+    if not status_update.is_active:
+        await revoke_user_sessions(user_id)
     
     status_text = "activated" if status_update.is_active else "deactivated"
     logger.info(f"User {user_id} {status_text} by {current_user.email}")
@@ -844,17 +3062,109 @@ async def delete_user(
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
     # Check if user exists
-    user = await db.users.find_one({"id": user_id})
+    user = await db.users.find_one(id_query(user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Delete user
-    await db.users.delete_one({"id": user_id})
+    await db.users.delete_one(id_query(user_id))
+    auth_cache.invalidate_user(user_id)
+    await revoke_user_sessions(user_id)
+    await bump_stats({"total_users": -1, f"role_distribution.{user['role']}": -1})
     
     logger.info(f"User {user_id} deleted by {current_user.email}")
     
     return {"message": "User deleted successfully", "user_id": user_id}
 
+@api_router.post("/users/{user_id}/sessions/revoke")
+async def revoke_user_sessions_route(
+    user_id: str,
+    current_user: User = Depends(require_permission(Permission.EDIT_USER))
+):
+    """Sign a user out of every device"""
+    revoked = await revoke_user_sessions(user_id)
+    auth_cache.invalidate_user(user_id)
+    
+    logger.info(f"Sessions of user {user_id} revoked by {current_user.email}")
+    
+    return {"message": "Sessions revoked", "user_id": user_id, "revoked": revoked}
+
+@api_router.put("/admin/users/role")
+async def bulk_update_user_role(
+    bulk: BulkUserRoleUpdate,
+    current_user: User = Depends(require_permission(Permission.MANAGE_ROLES))
+):
+    """Update the role of many users in one bulk_write"""
+    valid_roles = [UserRole.SUPERADMIN, UserRole.ADMIN, UserRole.MANAGER, UserRole.CUSTOMER]
+    if bulk.new_role not in valid_roles:
+        raise HTTPException(status_code=400, detail="Invalid role")
+    
+    if bulk.new_role == UserRole.SUPERADMIN and current_user.role != UserRole.SUPERADMIN:
+        raise HTTPException(status_code=403, detail="Only Superadmin can create Superadmin users")
+    
+    user_ids = list(dict.fromkeys(bulk.user_ids))
+    existing = await find_existing("users", user_ids, {"role": 1})
+    
+    results, operations, stats = [], [], {}
+    for user_id in user_ids:
+        if user_id == current_user.id:
+            results.append(bulk_result(user_id, False, "Cannot change your own role"))
+            continue
+        user = existing.get(user_id)
+        if not user:
+            results.append(bulk_result(user_id, False, "User not found"))
+            continue
+        operations.append(UpdateOne(id_query(user_id), {"$set": {"role": bulk.new_role}}))
+        if user['role'] != bulk.new_role:
+            old_key = f"role_distribution.{user['role']}"
+            stats[old_key] = stats.get(old_key, 0) - 1
+            stats[f"role_distribution.{bulk.new_role}"] = stats.get(f"role_distribution.{bulk.new_role}", 0) + 1
+        results.append(bulk_result(user_id, True, f"Role set to {bulk.new_role}"))
+    
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+        await bump_stats(stats)
+        for result in results:
+            if result['status'] == "updated":
+                auth_cache.invalidate_user(result['id'])
+    
+    logger.info(f"{len(operations)} users set to role {bulk.new_role} by {current_user.email}")
+    
+    return {"updated": len(operations), "failed": len(results) - len(operations), "results": results}
+
+@api_router.put("/admin/users/status")
+async def bulk_update_user_status(
+    bulk: BulkUserStatusUpdate,
+    current_user: User = Depends(require_permission(Permission.EDIT_USER))
+):
+    """Activate or deactivate many user accounts in one bulk_write"""
+    user_ids = list(dict.fromkeys(bulk.user_ids))
+    existing = await find_existing("users", user_ids, {})
+    
+    status_text = "activated" if bulk.is_active else "deactivated"
+    results, operations = [], []
+    for user_id in user_ids:
+        if user_id == current_user.id:
+            results.append(bulk_result(user_id, False, "Cannot change your own status"))
+            continue
+        if user_id not in existing:
+            results.append(bulk_result(user_id, False, "User not found"))
+            continue
+        operations.append(UpdateOne(id_query(user_id), {"$set": {"is_active": bulk.is_active}}))
+        results.append(bulk_result(user_id, True, f"User {status_text}"))
+    
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+        updated = [result['id'] for result in results if result['status'] == "updated"]
+        for user_id in updated:
+            auth_cache.invalidate_user(user_id)
+        if not bulk.is_active:
+            await db.refresh_tokens.delete_many({"user_id": {"$in": updated}})
+    
+    logger.info(f"{len(operations)} users {status_text} by {current_user.email}")
+    
+    return {"updated": len(operations), "failed": len(results) - len(operations), "results": results}
+
 @api_router.get("/permissions/me")
 async def get_my_permissions(current_user: User = Depends(get_current_user)):
     """Get current user's permissions"""
@@ -866,43 +3176,653 @@ async def get_my_permissions(current_user: User = Depends(get_current_user)):
 
 # ============= SETTINGS ROUTES =============
 
+class SettingsCache:
+    """In-process copy of the settings document.
+    
+    Every write bumps the document's version with $inc and the cache only
+    ever moves forward to a newer version, so concurrent updates can't leave
+    a stale copy behind.
+    """
+    
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.settings: Optional[Settings] = None
+        self.loaded_at = 0.0
+        self.lock = asyncio.Lock()
+    
+    @property
+    def version(self) -> int:
+        return self.settings.version if self.settings else -1
+    
+    def _store(self, settings_data: dict) -> Settings:
+        settings_obj = Settings(**settings_data)
+        if settings_obj.version >= self.version:
+            self.settings = settings_obj
+            self.loaded_at = time.monotonic()
+        return self.settings
+    
+    async def get(self) -> Settings:
+        if self.settings is None or time.monotonic() - self.loaded_at > self.ttl_seconds:
+            async with self.lock:
+                if self.settings is None or time.monotonic() - self.loaded_at > self.ttl_seconds:
+                    await self.load()
+        return self.settings
+    
+    async def load(self) -> Settings:
+        # Upsert so concurrent first boots can't insert two default documents
+        settings_data = await db.settings.find_one_and_update(
+            {"id": "settings"},
+            {"$setOnInsert": Settings().model_dump()},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return self._store(settings_data)
+    
+    async def update(self, fields: dict) -> Settings:
+        defaults = {k: v for k, v in Settings().model_dump().items() if k not in fields and k != "version"}
+        settings_data = await db.settings.find_one_and_update(
+            {"id": "settings"},
+            {"$set": fields, "$inc": {"version": 1}, "$setOnInsert": defaults},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return self._store(settings_data)
+
+settings_cache = SettingsCache(SETTINGS_CACHE_TTL_SECONDS)
+
+async def get_water_rate() -> float:
+    return (await settings_cache.get()).water_rate
+
+async def get_low_balance_threshold() -> float:
+    return (await settings_cache.get()).low_balance_threshold
+
 @api_router.get("/settings", response_model=Settings)
 async def get_settings():
-    settings_data = await db.settings.find_one({"id": "settings"}, {"_id": 0})
+    return await settings_cache.get()
+
+async def store_logo(chunks, content_type: Optional[str]) -> str:
+    """Stream logo bytes into GridFS, named by their sha256. Returns the digest."""
+    digest = hashlib.sha256()
+    size = 0
+    grid_in = logo_bucket.open_upload_stream("pending", metadata={"contentType": content_type})
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > LOGO_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Logo must be at most {LOGO_MAX_BYTES} bytes")
+            digest.update(chunk)
+            await grid_in.write(chunk)
+    except BaseException:
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+    
+    logo_hash = digest.hexdigest()
+    # Content addressed: an identical logo already stored is reused
+    existing = await db["logos.files"].find_one({"filename": logo_hash}, {"_id": 1})
+    if existing:
+        await logo_bucket.delete(grid_in._id)
+    else:
+        await logo_bucket.rename(grid_in._id, logo_hash)
+    return logo_hash
+
+async def set_logo(logo_hash: str) -> Settings:
+    previous_hash = (await settings_cache.get()).logo_hash
+    settings = await settings_cache.update({
+        "logo_hash": logo_hash,
+        "logo_url": f"/api/settings/logo?v={logo_hash[:LOGO_VERSION_LENGTH]}"
+    })
+    if previous_hash and previous_hash != logo_hash:
+        async for old_file in logo_bucket.find({"filename": previous_hash}):
+            await logo_bucket.delete(old_file._id)
+    return settings
+
+async def migrate_base64_logo():
+    """Move a logo stored inline as a data: URL into GridFS"""
+    settings_data = await db.settings.find_one({"id": "settings", "logo_base64": {"$ne": None}})
     if not settings_data:
-        settings_obj = Settings()
-        settings_doc = settings_obj.model_dump()
-        await db.settings.insert_one(settings_doc)
-        return settings_obj
+        return
+    header, _, encoded = settings_data['logo_base64'].partition(",")
+    content_type = header[len("data:"):].split(";")[0] or None
     
-    return Settings(**settings_data)
+    async def chunks():
+        yield base64.b64decode(encoded)
+    
+    logo_hash = await store_logo(chunks(), content_type)
+    await set_logo(logo_hash)
+    await db.settings.update_one({"id": "settings"}, {"$unset": {"logo_base64": ""}})
+    logger.info(f"Migrated inline logo to GridFS: {logo_hash}")
 
 @api_router.put("/settings/logo")
-async def update_logo(file: UploadFile = File(...), current_user: User = Depends(require_permission(Permission.UPLOAD_LOGO))):
-    contents = await file.read()
-    base64_encoded = base64.b64encode(contents).decode('utf-8')
-    logo_data = f"data:{file.content_type};base64,{base64_encoded}"
-    
-    await db.settings.update_one(
-        {"id": "settings"},
-        {"$set": {"logo_base64": logo_data}},
-        upsert=True
-    )
+async def update_logo(request: Request, current_user: User = Depends(require_permission(Permission.UPLOAD_LOGO))):
+    """Multipart upload with the image in the `file` field. The form is parsed
+    here rather than through a File() parameter, so an oversized body is
+    rejected from its Content-Length before anything is spooled to disk."""
+    content_length = request.headers.get("content-length")
+    if content_length is None or not content_length.isdigit():
+        raise HTTPException(status_code=411, detail="Content-Length required")
+    if int(content_length) > LOGO_MAX_BYTES + LOGO_FORM_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Logo must be at most {LOGO_MAX_BYTES} bytes")
+    
+    form = await request.form(max_files=1, max_fields=1)
+    try:
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=422, detail="Missing logo file")
+        
+        async def chunks():
+            while chunk := await file.read(LOGO_CHUNK_BYTES):
+                yield chunk
+        
+        logo_hash = await store_logo(chunks(), file.content_type)
+    finally:
+        await form.close()
+    settings = await set_logo(logo_hash)
+    
+    return {"message": "Logo updated successfully", "logo_url": settings.logo_url, "logo_hash": settings.logo_hash}
+
+@api_router.get("/settings/logo")
+async def get_logo(request: Request, v: Optional[str] = None):
+    settings = await settings_cache.get()
+    if not settings.logo_hash:
+        raise HTTPException(status_code=404, detail="Logo not found")
+    
+    etag = f'"{settings.logo_hash}"'
+    # Versioned URLs never change content; the bare URL must be revalidated
+    if v == settings.logo_hash[:LOGO_VERSION_LENGTH]:
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "public, max-age=300, must-revalidate"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
     
-    return {"message": "Logo updated successfully", "logo_base64": logo_data}
+    try:
+        grid_out = await logo_bucket.open_download_stream_by_name(settings.logo_hash)
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Logo not found")
+    
+    async def stream():
+        while chunk := await grid_out.readchunk():
+            yield chunk
+    
+    headers["Content-Length"] = str(grid_out.length)
+    media_type = (grid_out.metadata or {}).get("contentType") or "application/octet-stream"
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
 
 @api_router.put("/settings/rate")
 async def update_water_rate(water_rate: float, current_user: User = Depends(require_permission(Permission.MANAGE_RATES))):
-    await db.settings.update_one(
-        {"id": "settings"},
-        {"$set": {"water_rate": water_rate}},
-        upsert=True
-    )
+    await settings_cache.update({"water_rate": water_rate})
     
     return {"message": "Water rate updated successfully", "water_rate": water_rate}
 
+# ============= LOW BALANCE ALERTS =============
+
+class LogAlertSink:
+    async def send(self, alerts: List[dict]):
+        for alert in alerts:
+            logger.warning(f"Low balance: meter {alert['meter_number']} ({alert['meter_id']}) "
+                           f"balance {alert['balance']} < {alert['threshold']}")
+
+class FileAlertSink:
+    """Appends alerts as JSON lines; mainly for tests"""
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+    
+    def _write(self, lines: bytes):
+        with self.path.open("ab") as f:
+            f.write(lines)
+    
+    async def send(self, alerts: List[dict]):
+        lines = b"".join(orjson.dumps(alert, option=orjson.OPT_APPEND_NEWLINE) for alert in alerts)
+        await asyncio.to_thread(self._write, lines)
+
+def make_alert_sink(spec: str):
+    if spec.startswith("file:"):
+        return FileAlertSink(spec[len("file:"):])
+    return LogAlertSink()
+
+class AlertDispatcher:
+    """Queues alerts and hands them to the sink in batches"""
+    
+    def __init__(self, sink, batch_size: int, flush_seconds: float, max_queue: int):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.stats = {"queued": 0, "dispatched": 0, "dropped": 0, "failed": 0, "batches": 0,
+                      "latency_ms_last": 0.0, "latency_ms_max": 0.0}
+    
+    def enqueue(self, alert: dict) -> bool:
+        try:
+            self.queue.put_nowait(alert)
+            self.stats['queued'] += 1
+            return True
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            return False
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self.sink.send(batch)
+            except Exception as e:
+                self.stats['failed'] += len(batch)
+                logger.error(f"Alert dispatch failed: {str(e)}")
+                continue
+            
+            now = datetime.now(timezone.utc)
+            latency_ms = max((now - alert['changed_at']).total_seconds() * 1000 for alert in batch)
+            self.stats['dispatched'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['latency_ms_last'] = latency_ms
+            self.stats['latency_ms_max'] = max(self.stats['latency_ms_max'], latency_ms)
+
+class LowBalanceAlerts:
+    """Finds meters whose balance dropped below Settings.low_balance_threshold.
+    
+    Each meter alerts once per crossing: the low_balance_alert flag is claimed
+    atomically when the alert is raised and cleared once the balance recovers.
+    """
+    
+    METER_FIELDS = {"_id": 0, "id": "$_id", "meter_number": 1, "customer_id": 1, "balance": 1, "low_balance_alert": 1}
+    
+    def __init__(self, mode: str, scan_interval: float, dispatcher: AlertDispatcher):
+        self.mode = mode
+        self.scan_interval = scan_interval
+        self.dispatcher = dispatcher
+        self.tasks: List[asyncio.Task] = []
+        self.stats = {"scans": 0, "scan_ms_last": 0.0, "scan_ms_total": 0.0, "meters_examined": 0,
+                      "alerts_raised": 0, "rearmed": 0, "change_events": 0}
+    
+    async def raise_alert(self, meter: dict, threshold: float, changed_at: datetime):
+        claimed = await db.meters.update_one(
+            {"_id": meter['id'], "low_balance_alert": {"$ne": True}},
+            {"$set": {"low_balance_alert": True}}
+        )
+        if not claimed.modified_count:
+            return
+        queued = self.dispatcher.enqueue({
+            "meter_id": str(meter['id']),
+            "meter_number": meter.get('meter_number'),
+            "customer_id": meter.get('customer_id'),
+            "balance": meter['balance'],
+            "threshold": threshold,
+            "changed_at": changed_at
+        })
+        if not queued:
+            # Dropped: give the flag back so the next scan or change raises it again
+            await db.meters.update_one({"_id": meter['id']}, {"$unset": {"low_balance_alert": ""}})
+            return
+        self.stats['alerts_raised'] += 1
+    
+    async def scan(self):
+        threshold = await get_low_balance_threshold()
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        
+        rearmed = await db.meters.update_many(
+            {"low_balance_alert": True, "balance": {"$gte": threshold}},
+            {"$unset": {"low_balance_alert": ""}}
+        )
+        self.stats['rearmed'] += rearmed.modified_count
+        
+        cursor = db.meters.find(
+            {"balance": {"$lt": threshold}, "low_balance_alert": {"$ne": True}},
+            self.METER_FIELDS
+        ).batch_size(500)
+        async for meter in cursor:
+            self.stats['meters_examined'] += 1
+            await self.raise_alert(meter, threshold, now)
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats['scans'] += 1
+        self.stats['scan_ms_last'] = elapsed_ms
+        self.stats['scan_ms_total'] += elapsed_ms
+    
+    async def run_scans(self):
+        while True:
+            try:
+                await self.scan()
+            except Exception as e:
+                logger.error(f"Low balance scan failed: {str(e)}")
+            await asyncio.sleep(self.scan_interval)
+    
+    async def watch_changes(self):
+        pipeline = [{"$match": {
+            "operationType": "update",
+            "updateDescription.updatedFields.balance": {"$exists": True}
+        }}]
+        backoff = 1.0
+        while True:
+            try:
+                # Catch up on anything that crossed while no one was watching
+                await self.scan()
+                async with db.meters.watch(pipeline, full_document="updateLookup") as stream:
+                    backoff = 1.0
+                    async for change in stream:
+                        self.stats['change_events'] += 1
+                        meter = change.get('fullDocument')
+                        if not meter:
+                            continue
+                        meter['id'] = meter.pop('_id')
+                        threshold = await get_low_balance_threshold()
+                        if meter['balance'] < threshold and not meter.get('low_balance_alert'):
+                            changed_at = change['clusterTime'].as_datetime() if 'clusterTime' in change else datetime.now(timezone.utc)
+                            await self.raise_alert(meter, threshold, changed_at)
+                        elif meter['balance'] >= threshold and meter.get('low_balance_alert'):
+                            await db.meters.update_one({"_id": meter['id']}, {"$unset": {"low_balance_alert": ""}})
+                            self.stats['rearmed'] += 1
+            except PyMongoError as e:
+                # Includes network errors (AutoReconnect, ServerSelectionTimeoutError),
+                # which must not end the watcher for good
+                logger.error(f"Meter change stream failed, retrying in {backoff:.0f}s: {str(e)}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.scan_interval)
+    
+    def start(self):
+        if self.mode == "off":
+            return
+        watcher = self.watch_changes if self.mode == "change_stream" else self.run_scans
+        self.tasks = [asyncio.create_task(self.dispatcher.run()), asyncio.create_task(watcher())]
+        logger.info(f"Low balance alerts started in {self.mode} mode")
+    
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+    
+    def snapshot(self) -> dict:
+        return {"mode": self.mode, "queue_depth": self.dispatcher.queue.qsize(),
+                **self.stats, "dispatcher": self.dispatcher.stats}
+
+low_balance_alerts = LowBalanceAlerts(
+    ALERT_MODE,
+    ALERT_SCAN_INTERVAL_SECONDS,
+    AlertDispatcher(make_alert_sink(ALERT_SINK), ALERT_BATCH_SIZE, ALERT_FLUSH_SECONDS, ALERT_QUEUE_SIZE)
+)
+
+@api_router.get("/admin/alerts/stats")
+async def get_alert_stats(current_user: User = Depends(require_permission(Permission.VIEW_REPORTS))):
+    """Alert latency and scan cost for the low balance alert engine"""
+    return low_balance_alerts.snapshot()
+
+# ============= INDEXES =============
+
+# Declared indexes per collection: (keys, options). Names are derived from the
+# keys the same way MongoDB does, so existing default-named indexes are reused.
+INDEX_SPECS = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+        ([("role", ASCENDING)], {}),
+        ([("created_at", ASCENDING), ("_id", ASCENDING)], {}),
+    ],
+    "meters": [
+        ([("meter_number", ASCENDING)], {"unique": True}),
+        ([("customer_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("created_at", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("property_id", ASCENDING)], {}),
+        ([("balance", ASCENDING)], {}),
+        ([("low_balance_alert", ASCENDING)], {"sparse": True}),
+    ],
+    "properties": [
+        ([("owner_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("created_at", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("status", ASCENDING)], {}),
+        ([("import_ref", ASCENDING)], {"unique": True, "sparse": True}),
+    ],
+    "transactions": [
+        ([("order_id", ASCENDING)], {"unique": True}),
+        ([("customer_id", ASCENDING), ("transaction_time", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("transaction_time", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("status", ASCENDING), ("transaction_time", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("meter_id", ASCENDING)], {}),
+        ([("pending_effects.at", ASCENDING)], {"sparse": True}),
+    ],
+    "settings": [
+        ([("id", ASCENDING)], {"unique": True}),
+    ],
+    "stats": [
+        ([("id", ASCENDING)], {"unique": True}),
+    ],
+    "payment_inbox": [
+        # claim() filters on available_at/claimed_at per state and takes the oldest first
+        ([("state", ASCENDING), ("received_at", ASCENDING)], {}),
+        ([("claim_id", ASCENDING), ("received_at", ASCENDING)], {"sparse": True}),
+        ([("processed_at", ASCENDING)], {"expireAfterSeconds": INBOX_RETENTION_SECONDS}),
+    ],
+    "readings": [
+        ([("meter_id", ASCENDING), ("reading_time", ASCENDING)], {}),
+    ],
+    "reading_keys": [
+        ([("ingested_at", ASCENDING)], {"expireAfterSeconds": READING_DEDUP_TTL_SECONDS}),
+    ],
+    "readings_hourly": [
+        ([("meter_id", ASCENDING), ("bucket", ASCENDING)], {"unique": True}),
+    ],
+    "readings_daily": [
+        ([("meter_id", ASCENDING), ("bucket", ASCENDING)], {"unique": True}),
+    ],
+    "rate_limits": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "refresh_tokens": [
+        ([("user_id", ASCENDING)], {}),
+        ([("family_id", ASCENDING)], {}),
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "report_status_daily": [
+        ([("day", ASCENDING), ("status", ASCENDING)], {"unique": True}),
+    ],
+    "report_revenue_daily": [
+        ([("day", ASCENDING), ("city", ASCENDING), ("property_type", ASCENDING), ("payment_method", ASCENDING)],
+         {"unique": True}),
+    ],
+    "import_jobs": [
+        ([("created_by", ASCENDING), ("_id", DESCENDING)], {}),
+        ([("started_at", ASCENDING)], {"expireAfterSeconds": IMPORT_RETENTION_SECONDS}),
+    ],
+    "import_errors": [
+        ([("job_id", ASCENDING), ("line", ASCENDING)], {}),
+        ([("created_at", ASCENDING)], {"expireAfterSeconds": IMPORT_RETENTION_SECONDS}),
+    ],
+    "logos.files": [
+        ([("filename", ASCENDING), ("uploadDate", ASCENDING)], {}),
+    ],
+}
+
+# Indexes from earlier schemas, dropped at startup. The unique id_1 index in
+# particular would reject every second document inserted without an id field.
+LEGACY_INDEXES = {
+    "users": ["id_1", "created_at_1_id_1"],
+    "meters": ["id_1", "customer_id_1_created_at_1_id_1", "created_at_1_id_1"],
+    "properties": ["id_1", "owner_id_1_created_at_1_id_1", "created_at_1_id_1"],
+    "transactions": ["id_1", "customer_id_1_transaction_time_-1_id_-1", "transaction_time_-1_id_-1",
+                     "status_1_transaction_time_-1", "credit_pending_1"],
+    "payment_inbox": ["state_1_available_at_1", "claim_id_1"],
+}
+
+# Representative query shape of every route lookup, used by the plan check
+ROUTE_QUERIES = [
+    ("get_current_user", "users", {"email": "x@example.com"}, None),
+    ("update_user_role", "users", id_query(new_id()), None),
+    ("admin_dashboard", "users", {"role": UserRole.CUSTOMER}, None),
+    ("create_meter", "meters", {"meter_number": "x"}, None),
+    ("get_meter", "meters", id_query(new_id()), None),
+    ("get_meters", "meters", {"customer_id": "x"}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("get_meters", "meters", {}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("delete_property", "meters", {"property_id": "x"}, None),
+    ("get_property", "properties", id_query(new_id()), None),
+    ("get_properties", "properties", {"owner_id": "x"}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("get_properties", "properties", {}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("admin_dashboard", "properties", {"status": PropertyStatus.PENDING}, None),
+    ("payment_notification", "transactions", {"order_id": "x"}, None),
+    ("get_transactions", "transactions", {"customer_id": "x"}, [("transaction_time", ASCENDING), ("_id", ASCENDING)]),
+    ("get_transactions", "transactions", {}, [("transaction_time", ASCENDING), ("_id", ASCENDING)]),
+    ("get_transactions", "transactions", {"customer_id": "x"}, [("transaction_time", DESCENDING), ("_id", DESCENDING)]),
+    ("get_transactions", "transactions", {}, [("transaction_time", DESCENDING), ("_id", DESCENDING)]),
+    ("get_all_customers", "users", {}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("admin_dashboard", "transactions", {"status": {"$in": ["capture", "settlement"]}}, None),
+    ("get_settings", "settings", {"id": "settings"}, None),
+    ("export_data", "transactions", {"status": "settlement", "transaction_time": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+     [("transaction_time", ASCENDING), ("_id", ASCENDING)]),
+    ("export_data", "users", {}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("get_revenue_report", "report_revenue_daily", {"day": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc)}}, None),
+    ("get_status_report", "report_status_daily", {"day": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc)}}, None),
+    ("get_imports", "import_jobs", {"created_by": "x"}, [("_id", DESCENDING)]),
+    ("get_import_errors", "import_errors", {"job_id": "x"}, [("line", ASCENDING)]),
+    ("apply_reading_batch", "meters", {"_id": {"$in": [as_uuid(new_id())]}}, None),
+    ("apply_reading_batch", "reading_keys", {"_id": {"$in": [{"m": "x", "t": datetime(2024, 1, 1, tzinfo=timezone.utc)}]}}, None),
+    ("get_meter_consumption", "readings", {"meter_id": "x", "reading_time": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+     [("reading_time", ASCENDING)]),
+    ("get_meter_consumption", "readings_hourly", {"meter_id": "x", "bucket": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+     [("bucket", ASCENDING)]),
+    ("get_meter_consumption", "readings_daily", {"meter_id": "x", "bucket": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+     [("bucket", ASCENDING)]),
+    ("payment_inbox.claim", "payment_inbox", {"$or": [
+        {"state": "pending", "available_at": {"$lte": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+        {"state": "processing", "claimed_at": {"$lt": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+    ]}, [("received_at", ASCENDING)]),
+    ("payment_inbox.claim", "payment_inbox", {"claim_id": "x"}, [("received_at", ASCENDING)]),
+    ("payment_inbox.recover_pending_effects", "transactions",
+     {"pending_effects.at": {"$lt": datetime(2024, 1, 1, tzinfo=timezone.utc)}}, None),
+    ("rebuild_reports", "transactions", {"pending_effects.at": {"$exists": True}}, None),
+    ("low_balance_alerts.scan", "meters", {"balance": {"$lt": 5000.0}, "low_balance_alert": {"$ne": True}}, None),
+    ("low_balance_alerts.scan", "meters", {"low_balance_alert": True, "balance": {"$gte": 5000.0}}, None),
+    ("rotate_refresh_token", "refresh_tokens", {"family_id": "x"}, None),
+    ("revoke_user_sessions", "refresh_tokens", {"user_id": "x"}, None),
+    ("export_data", "transactions", {"status": "settlement"}, [("transaction_time", ASCENDING), ("_id", ASCENDING)]),
+]
+
+def index_name(keys: list) -> str:
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+async def ensure_indexes() -> dict:
+    """Create every declared index and drop legacy ones. Safe to run repeatedly."""
+    for collection, names in LEGACY_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection].drop_index(name)
+                logger.info(f"Dropped legacy index {collection}.{name}")
+    
+    created = {}
+    for collection, specs in INDEX_SPECS.items():
+        created[collection] = []
+        # One index at a time, so a unique index rejected by existing duplicates
+        # doesn't keep the rest of the collection's indexes from being built
+        for keys, options in specs:
+            try:
+                created[collection].append(await db[collection].create_index(keys, name=index_name(keys), **options))
+            except OperationFailure as e:
+                # Existing data or a conflicting index prevents creation; surface it as drift
+                logger.error(f"Index creation failed on {collection}.{index_name(keys)}: {str(e)}")
+    return created
+
+async def index_drift() -> dict:
+    """Compare declared indexes with those present in the database"""
+    drift = {}
+    for collection, specs in INDEX_SPECS.items():
+        existing = await db[collection].index_information()
+        existing.pop("_id_", None)
+        declared = {index_name(keys): (keys, options) for keys, options in specs}
+
+        missing = [name for name in declared if name not in existing]
+        unexpected = [name for name in existing if name not in declared]
+        mismatched = []
+        for name, (keys, options) in declared.items():
+            if name not in existing:
+                continue
+            info = existing[name]
+            if [tuple(k) for k in info['key']] != list(keys) or bool(info.get('unique')) != bool(options.get('unique')):
+                mismatched.append(name)
+
+        if missing or unexpected or mismatched:
+            drift[collection] = {"missing": missing, "unexpected": unexpected, "mismatched": mismatched}
+    return drift
+
+# Plan stages that read a whole collection or sort every match in memory
+SLOW_PLAN_STAGES = {"COLLSCAN", "SORT", "$sort"}
+
+def _plan_stages(plan) -> List[str]:
+    """Stages of every winning plan in an explain result. Time-series
+    collections are explained as an aggregation, whose pipeline stages
+    ($sort, ...) are listed next to the planner's own stages."""
+    if isinstance(plan, dict):
+        stages = [plan['stage']] if 'stage' in plan else []
+        for key, value in plan.items():
+            if key == 'rejectedPlans':
+                continue
+            if key.startswith('$'):
+                stages.append(key)
+            stages.extend(_plan_stages(value))
+        return stages
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in _plan_stages(item)]
+    return []
+
+async def check_query_plans() -> List[dict]:
+    """Explain every route query and report those that fall back to a
+    COLLSCAN or a blocking in-memory SORT"""
+    slow = []
+    for route, collection, query, sort in ROUTE_QUERIES:
+        find_cmd = {"find": collection, "filter": query}
+        if sort:
+            find_cmd["sort"] = dict(sort)
+        explain = await db.command({"explain": find_cmd, "verbosity": "queryPlanner"})
+        explain.pop('command', None)
+        stages = _plan_stages(explain)
+        if SLOW_PLAN_STAGES.intersection(stages):
+            slow.append({"route": route, "collection": collection, "filter": query, "stages": stages})
+    return slow
+
+@api_router.get("/admin/indexes")
+async def get_index_status(current_user: User = Depends(require_permission(Permission.MANAGE_SETTINGS))):
+    """Report index drift and route queries that would scan a whole collection or sort in memory"""
+    drift = await index_drift()
+    slow_plans = await check_query_plans()
+    return {"ok": not drift and not slow_plans, "drift": drift, "slow_plans": slow_plans}
+
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_readings_collection()
+    await ensure_indexes()
+    drift = await index_drift()
+    if drift:
+        logger.warning(f"Index drift detected: {drift}")
+
 # ============= SEEDING ADMIN =============
 
+@app.on_event("startup")
+async def init_settings():
+    await migrate_base64_logo()
+    settings = await settings_cache.load()
+    logger.info(f"Settings loaded (version {settings.version})")
+
+@app.on_event("startup")
+async def init_dashboard_stats():
+    # Counters only track deltas, so build the baseline before anything bumps them
+    if not await db.stats.find_one({"id": STATS_ID}):
+        await rebuild_dashboard_stats()
+        logger.info("Dashboard stats rollup initialized")
+
 @app.on_event("startup")
 async def seed_admin():
     # Create Superadmin
@@ -914,11 +3834,11 @@ async def seed_admin():
             name="Super Admin",
             role=UserRole.SUPERADMIN
         )
-        superadmin_doc = superadmin_user.model_dump()
-        superadmin_doc['created_at'] = superadmin_doc['created_at'].isoformat()
-        superadmin_doc['hashed_password'] = hash_password("superadmin123")
+        superadmin_doc = to_document(superadmin_user)
+        superadmin_doc['hashed_password'] = await hash_password("superadmin123")
         
         await db.users.insert_one(superadmin_doc)
+        await bump_stats({"total_users": 1, f"role_distribution.{superadmin_user.role}": 1})
         logger.info("Superadmin user created: superadmin@indowater.com / superadmin123")
     
     # Create Admin
@@ -930,11 +3850,11 @@ async def seed_admin():
             name="Admin",
             role=UserRole.ADMIN
         )
-        admin_doc = admin_user.model_dump()
-        admin_doc['created_at'] = admin_doc['created_at'].isoformat()
-        admin_doc['hashed_password'] = hash_password("admin123")
+        admin_doc = to_document(admin_user)
+        admin_doc['hashed_password'] = await hash_password("admin123")
         
         await db.users.insert_one(admin_doc)
+        await bump_stats({"total_users": 1, f"role_distribution.{admin_user.role}": 1})
         logger.info("Admin user created: admin@indowater.com / admin123")
     
     # Create Manager
@@ -946,13 +3866,67 @@ async def seed_admin():
             name="Manager",
             role=UserRole.MANAGER
         )
-        manager_doc = manager_user.model_dump()
-        manager_doc['created_at'] = manager_doc['created_at'].isoformat()
-        manager_doc['hashed_password'] = hash_password("manager123")
+        manager_doc = to_document(manager_user)
+        manager_doc['hashed_password'] = await hash_password("manager123")
         
         await db.users.insert_one(manager_doc)
+        await bump_stats({"total_users": 1, f"role_distribution.{manager_user.role}": 1})
         logger.info("Manager user created: manager@indowater.com / manager123")
 
+@app.on_event("startup")
+async def start_background_tasks():
+    low_balance_alerts.start()
+    payment_inbox.start()
+    report_rebuilder.start()
+    event_loop_monitor.start()
+
+# ============= METRICS =============
+
+registry.register(CallbackGauge(
+    "password_pool_pending", "bcrypt operations running or queued", (),
+    lambda: {(): password_pool.pending}))
+registry.register(CallbackGauge(
+    "password_pool_rejected", "bcrypt operations shed because the pool was full", (),
+    lambda: {(): password_pool.rejected}))
+registry.register(CallbackGauge(
+    "rate_limit_rejections", "Requests rejected per rate limiter", ("limiter",),
+    lambda: {(limiter.name,): limiter.limited for limiter in (login_ip_limiter, login_email_limiter, register_ip_limiter)}))
+registry.register(CallbackGauge(
+    "midtrans_circuit_open", "1 while the Midtrans circuit breaker is open", (),
+    lambda: {(): int(snap.opened_at is not None)}))
+registry.register(CallbackGauge(
+    "auth_cache_entries", "Resolved tokens held in the auth cache", (),
+    lambda: {(): len(auth_cache.entries)}))
+
+# ============= PROFILING =============
+
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES)
+
+def require_superadmin(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.role != UserRole.SUPERADMIN:
+        raise HTTPException(status_code=403, detail="Only Superadmin can access profiles")
+    return current_user
+
+@api_router.get("/admin/profiles")
+async def list_profiles(current_user: User = Depends(require_superadmin)):
+    """Captured request profiles, newest first"""
+    return {"enabled": PROFILE_ENABLED, "profiles": await profile_store.list()}
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, current_user: User = Depends(require_superadmin)):
+    """Download one profile: folded stacks plus the MongoDB commands the request issued"""
+    path = profile_store.find(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=f"profile-{profile_id}.json")
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(api_router)
 
 app.add_middleware(
@@ -961,8 +3935,29 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+if PROFILE_ENABLED:
+    app.add_middleware(
+        ProfilerMiddleware,
+        sampler=StackSampler(PROFILE_INTERVAL_MS),
+        store=profile_store,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        slow_ms=PROFILE_SLOW_MS,
+        debug_header=PROFILE_DEBUG_HEADER,
+        debug_token=PROFILE_DEBUG_TOKEN
+    )
+app.add_middleware(MetricsMiddleware)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await low_balance_alerts.stop()
+    await payment_inbox.stop()
+    await report_rebuilder.stop()
+    await event_loop_monitor.stop()
+    for task in list(import_tasks):
+        task.cancel()
+    await asyncio.gather(*import_tasks, return_exceptions=True)
+    client.close()
+    password_pool.shutdown()
+    await snap.close()
\ No newline at end of file
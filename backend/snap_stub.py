@@ -0,0 +1,55 @@
+"""Local stand-in for the Midtrans Snap API, for offline load tests.
+
+    uvicorn snap_stub:app --port 8090
+    MIDTRANS_SNAP_URL=http://localhost:8090 uvicorn server:app
+
+STUB_LATENCY_MS and STUB_ERROR_RATE shape the responses. When
+STUB_NOTIFY_URL is set (e.g. http://localhost:8001/api/payment/notification)
+a settlement notification is posted back for every transaction after
+STUB_NOTIFY_DELAY_MS, like the real gateway's webhook.
+"""
+from fastapi import FastAPI, HTTPException, Request
+import asyncio
+import httpx
+import os
+import random
+import uuid
+
+STUB_LATENCY_MS = float(os.environ.get('STUB_LATENCY_MS', '50'))
+STUB_ERROR_RATE = float(os.environ.get('STUB_ERROR_RATE', '0'))
+STUB_NOTIFY_URL = os.environ.get('STUB_NOTIFY_URL')
+STUB_NOTIFY_DELAY_MS = float(os.environ.get('STUB_NOTIFY_DELAY_MS', '500'))
+
+app = FastAPI(title="Midtrans Snap Stub")
+notify_tasks = set()
+
+
+async def send_notification(order_id: str, gross_amount):
+    await asyncio.sleep(STUB_NOTIFY_DELAY_MS / 1000)
+    async with httpx.AsyncClient() as http:
+        await http.post(STUB_NOTIFY_URL, json={
+            "order_id": order_id,
+            "transaction_status": "settlement",
+            "gross_amount": str(gross_amount),
+            "status_code": "200",
+        })
+
+
+@app.post("/snap/v1/transactions", status_code=201)
+async def create_transaction(request: Request):
+    param = await request.json()
+    await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    if random.random() < STUB_ERROR_RATE:
+        raise HTTPException(status_code=503, detail="Stubbed gateway failure")
+
+    details = param['transaction_details']
+    token = str(uuid.uuid4())
+    if STUB_NOTIFY_URL:
+        task = asyncio.create_task(send_notification(details['order_id'], details['gross_amount']))
+        notify_tasks.add(task)
+        task.add_done_callback(notify_tasks.discard)
+
+    return {
+        "token": token,
+        "redirect_url": f"http://localhost/snap/v2/vtweb/{token}",
+    }
@@ -7,15 +7,95 @@ import Dashboard from './pages/Dashboard';
 import AdminDashboard from './pages/AdminDashboard';
 import { Toaster } from '@/components/ui/sonner';
 
-const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+export const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 export const API = `${BACKEND_URL}/api`;
 
 export const AuthContext = React.createContext(null);
 
+// List endpoints return one page per request, with the cursor for the next
+// page in the X-Next-Cursor header (absent on the last page).
+export const fetchPage = async (url, cursor = null) => {
+  const response = await axios.get(url, { params: cursor ? { cursor } : {} });
+  return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+};
+
+export const fetchAllPages = async (url) => {
+  let items = [];
+  let cursor = null;
+  do {
+    const page = await fetchPage(url, cursor);
+    items = items.concat(page.items);
+    cursor = page.nextCursor;
+  } while (cursor);
+  return items;
+};
+
+// Access tokens are short-lived; on a 401 the refresh token is exchanged once
+// (shared by all requests failing at the same time) and the request retried.
+// Tabs share the tokens in localStorage, so the exchange runs under a Web Lock
+// and is skipped when another tab already replaced the rejected access token.
+let refreshPromise = null;
+
+const refreshAccessToken = async (staleToken) => {
+  const refresh = async () => {
+    const current = localStorage.getItem('token');
+    if (current && current !== staleToken) {
+      axios.defaults.headers.common['Authorization'] = `Bearer ${current}`;
+      return current;
+    }
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) {
+      throw new Error('No refresh token');
+    }
+    const response = await axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken });
+    localStorage.setItem('token', response.data.access_token);
+    localStorage.setItem('refresh_token', response.data.refresh_token);
+    axios.defaults.headers.common['Authorization'] = `Bearer ${response.data.access_token}`;
+    return response.data.access_token;
+  };
+  return navigator.locks ? navigator.locks.request('indowater-token-refresh', refresh) : refresh();
+};
+
 function App() {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
 
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const request = error.config;
+        if (error.response?.status !== 401 || !request || request._retried || request.url.includes('/auth/')) {
+          return Promise.reject(error);
+        }
+        request._retried = true;
+        const staleToken = String(request.headers?.Authorization || '').replace('Bearer ', '');
+        try {
+          refreshPromise = refreshPromise || refreshAccessToken(staleToken).finally(() => { refreshPromise = null; });
+          const token = await refreshPromise;
+          request.headers['Authorization'] = `Bearer ${token}`;
+          return axios(request);
+        } catch (refreshError) {
+          clearSession();
+          setUser(null);
+          return Promise.reject(error);
+        }
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
+  useEffect(() => {
+    // Pick up tokens refreshed by another tab
+    const onStorage = (event) => {
+      if (event.key === 'token' && event.newValue) {
+        axios.defaults.headers.common['Authorization'] = `Bearer ${event.newValue}`;
+      }
+    };
+    window.addEventListener('storage', onStorage);
+    return () => window.removeEventListener('storage', onStorage);
+  }, []);
+
   useEffect(() => {
     const token = localStorage.getItem('token');
     if (token) {
@@ -31,22 +111,33 @@ function App() {
       const response = await axios.get(`${API}/auth/me`);
       setUser(response.data);
     } catch (error) {
-      localStorage.removeItem('token');
-      delete axios.defaults.headers.common['Authorization'];
+      clearSession();
     } finally {
       setLoading(false);
     }
   };
 
-  const login = (token, userData) => {
+  const clearSession = () => {
+    localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
+    delete axios.defaults.headers.common['Authorization'];
+  };
+
+  const login = (token, userData, refreshToken) => {
     localStorage.setItem('token', token);
+    if (refreshToken) {
+      localStorage.setItem('refresh_token', refreshToken);
+    }
     axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
     setUser(userData);
   };
 
   const logout = () => {
-    localStorage.removeItem('token');
-    delete axios.defaults.headers.common['Authorization'];
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      axios.post(`${API}/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
+    clearSession();
     setUser(null);
   };
 
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useContext } from 'react';
-import { AuthContext, API } from '../App';
+import { AuthContext, API, BACKEND_URL, fetchPage } from '../App';
 import axios from 'axios';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
@@ -18,6 +18,9 @@ const AdminDashboard = () => {
   const [customers, setCustomers] = useState([]);
   const [meters, setMeters] = useState([]);
   const [transactions, setTransactions] = useState([]);
+  // Cursor of the next unloaded page of each list, null once it is complete
+  const [nextCursors, setNextCursors] = useState({});
+  const [statusReport, setStatusReport] = useState(null);
   const [loading, setLoading] = useState(true);
   const [settings, setSettings] = useState(null);
   const [showSettings, setShowSettings] = useState(false);
@@ -30,17 +33,24 @@ const AdminDashboard = () => {
 
   const fetchData = async () => {
     try {
-      const [dashRes, custRes, metersRes, transRes, settingsRes] = await Promise.all([
+      const [dashRes, customerPage, meterPage, transactionPage, settingsRes, statusRes] = await Promise.all([
         axios.get(`${API}/admin/dashboard`),
-        axios.get(`${API}/admin/customers`),
-        axios.get(`${API}/meters`),
-        axios.get(`${API}/transactions`),
-        axios.get(`${API}/settings`)
+        fetchPage(`${API}/admin/customers`),
+        fetchPage(`${API}/meters`),
+        fetchPage(`${API}/transactions?order=desc`),
+        axios.get(`${API}/settings`),
+        axios.get(`${API}/reports/status`)
       ]);
       setDashboard(dashRes.data);
-      setCustomers(custRes.data);
-      setMeters(metersRes.data);
-      setTransactions(transRes.data);
+      setCustomers(customerPage.items);
+      setMeters(meterPage.items);
+      setTransactions(transactionPage.items);
+      setNextCursors({
+        customers: customerPage.nextCursor,
+        meters: meterPage.nextCursor,
+        transactions: transactionPage.nextCursor
+      });
+      setStatusReport(statusRes.data);
       setSettings(settingsRes.data);
       setWaterRate(settingsRes.data.water_rate.toString());
     } catch (error) {
@@ -50,6 +60,24 @@ const AdminDashboard = () => {
     }
   };
 
+  const loadMore = async (list, url, setItems) => {
+    try {
+      const page = await fetchPage(url, nextCursors[list]);
+      setItems((items) => items.concat(page.items));
+      setNextCursors((cursors) => ({ ...cursors, [list]: page.nextCursor }));
+    } catch (error) {
+      toast.error('Gagal memuat data');
+    }
+  };
+
+  const loadMoreButton = (list, url, setItems) => nextCursors[list] && (
+    <div className="flex justify-center">
+      <Button variant="outline" onClick={() => loadMore(list, url, setItems)} data-testid={`load-more-${list}`}>
+        Muat lebih banyak
+      </Button>
+    </div>
+  );
+
   const handleLogoUpload = async () => {
     if (!logoFile) {
       toast.error('Pilih file logo terlebih dahulu');
@@ -95,15 +123,16 @@ const AdminDashboard = () => {
   }
 
   // Chart data
-  const transactionChartData = transactions.slice(-10).map((t, i) => ({
+  // Transactions are loaded newest first; chart the latest ten oldest to newest
+  const transactionChartData = transactions.slice(0, 10).reverse().map((t, i) => ({
     name: `T${i + 1}`,
     amount: t.amount
   }));
 
   const statusData = [
-    { name: 'Success', value: transactions.filter(t => t.status === 'settlement' || t.status === 'capture').length },
-    { name: 'Pending', value: transactions.filter(t => t.status === 'pending').length },
-    { name: 'Failed', value: transactions.filter(t => !['settlement', 'capture', 'pending'].includes(t.status)).length }
+    { name: 'Success', value: statusReport?.summary.success || 0 },
+    { name: 'Pending', value: statusReport?.summary.pending || 0 },
+    { name: 'Failed', value: statusReport?.summary.failed || 0 }
   ];
 
   const COLORS = ['#10b981', '#f59e0b', '#ef4444'];
@@ -115,8 +144,8 @@ const AdminDashboard = () => {
         <div className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 py-4">
           <div className="flex justify-between items-center">
             <div className="flex items-center space-x-3">
-              {settings?.logo_base64 ? (
-                <img src={settings.logo_base64} alt="Logo" className="w-12 h-12 rounded-xl shadow-lg object-cover" />
+              {settings?.logo_url ? (
+                <img src={`${BACKEND_URL}${settings.logo_url}`} alt="Logo" className="w-12 h-12 rounded-xl shadow-lg object-cover" />
               ) : (
                 <div className="w-12 h-12 bg-gradient-to-br from-cyan-500 to-blue-600 rounded-xl flex items-center justify-center shadow-lg">
                   <Droplets className="w-6 h-6 text-white" />
@@ -347,6 +376,7 @@ const AdminDashboard = () => {
                       </tbody>
                     </table>
                   </div>
+                  {loadMoreButton('customers', `${API}/admin/customers`, setCustomers)}
                 </div>
               </TabsContent>
 
@@ -383,6 +413,7 @@ const AdminDashboard = () => {
                       </tbody>
                     </table>
                   </div>
+                  {loadMoreButton('meters', `${API}/meters`, setMeters)}
                 </div>
               </TabsContent>
 
@@ -401,7 +432,7 @@ const AdminDashboard = () => {
                         </tr>
                       </thead>
                       <tbody className="divide-y divide-slate-200">
-                        {transactions.slice(-20).reverse().map((transaction) => (
+                        {transactions.map((transaction) => (
                           <tr key={transaction.id} className="hover:bg-emerald-50/50">
                             <td className="px-4 py-3 text-sm font-mono text-slate-700">{transaction.order_id}</td>
                             <td className="px-4 py-3 text-sm text-slate-700">Rp {transaction.amount.toLocaleString('id-ID')}</td>
@@ -425,6 +456,7 @@ const AdminDashboard = () => {
                       </tbody>
                     </table>
                   </div>
+                  {loadMoreButton('transactions', `${API}/transactions?order=desc`, setTransactions)}
                 </div>
               </TabsContent>
 
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useContext } from 'react';
-import { AuthContext, API } from '../App';
+import { AuthContext, API, fetchAllPages } from '../App';
 import axios from 'axios';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
@@ -42,14 +42,14 @@ const Dashboard = () => {
 
   const fetchData = async () => {
     try {
-      const [metersRes, transRes, propsRes] = await Promise.all([
-        axios.get(`${API}/meters`),
-        axios.get(`${API}/transactions`),
-        axios.get(`${API}/properties`)
+      const [meterList, transactionList, propertyList] = await Promise.all([
+        fetchAllPages(`${API}/meters`),
+        fetchAllPages(`${API}/transactions`),
+        fetchAllPages(`${API}/properties`)
       ]);
-      setMeters(metersRes.data);
-      setTransactions(transRes.data);
-      setProperties(propsRes.data.filter(p => p.status === 'approved'));
+      setMeters(meterList);
+      setTransactions(transactionList);
+      setProperties(propertyList.filter(p => p.status === 'approved'));
     } catch (error) {
       toast.error('Gagal memuat data');
     } finally {
@@ -31,7 +31,7 @@ const Login = () => {
 
     try {
       const response = await axios.post(`${API}/auth/login`, loginData);
-      login(response.data.access_token, response.data.user);
+      login(response.data.access_token, response.data.user, response.data.refresh_token);
       toast.success('Selamat datang kembali!');
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Login gagal');
@@ -46,7 +46,7 @@ const Login = () => {
 
     try {
       const response = await axios.post(`${API}/auth/register`, registerData);
-      login(response.data.access_token, response.data.user);
+      login(response.data.access_token, response.data.user, response.data.refresh_token);
       toast.success('Akun berhasil dibuat!');
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Registrasi gagal');
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useContext } from 'react';
-import { AuthContext, API } from '../App';
+import { AuthContext, API, fetchAllPages } from '../App';
 import axios from 'axios';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
@@ -42,8 +42,7 @@ const PropertyManagement = () => {
 
   const fetchProperties = async () => {
     try {
-      const response = await axios.get(`${API}/properties`);
-      setProperties(response.data);
+      setProperties(await fetchAllPages(`${API}/properties`));
     } catch (error) {
       toast.error('Gagal memuat data properti');
     } finally {
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
-import { API } from '../App';
+import { API, fetchPage } from '../App';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
@@ -13,6 +13,7 @@ import { Shield, UserCog, AlertCircle, CheckCircle, XCircle, Trash2 } from 'luci
 
 const RoleManagement = () => {
   const [users, setUsers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [roles, setRoles] = useState([]);
   const [myPermissions, setMyPermissions] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -27,12 +28,13 @@ const RoleManagement = () => {
 
   const fetchData = async () => {
     try {
-      const [usersRes, rolesRes, permRes] = await Promise.all([
-        axios.get(`${API}/admin/customers`),
+      const [userPage, rolesRes, permRes] = await Promise.all([
+        fetchPage(`${API}/admin/customers`),
         axios.get(`${API}/roles/available`),
         axios.get(`${API}/permissions/me`)
       ]);
-      setUsers(usersRes.data);
+      setUsers(userPage.items);
+      setNextCursor(userPage.nextCursor);
       setRoles(rolesRes.data);
       setMyPermissions(permRes.data.permissions);
     } catch (error) {
@@ -42,6 +44,16 @@ const RoleManagement = () => {
     }
   };
 
+  const loadMoreUsers = async () => {
+    try {
+      const page = await fetchPage(`${API}/admin/customers`, nextCursor);
+      setUsers((loaded) => loaded.concat(page.items));
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      toast.error('Gagal memuat data');
+    }
+  };
+
   const handleUpdateRole = async () => {
     if (!newRole) {
       toast.error('Pilih role terlebih dahulu');
@@ -268,6 +280,13 @@ const RoleManagement = () => {
               </tbody>
             </table>
           </div>
+          {nextCursor && (
+            <div className="flex justify-center mt-4">
+              <Button variant="outline" onClick={loadMoreUsers} data-testid="load-more-users">
+                Muat lebih banyak
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
 
@@ -0,0 +1,37 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# server reads these at import time; the test database is dropped by every
+# test that uses the mongo fixture
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "indowater_test")
+os.environ.setdefault("ALERT_MODE", "off")
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """An empty test database patched in as server.db; skips the test when
+    MongoDB is unreachable. Each test gets its own client, since a Motor client
+    is bound to the event loop of the asyncio.run that first uses it."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.errors import PyMongoError
+
+    import server
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True, uuidRepresentation="standard",
+                                serverSelectionTimeoutMS=2000)
+    try:
+        client.delegate.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+    client.delegate.drop_database(os.environ["DB_NAME"])
+    db = client[os.environ["DB_NAME"]]
+    monkeypatch.setattr(server, "db", db)
+    yield db
+    client.close()
@@ -0,0 +1,53 @@
+import time
+
+import server
+
+
+def make_user(number: int = 1) -> server.User:
+    return server.User(email=f"user{number}@example.com", name=f"User {number}", role=server.UserRole.CUSTOMER)
+
+
+def test_auth_cache_entry_lives_until_the_earlier_of_exp_and_ttl():
+    cache = server.AuthCache(max_entries=10, ttl_seconds=60)
+    user = make_user()
+    now = time.time()
+
+    cache.put("short-token", user, now + 5)
+    cache.put("long-token", user, now + 3600)
+
+    assert cache.entries["short-token"][1] == now + 5
+    assert now + 59 < cache.entries["long-token"][1] <= time.time() + 60
+    assert cache.get("long-token") is user
+
+
+def test_auth_cache_drops_expired_tokens():
+    cache = server.AuthCache(max_entries=10, ttl_seconds=60)
+    user = make_user()
+    cache.put("expired", user, time.time() - 1)
+
+    assert cache.get("expired") is None
+    assert "expired" not in cache.entries
+    assert user.id not in cache.tokens_by_user
+
+
+def test_auth_cache_evicts_least_recently_used_and_invalidates_per_user():
+    cache = server.AuthCache(max_entries=2, ttl_seconds=60)
+    first, second = make_user(1), make_user(2)
+    exp = time.time() + 600
+    cache.put("a", first, exp)
+    cache.put("b", second, exp)
+    cache.get("a")
+    cache.put("c", second, exp)
+
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.evictions == 1
+    cache.invalidate_user(second.id)
+    assert cache.get("c") is None
+    assert cache.get("a") is first
+
+
+def test_disabled_auth_cache_stores_nothing():
+    cache = server.AuthCache(max_entries=10, ttl_seconds=60, enabled=False)
+    cache.put("token", make_user(), time.time() + 600)
+    assert cache.get("token") is None
+    assert not cache.entries
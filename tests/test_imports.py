@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+class Upload:
+    """Just enough of a Request for spool_body: headers and a chunked stream"""
+
+    def __init__(self, chunks, headers=None):
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.sent = 0
+
+    async def stream(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+
+def spool(upload: Upload) -> bytes:
+    async def scenario():
+        body = await server.spool_body(upload)
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    return asyncio.run(scenario())
+
+
+def test_body_is_spooled_in_memory_and_past_the_memory_size(monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_SPOOL_MEMORY_BYTES", 10)
+    chunks = [b"meter_number,location\n", b"M-1,Jl. Test 1\n", b"M-2,Jl. Test 2\n"]
+    assert spool(Upload(chunks)) == b"".join(chunks)
+
+
+def test_oversized_body_is_refused_as_soon_as_it_crosses_the_limit(monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_MAX_BYTES", 25)
+    upload = Upload([b"x" * 10] * 10)
+    with pytest.raises(HTTPException) as error:
+        spool(upload)
+    assert error.value.status_code == 413
+    assert upload.sent == 3
+
+
+def test_declared_oversized_body_is_refused_before_reading(monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_MAX_BYTES", 25)
+    upload = Upload([b"x" * 10], headers={"content-length": "26"})
+    with pytest.raises(HTTPException) as error:
+        spool(upload)
+    assert error.value.status_code == 413
+    assert upload.sent == 0
+
+
+def test_body_of_exactly_the_limit_is_accepted(monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_MAX_BYTES", 20)
+    assert spool(Upload([b"x" * 10] * 2, headers={"content-length": "20"})) == b"x" * 20
@@ -0,0 +1,15 @@
+from metrics import Histogram
+
+
+def test_histogram_samples_are_cumulative():
+    histogram = Histogram("request_seconds", "test", ("route",), buckets=(0.005, 0.1))
+    histogram.observe(0.003, "/api/meters")
+    histogram.observe(0.05, "/api/meters")
+    histogram.observe(2.0, "/api/meters")
+
+    samples = {(name, labels): value for name, labels, value in histogram.samples()}
+    assert samples[("request_seconds_bucket", '{route="/api/meters",le="0.005"}')] == 1
+    assert samples[("request_seconds_bucket", '{route="/api/meters",le="0.1"}')] == 2
+    assert samples[("request_seconds_bucket", '{route="/api/meters",le="+Inf"}')] == 3
+    assert samples[("request_seconds_count", '{route="/api/meters"}')] == 3
+    assert abs(samples[("request_seconds_sum", '{route="/api/meters"}')] - 2.053) < 1e-9
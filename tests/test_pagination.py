@@ -0,0 +1,50 @@
+import base64
+from datetime import datetime, timezone
+
+import pytest
+from bson import json_util
+from fastapi import HTTPException
+
+import server
+
+
+def page_after(descending: bool):
+    last = {"id": str(server.uuid7()), "transaction_time": datetime(2024, 5, 1, 12, tzinfo=timezone.utc)}
+    return server.keyset_query({}, "transaction_time", server.encode_cursor(last, "transaction_time"),
+                               descending=descending)
+
+
+def test_descending_pages_sort_and_compare_downwards():
+    query, sort = page_after(descending=True)
+    assert sort == [("transaction_time", server.DESCENDING), ("_id", server.DESCENDING)]
+    earlier, tie = query["$or"]
+    assert list(earlier["transaction_time"]) == ["$lt"]
+    assert list(tie["_id"]) == ["$lt"]
+
+
+def test_ascending_is_the_default():
+    query, sort = page_after(descending=False)
+    assert sort == [("transaction_time", server.ASCENDING), ("_id", server.ASCENDING)]
+    later, tie = query["$or"]
+    assert list(later["transaction_time"]) == ["$gt"]
+    assert list(tie["_id"]) == ["$gt"]
+
+
+def crafted_cursor(last_key, last_id) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps([last_key, last_id]).encode()).decode()
+
+
+@pytest.mark.parametrize("last_key, last_id", [
+    ({"$ne": None}, "x"),
+    ([1, 2], "x"),
+    ("2024-05-01", {"$ne": None}),
+])
+def test_cursor_with_operator_values_is_rejected(last_key, last_id):
+    with pytest.raises(HTTPException) as error:
+        server.keyset_query({}, "created_at", crafted_cursor(last_key, last_id))
+    assert error.value.status_code == 400
+
+
+def test_cursor_with_a_missing_sort_key_is_accepted():
+    query, _ = server.keyset_query({}, "created_at", crafted_cursor(None, "x"))
+    assert query["$or"][1]["created_at"] is None
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import server
+
+
+def test_replayed_notification_credits_once(mongo):
+    """The same settlement notification delivered 1000 times at once credits
+    the meter and counts revenue exactly once, with leases short enough that
+    workers and the recovery sweep keep overlapping"""
+    amount = 50000.0
+
+    async def scenario():
+        meter = server.WaterMeter(meter_number="TEST-1", location="Jl. Test 1", customer_id="c", customer_name="C")
+        await mongo.meters.insert_one(server.to_document(meter))
+        trans = server.Transaction(order_id="water-replay", customer_id="c", meter_id=meter.id,
+                                   amount=amount, payment_method="gopay")
+        await mongo.transactions.insert_one(server.to_document(trans))
+
+        notification = {"order_id": trans.order_id, "transaction_status": "settlement",
+                        "gross_amount": "50000.00", "status_code": "200"}
+        await asyncio.gather(*(server.payment_notification(dict(notification)) for _ in range(1000)))
+
+        inbox = server.PaymentInbox(workers=8, batch_size=50, poll_seconds=0.01, lease_seconds=0, max_attempts=5)
+        inbox.start()
+        try:
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                busy = await mongo.payment_inbox.count_documents({"state": {"$in": ["pending", "processing"]}})
+                if not busy and not await mongo.transactions.count_documents({"pending_effects": {"$exists": True}}):
+                    break
+                await asyncio.sleep(0.1)
+        finally:
+            await inbox.stop()
+
+        return (
+            await mongo.meters.find_one(server.id_query(meter.id)),
+            await mongo.stats.find_one({"id": server.STATS_ID}),
+            await mongo.transactions.find_one({"order_id": trans.order_id}),
+            await mongo.report_revenue_daily.find().to_list(None),
+            await mongo.payment_inbox.count_documents({"state": "done"}),
+        )
+
+    meter, stats, trans, revenue_rows, done = asyncio.run(scenario())
+    assert trans["status"] == "settlement"
+    assert "pending_effects" not in trans
+    assert meter["balance"] == amount
+    assert stats["total_revenue"] == amount
+    assert sum(row["revenue"] for row in revenue_rows) == amount
+    assert sum(row["count"] for row in revenue_rows) == 1
+    assert done == 1000
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+
+def test_no_status_transitions_to_itself():
+    for status, sources in server.PAYMENT_TRANSITIONS.items():
+        assert status not in sources
+
+
+def test_transition_sources_are_known_statuses():
+    for sources in server.PAYMENT_TRANSITIONS.values():
+        assert set(sources) <= set(server.PAYMENT_TRANSITIONS)
+
+
+def test_refunds_only_follow_a_settled_payment():
+    assert set(server.PAYMENT_TRANSITIONS["refund"]) == set(server.SETTLED_STATUSES) | {"partial_refund"}
+    assert set(server.PAYMENT_TRANSITIONS["partial_refund"]) == set(server.SETTLED_STATUSES)
+    for status in ["deny", "cancel", "expire", "failure"]:
+        for settled in server.SETTLED_STATUSES:
+            assert settled not in server.PAYMENT_TRANSITIONS[status]
+
+
+def test_transaction_revenue_nets_out_partial_refunds():
+    trans = {"amount": 50000.0, "refunded_amount": 20000.0}
+    assert server.transaction_revenue(trans, "settlement") == 50000.0
+    assert server.transaction_revenue(trans, "partial_refund") == 30000.0
+    assert server.transaction_revenue(trans, "refund") == 0.0
+    assert server.transaction_revenue(trans, "pending") == 0.0
+    assert server.transaction_revenue(trans, None) == 0.0
+
+
+def transition(status: str, refund_amount: float = 0.0):
+    return server.payment_transition("water-1", status, refund_amount, datetime(2024, 5, 1, tzinfo=timezone.utc))
+
+
+@pytest.mark.parametrize("status", list(server.PAYMENT_TRANSITIONS))
+def test_transition_only_matches_allowed_source_statuses(status):
+    query, _ = transition(status)
+    assert query == {"order_id": "water-1", "status": {"$in": server.PAYMENT_TRANSITIONS[status]}}
+    assert status not in query["status"]["$in"]
+
+
+def test_pending_is_not_reentered_from_pending():
+    query, _ = transition("pending")
+    assert query["status"]["$in"] == ["authorize"]
+
+
+def test_transition_records_the_effect_from_the_previous_status():
+    _, [stage] = transition("settlement")
+    update = stage["$set"]
+    assert update["status"] == "settlement"
+    [effect] = update["pending_effects"]["$concatArrays"][1]
+    assert (effect["from"], effect["to"]) == ("$status", "settlement")
+    assert "refunded_amount" not in update
+
+
+def test_partial_refund_caps_refunded_amount_at_the_amount():
+    _, [stage] = transition("partial_refund", 20000.0)
+    assert stage["$set"]["refunded_amount"] == {"$min": ["$amount", 20000.0]}
+
+
+def test_partial_refund_nets_the_refund_out_of_revenue():
+    trans = {"amount": 50000.0, "refunded_amount": 20000.0}
+    settled = server.transaction_revenue(trans, "settlement")
+    refunded = server.transaction_revenue(trans, "partial_refund")
+    assert settled - refunded == 20000.0
+    # Refunding the rest removes what the partial refund left
+    assert refunded - server.transaction_revenue(trans, "refund") == 30000.0
+
+
+def test_notified_refund_amount():
+    assert server.notified_refund_amount({"refund_amount": "20000.00"}) == 20000.0
+    assert server.notified_refund_amount({}) == 0.0
+    assert server.notified_refund_amount({"refund_amount": "n/a"}) == 0.0
+    assert server.notified_refund_amount({"refund_amount": -5}) == 0.0
+
+
+def test_concurrent_transitions_apply_once_and_stale_ones_are_rejected(mongo):
+    async def scenario():
+        trans = server.Transaction(order_id="water-race", customer_id="c", meter_id="m",
+                                   amount=50000.0, payment_method="gopay")
+        await mongo.transactions.insert_one(server.to_document(trans))
+
+        # settlement and expire race from pending: exactly one of them wins
+        outcomes = await asyncio.gather(*(
+            server.apply_payment_status(trans.order_id, status)
+            for status in ["settlement", "expire"] * 50
+        ))
+        after_race = await mongo.transactions.find_one({"order_id": trans.order_id})
+        # Anything arriving after the race is stale against the winner
+        stale = [await server.apply_payment_status(trans.order_id, status)
+                 for status in ["pending", "authorize", "settlement", "expire"]]
+        final = await mongo.transactions.find_one({"order_id": trans.order_id})
+        return outcomes, after_race, stale, final
+
+    outcomes, after_race, stale, final = asyncio.run(scenario())
+    assert sum(outcomes) == 1
+    assert len(after_race["pending_effects"]) == 1
+    assert after_race["pending_effects"][0]["from"] == "pending"
+    assert not any(stale)
+    assert final["status"] == after_race["status"]
+    assert final["pending_effects"] == after_race["pending_effects"]
+
+
+def test_partial_refund_is_capped_in_the_database(mongo):
+    async def scenario():
+        trans = server.Transaction(order_id="water-refund", customer_id="c", meter_id="m",
+                                   amount=50000.0, payment_method="gopay", status="settlement")
+        await mongo.transactions.insert_one(server.to_document(trans))
+        await server.apply_payment_status(trans.order_id, "partial_refund", 80000.0)
+        return await mongo.transactions.find_one({"order_id": trans.order_id})
+
+    refunded = asyncio.run(scenario())
+    assert refunded["status"] == "partial_refund"
+    assert refunded["refunded_amount"] == 50000.0
+    assert server.transaction_revenue(refunded, "partial_refund") == 0.0
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+def test_memory_token_bucket_allows_a_burst_then_reports_the_wait():
+    store = server.MemoryRateLimitStore(max_keys=10)
+
+    async def takes():
+        return [await store.take("login:10.0.0.1", capacity=2, refill_per_second=1.0) for _ in range(3)]
+
+    first, second, third = asyncio.run(takes())
+    assert first == second == 0.0
+    assert 0.9 < third <= 1.0
+
+
+def test_memory_token_bucket_refills_and_evicts(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    store = server.MemoryRateLimitStore(max_keys=1)
+
+    async def scenario():
+        assert await store.take("a", capacity=1, refill_per_second=0.5) == 0.0
+        assert await store.take("a", capacity=1, refill_per_second=0.5) == 2.0
+        clock[0] += 2
+        assert await store.take("a", capacity=1, refill_per_second=0.5) == 0.0
+        await store.take("b", capacity=1, refill_per_second=0.5)
+
+    asyncio.run(scenario())
+    assert list(store.buckets) == ["b"]
+
+
+def test_mongo_token_bucket(mongo):
+    store = server.MongoRateLimitStore()
+
+    async def takes():
+        return await asyncio.gather(*(store.take("login:10.0.0.1", capacity=3, refill_per_second=0.01)
+                                      for _ in range(5)))
+
+    waits = asyncio.run(takes())
+    assert sorted(waits)[:3] == [0.0, 0.0, 0.0]
+    assert all(wait > 0 for wait in sorted(waits)[3:])
+
+
+@pytest.mark.parametrize("burst, per_minute", [(5, 0), (5, -1), (0, 5)])
+def test_limits_that_could_never_refill_are_rejected_at_startup(burst, per_minute):
+    with pytest.raises(ValueError):
+        server.RateLimiter("login:ip", server.MemoryRateLimitStore(max_keys=10), burst, per_minute)
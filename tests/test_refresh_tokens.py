@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+async def rotated_family():
+    """A login's token, rotated once into its successor as /auth/refresh does"""
+    token = await server.issue_refresh_token("user-1")
+    record = await server.rotate_refresh_token(token)
+    successor = await server.issue_refresh_token("user-1", record['family_id'])
+    return token, record['family_id'], successor
+
+
+def test_one_replay_within_the_grace_window_is_allowed(mongo):
+    async def scenario():
+        token, family_id, _ = await rotated_family()
+        replayed = await server.rotate_refresh_token(token)
+        return replayed, family_id, await mongo.refresh_tokens.count_documents({"family_id": family_id})
+
+    replayed, family_id, remaining = asyncio.run(scenario())
+    assert replayed['family_id'] == family_id
+    assert remaining == 2
+
+
+def test_second_replay_revokes_the_family(mongo):
+    async def scenario():
+        token, family_id, successor = await rotated_family()
+        await server.rotate_refresh_token(token)
+        with pytest.raises(HTTPException) as error:
+            await server.rotate_refresh_token(token)
+        remaining = await mongo.refresh_tokens.count_documents({"family_id": family_id})
+        with pytest.raises(HTTPException) as revoked:
+            await server.rotate_refresh_token(successor)
+        return error.value, remaining, revoked.value
+
+    error, remaining, revoked = asyncio.run(scenario())
+    assert error.status_code == 401
+    assert remaining == 0
+    assert revoked.status_code == 401
+
+
+def test_concurrent_replays_get_a_single_grace(mongo):
+    async def scenario():
+        token, family_id, _ = await rotated_family()
+        outcomes = await asyncio.gather(*(server.rotate_refresh_token(token) for _ in range(20)),
+                                        return_exceptions=True)
+        return outcomes, await mongo.refresh_tokens.count_documents({"family_id": family_id})
+
+    outcomes, remaining = asyncio.run(scenario())
+    assert sum(isinstance(outcome, dict) for outcome in outcomes) == 1
+    assert all(outcome.status_code == 401 for outcome in outcomes if not isinstance(outcome, dict))
+    assert remaining == 0
+
+
+def test_replay_after_the_grace_window_revokes_the_family(mongo, monkeypatch):
+    monkeypatch.setattr(server, "REFRESH_REUSE_GRACE_SECONDS", 0)
+
+    async def scenario():
+        token, family_id, _ = await rotated_family()
+        with pytest.raises(HTTPException):
+            await server.rotate_refresh_token(token)
+        return await mongo.refresh_tokens.count_documents({"family_id": family_id})
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,45 @@
+import asyncio
+
+import server
+
+
+def test_report_cache_single_flight():
+    cache = server.ReportCache(ttl_seconds=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"rows": len(calls)}
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get("revenue", compute) for _ in range(10)))
+        cached = await cache.get("revenue", compute)
+        return results, cached
+
+    results, cached = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [{"rows": 1}] * 10
+    assert cached == {"rows": 1}
+    assert (cache.misses, cache.shared, cache.hits) == (1, 9, 1)
+
+
+def test_report_cache_does_not_keep_failures():
+    cache = server.ReportCache(ttl_seconds=60)
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("aggregation failed")
+        return "ok"
+
+    async def scenario():
+        try:
+            await cache.get("status", compute)
+        except RuntimeError:
+            pass
+        return await cache.get("status", compute)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,82 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+
+
+def snap_client(handler, breaker_threshold: int = 5, breaker_reset_seconds: float = 30) -> server.SnapClient:
+    client = server.SnapClient("http://snap", "key", timeout=1, max_concurrency=10, max_retries=2,
+                               breaker_threshold=breaker_threshold, breaker_reset_seconds=breaker_reset_seconds)
+    client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://snap")
+    return client
+
+
+def test_timeout_after_sending_is_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("no response", request=request)
+
+    with pytest.raises(server.GatewayError):
+        asyncio.run(snap_client(handler).create_transaction({"order_id": "water-1"}))
+    assert len(calls) == 1
+
+
+def test_connect_error_is_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(201, json={"token": "t"})
+
+    assert asyncio.run(snap_client(handler).create_transaction({"order_id": "water-1"})) == {"token": "t"}
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("status_code, attempts", [(503, 3), (429, 3), (500, 1), (504, 1), (400, 1)])
+def test_only_rejections_are_retried(status_code, attempts):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(status_code, json={})
+
+    with pytest.raises(server.GatewayError):
+        asyncio.run(snap_client(handler).create_transaction({"order_id": "water-1"}))
+    assert len(calls) == attempts
+
+
+def test_half_open_circuit_admits_a_single_probe():
+    calls = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(500, json={})
+            await release.wait()
+            return httpx.Response(201, json={"token": "t"})
+
+        client = snap_client(handler, breaker_threshold=1, breaker_reset_seconds=0)
+        with pytest.raises(server.GatewayError):
+            await client.create_transaction({"order_id": "water-1"})
+        assert client.opened_at is not None
+
+        probe = asyncio.ensure_future(client.create_transaction({"order_id": "water-2"}))
+        await asyncio.sleep(0.01)
+        with pytest.raises(server.CircuitOpenError):
+            await client.create_transaction({"order_id": "water-3"})
+        release.set()
+        assert await probe == {"token": "t"}
+        assert client.opened_at is None
+        return await client.create_transaction({"order_id": "water-4"})
+
+    assert asyncio.run(scenario()) == {"token": "t"}
+    assert len(calls) == 3
@@ -0,0 +1,56 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def test_uuid7_layout():
+    value = server.uuid7()
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert abs((value.int >> 80) - time.time_ns() // 1_000_000) < 1000
+
+
+def test_uuid7_is_ordered_and_unique_within_a_millisecond():
+    ids = [server.uuid7() for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_uuid7_counter_overflow_borrows_the_next_millisecond(monkeypatch):
+    # A fixed millisecond ahead of any real one; the generator state is restored afterwards
+    ms = 4_000_000_000_000
+    monkeypatch.setattr(server, "_uuid7_last_ms", server._uuid7_last_ms)
+    monkeypatch.setattr(server, "_uuid7_counter", server._uuid7_counter)
+    monkeypatch.setattr(server.time, "time_ns", lambda: ms * 1_000_000)
+    ids = [server.uuid7() for _ in range(5000)]
+    assert ids == sorted(ids)
+    assert {value.int >> 80 for value in ids} == {ms, ms + 1}
+
+
+def test_cursor_round_trip():
+    last = {"id": str(server.uuid7()), "transaction_time": datetime(2024, 5, 1, 12, tzinfo=timezone.utc)}
+    query, sort = server.keyset_query({"customer_id": "c"}, "transaction_time",
+                                      server.encode_cursor(last, "transaction_time"))
+
+    assert sort == [("transaction_time", server.ASCENDING), ("_id", server.ASCENDING)]
+    customer, after = query["$and"]
+    assert customer == {"customer_id": "c"}
+    later, tie = after["$or"]
+    last_key = later["transaction_time"]["$gt"]
+    assert (last_key if last_key.tzinfo else last_key.replace(tzinfo=timezone.utc)) == last["transaction_time"]
+    assert tie["_id"] == {"$gt": uuid.UUID(last["id"])}
+
+
+def test_first_page_has_no_cursor_condition():
+    assert server.keyset_query({}, "created_at")[0] == {}
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        server.keyset_query({}, "created_at", "not-a-cursor")
+    assert error.value.status_code == 400